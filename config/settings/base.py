@@ -76,6 +76,8 @@ LOCAL_APPS = [
 ]
 
 CORS_ORIGIN_ALLOW_ALL=True
+# Lets browser clients read the cursor of paginated list endpoints
+CORS_EXPOSE_HEADERS = ['X-Next-Cursor']
 
 # https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
@@ -254,3 +256,54 @@ SOCIALACCOUNT_ADAPTER = 'paper.users.adapters.SocialAccountAdapter'
 
 
 # Your stuff...
+# ------------------------------------------------------------------------------
+# Number of most recent collections kept in each user's materialized home feed
+FEED_LENGTH = env.int('FEED_LENGTH', default=500)
+# Followers written per INSERT when fanning a new collection out to home feeds
+FEED_FANOUT_BATCH_SIZE = env.int('FEED_FANOUT_BATCH_SIZE', default=1000)
+# Authors with at least this many followers are pulled into feeds at read time instead of fanned out
+FEED_PULL_THRESHOLD = env.int('FEED_PULL_THRESHOLD', default=10000)
+# Suggestions kept per user, how long they stay valid, and how much a shared topic counts against a mutual follow
+SUGGESTIONS_PER_USER = env.int('SUGGESTIONS_PER_USER', default=50)
+SUGGESTIONS_TTL = env.int('SUGGESTIONS_TTL', default=60 * 60 * 24)
+SUGGESTIONS_TOPIC_WEIGHT = env.float('SUGGESTIONS_TOPIC_WEIGHT', default=0.5)
+# User typeahead: default and maximum results, the pg_trgm word similarity cut-off, and the query's hard time budget
+TYPEAHEAD_LIMIT = env.int('TYPEAHEAD_LIMIT', default=10)
+TYPEAHEAD_MAX_LIMIT = env.int('TYPEAHEAD_MAX_LIMIT', default=50)
+TYPEAHEAD_SIMILARITY_THRESHOLD = env.float('TYPEAHEAD_SIMILARITY_THRESHOLD', default=0.4)
+TYPEAHEAD_TIMEOUT_MS = env.int('TYPEAHEAD_TIMEOUT_MS', default=50)
+# Topic autocomplete index: full reload period in seconds, most deltas replayed before reloading instead, and how
+# long deltas are kept
+TOPIC_INDEX_RELOAD_INTERVAL = env.int('TOPIC_INDEX_RELOAD_INTERVAL', default=600)
+TOPIC_INDEX_MAX_REPLAY = env.int('TOPIC_INDEX_MAX_REPLAY', default=1000)
+TOPIC_INDEX_CHANGE_TTL = env.int('TOPIC_INDEX_CHANGE_TTL', default=60 * 60)
+# Federated search: results per section, how long each source may take in milliseconds, and threads shared by
+# all requests
+SEARCH_SECTION_LIMIT = env.int('SEARCH_SECTION_LIMIT', default=5)
+SEARCH_SOURCE_TIMEOUT_MS = env.int('SEARCH_SOURCE_TIMEOUT_MS', default=250)
+SEARCH_WORKERS = env.int('SEARCH_WORKERS', default=8)
+# Seconds a search result stays in the search cache; writes make it unreachable sooner
+SEARCH_CACHE_TTL = env.int('SEARCH_CACHE_TTL', default=5 * 60)
+# Offline text index over links and collections: where segments live, how often workers look for new ones and
+# rows, candidates hydrated per query, and segments an incremental build tolerates before merging them
+TEXT_INDEX_DIR = env('TEXT_INDEX_DIR', default=str(ROOT_DIR('textindex')))
+TEXT_INDEX_REFRESH_INTERVAL = env.int('TEXT_INDEX_REFRESH_INTERVAL', default=30)
+TEXT_INDEX_CANDIDATES = env.int('TEXT_INDEX_CANDIDATES', default=1000)
+TEXT_INDEX_MAX_SEGMENTS = env.int('TEXT_INDEX_MAX_SEGMENTS', default=8)
+# Seconds a topic's cached collection bitmap lives before it is rebuilt from the database
+TOPIC_BITMAP_TTL = env.int('TOPIC_BITMAP_TTL', default=60 * 60 * 24)
+# Trending topics: seconds per counting bucket, buckets kept, seconds for an attach's weight to halve, and topics
+# listed by default
+TRENDING_BUCKET_SECONDS = env.int('TRENDING_BUCKET_SECONDS', default=60 * 60)
+TRENDING_WINDOW_BUCKETS = env.int('TRENDING_WINDOW_BUCKETS', default=48)
+TRENDING_HALF_LIFE_SECONDS = env.int('TRENDING_HALF_LIFE_SECONDS', default=6 * 60 * 60)
+TRENDING_LIMIT = env.int('TRENDING_LIMIT', default=10)
+# Related topics: how many are stored per topic, and the fewest collections two topics must share to be related
+RELATED_TOPICS_PER_TOPIC = env.int('RELATED_TOPICS_PER_TOPIC', default=10)
+RELATED_TOPICS_MIN_SHARED = env.int('RELATED_TOPICS_MIN_SHARED', default=2)
+# Seconds a collection's cached CollectionView payload lives; writes make it unreachable sooner
+COLLECTION_CACHE_TTL = env.int('COLLECTION_CACHE_TTL', default=60 * 60)
+# Seconds a collection sync token stays usable; `manage.py prune_tombstones` keeps deleted rows' tombstones that long
+SYNC_TOKEN_MAX_AGE = env.int('SYNC_TOKEN_MAX_AGE', default=60 * 60 * 24 * 30)
+# Seconds a user's following or followers set stays in the follow graph cache after it is loaded
+FOLLOW_GRAPH_TTL = env.int('FOLLOW_GRAPH_TTL', default=60 * 60 * 24 * 7)
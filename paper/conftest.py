@@ -1,7 +1,9 @@
 import pytest
 from django.conf import settings
+from django.core.cache import cache
 from django.test import RequestFactory
 
+from paper.users import graph, topic_index, trending
 from paper.users.tests.factories import UserFactory
 
 
@@ -10,6 +12,30 @@ def media_storage(settings, tmpdir):
     settings.MEDIA_ROOT = tmpdir.strpath
 
 
+@pytest.fixture(autouse=True)
+def follow_graph(monkeypatch):
+    # The in-process follow graph outlives each test's database rollback
+    monkeypatch.setattr(graph, "_graph", None)
+
+
+@pytest.fixture(autouse=True)
+def topic_index_reset(monkeypatch):
+    # Likewise each worker's topic autocomplete index
+    monkeypatch.setattr(topic_index, "_index", None)
+
+
+@pytest.fixture(autouse=True)
+def trending_topics(monkeypatch):
+    # And the in-process stand-in for the trending topic counters
+    monkeypatch.setattr(trending, "_trending", None)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Search results and index versions in the local memory cache would otherwise carry over between tests
+    cache.clear()
+
+
 @pytest.fixture
 def user() -> settings.AUTH_USER_MODEL:
     return UserFactory()
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth import admin as auth_admin
 from django.contrib.auth import get_user_model
 from paper.users.forms import UserChangeForm, UserCreationForm
-from .models import Following, Collection, Link, CollectionRelationship, Topic
+from .models import Following, Collection, Link, CollectionRelationship, Topic, TopicName, FeedEntry
 
 User = get_user_model()
 
@@ -34,7 +34,15 @@ class CollectionRelationshipAdmin(admin.ModelAdmin):
 
 
 class TopicAdmin(admin.ModelAdmin):
-    list_display = ('id', 'created', 'name', 'collection')
+    list_display = ('id', 'created', 'name', 'topic_name', 'collection')
+
+
+class TopicNameAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created', 'name', 'key', 'collection_count')
+
+
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'created', 'owner', 'collection')
 
 
 admin.site.register(Following, FollowingAdmin)
@@ -42,3 +50,5 @@ admin.site.register(Link, LinkAdmin)
 admin.site.register(Collection, CollectionAdmin)
 admin.site.register(CollectionRelationship, CollectionRelationshipAdmin)
 admin.site.register(Topic, TopicAdmin)
+admin.site.register(TopicName, TopicNameAdmin)
+admin.site.register(FeedEntry, FeedEntryAdmin)
@@ -0,0 +1,172 @@
+"""
+Compressed bitmaps of non-negative integer ids, laid out like Roaring bitmaps.
+
+Ids are split on their high 16 bits into containers of up to 65536 low values. A container
+holding at most ARRAY_MAX values is a sorted array('H') of them; a denser one is a 65536-bit
+Python int. Set operations work container by container on the keys both sides share, so
+sparse topics cost little and dense ones come down to big-integer bitwise operations.
+"""
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+
+ARRAY_MAX = 4096
+CONTAINER_BYTES = 1 << 13
+# The bits set in each byte value, lowest first
+BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def to_array(values):
+    return array('H', values)
+
+
+def to_bits(container):
+    if isinstance(container, int):
+        return container
+
+    data = bytearray(CONTAINER_BYTES)
+    for value in container:
+        data[value >> 3] |= 1 << (value & 7)
+    return int.from_bytes(data, 'little')
+
+
+def values_of(container):
+    if not isinstance(container, int):
+        return container
+
+    data = container.to_bytes(CONTAINER_BYTES, 'little')
+    return [i << 3 | bit for i, byte in enumerate(data) if byte for bit in BYTE_BITS[byte]]
+
+
+def cardinality(container):
+    if isinstance(container, int):
+        return bin(container).count('1')
+    return len(container)
+
+
+# Picks the cheaper representation for a container, or None when it is empty
+def compact(container):
+    count = cardinality(container)
+    if not count:
+        return None
+    if isinstance(container, int):
+        return to_array(values_of(container)) if count <= ARRAY_MAX else container
+    return to_bits(container) if count > ARRAY_MAX else container
+
+
+def intersect(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        return a & b
+    if isinstance(a, int):
+        a, b = b, a
+    if isinstance(b, int):
+        data = b.to_bytes(CONTAINER_BYTES, 'little')
+        return to_array(value for value in a if data[value >> 3] >> (value & 7) & 1)
+    return to_array(sorted(set(a).intersection(b)))
+
+
+def union(a, b):
+    if isinstance(a, int) or isinstance(b, int) or len(a) + len(b) > ARRAY_MAX:
+        return to_bits(a) | to_bits(b)
+    return to_array(sorted(set(a).union(b)))
+
+
+def difference(a, b):
+    if isinstance(a, int):
+        return a & ~to_bits(b)
+    if isinstance(b, int):
+        data = b.to_bytes(CONTAINER_BYTES, 'little')
+        return to_array(value for value in a if not data[value >> 3] >> (value & 7) & 1)
+    return to_array(sorted(set(a).difference(b)))
+
+
+class Bitmap:
+    def __init__(self, values=()):
+        self.containers = {}
+        for high, group in groupby(sorted(set(values)), key=lambda value: value >> 16):
+            self.containers[high] = compact(to_array(value & 0xffff for value in group))
+
+    @classmethod
+    def of(cls, containers):
+        bitmap = cls()
+        bitmap.containers = {high: container for high, container in containers if container is not None}
+        return bitmap
+
+    def __len__(self):
+        return sum(cardinality(container) for container in self.containers.values())
+
+    def __contains__(self, value):
+        container = self.containers.get(value >> 16)
+        if container is None:
+            return False
+        if isinstance(container, int):
+            return bool(container >> (value & 0xffff) & 1)
+        low = value & 0xffff
+        i = bisect_left(container, low)
+        return i < len(container) and container[i] == low
+
+    def __iter__(self):
+        for high in sorted(self.containers):
+            for low in values_of(self.containers[high]):
+                yield high << 16 | low
+
+    def __and__(self, other):
+        return Bitmap.of(
+            (high, compact(intersect(container, other.containers[high])))
+            for high, container in self.containers.items() if high in other.containers
+        )
+
+    def __or__(self, other):
+        containers = dict(other.containers)
+        for high, container in self.containers.items():
+            containers[high] = compact(union(container, containers[high])) if high in containers else container
+        return Bitmap.of(containers.items())
+
+    def __sub__(self, other):
+        return Bitmap.of(
+            (high, compact(difference(container, other.containers[high])) if high in other.containers else container)
+            for high, container in self.containers.items()
+        )
+
+    # add and discard build new containers, as results of the operators share containers with their operands
+    def add(self, value):
+        high, low = value >> 16, value & 0xffff
+        container = self.containers.get(high)
+        if container is None:
+            self.containers[high] = to_array((low,))
+        elif isinstance(container, int):
+            self.containers[high] = container | 1 << low
+        else:
+            i = bisect_left(container, low)
+            if i == len(container) or container[i] != low:
+                self.containers[high] = compact(container[:i] + to_array((low,)) + container[i:])
+
+    def discard(self, value):
+        high, low = value >> 16, value & 0xffff
+        container = self.containers.get(high)
+        if container is None:
+            return
+        if isinstance(container, int):
+            container = compact(container & ~(1 << low))
+        else:
+            i = bisect_left(container, low)
+            if i == len(container) or container[i] != low:
+                return
+            container = compact(container[:i] + container[i + 1:])
+
+        if container is None:
+            del self.containers[high]
+        else:
+            self.containers[high] = container
+
+    # Values in descending order, starting below `before` when given
+    def descending(self, before=None):
+        for high in sorted(self.containers, reverse=True):
+            if before is not None and high > before >> 16:
+                continue
+            values = values_of(self.containers[high])
+            end = len(values)
+            if before is not None and high == before >> 16:
+                end = bisect_left(values, before & 0xffff)
+            for i in range(end - 1, -1, -1):
+                yield high << 16 | values[i]
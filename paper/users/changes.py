@@ -0,0 +1,162 @@
+"""
+Change log behind the collection sync endpoint.
+
+Collection, Link and Topic rows record in changed_in the id of the transaction that last
+wrote them, next to Link and Topic's `updated` timestamp, and a deleted link or topic leaves
+a Tombstone stamped the same way. Stamping only reads the writing transaction's id, so it
+takes no locks and writes no shared row.
+
+A sync token is a horizon below which every transaction has finished: on PostgreSQL, the
+xmin of the snapshot the sync reads with. Everything stamped below it is visible, so the
+next sync only needs the rows and tombstones stamped at or above it, read off their
+(collection, changed_in) indexes. Rows of transactions still open at the horizon come back
+in the next sync too; clients apply upserts by id, so repeats are harmless.
+
+Tokens also carry when they were handed out. Ones older than SYNC_TOKEN_MAX_AGE are refused
+and the client gets a full listing instead, which lets `manage.py prune_tombstones` drop
+tombstones once no token still honoured can need them.
+
+Other databases have no transaction ids and are stamped from a microsecond clock instead,
+which is only exact while one transaction writes at a time, as with SQLite.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BigIntegerField, Exists, OuterRef, Value
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .models import Collection, Link, Topic, Tombstone
+
+# How long a deleting transaction may have been open when a token's horizon was taken; its tombstone can be
+# this much older than the token
+TOMBSTONE_GRACE = 60 * 60
+
+_writing = threading.local()
+
+
+def transaction_ids():
+    return connection.vendor == 'postgresql'
+
+
+def clock():
+    return int(time.time() * 1000000)
+
+
+def current():
+    if not transaction_ids():
+        return clock()
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT txid_current()')
+        return cursor.fetchone()[0]
+
+
+# Stamps every write inside the block with one id rather than reading it again for each row
+@contextmanager
+def writing():
+    outer = getattr(_writing, 'stamp', None)
+    _writing.stamp = outer if outer is not None else current()
+    try:
+        yield _writing.stamp
+    finally:
+        _writing.stamp = outer
+
+
+def stamp():
+    found = getattr(_writing, 'stamp', None)
+    return found if found is not None else current()
+
+
+# The fields a queryset update of links or topics must set, since it skips auto_now and pre_save
+def stamp_fields():
+    return {'changed_in': stamp(), 'updated': timezone.now()}
+
+
+def saving(instance):
+    instance.changed_in = stamp()
+
+
+def deleted(instance, kind):
+    if instance.collection_id is not None:
+        Tombstone.objects.create(collection_id=instance.collection_id, kind=kind, item_id=instance.pk,
+                                 changed_in=stamp())
+
+
+def horizon():
+    if transaction_ids():
+        return RawSQL('txid_snapshot_xmin(txid_current_snapshot())', [], output_field=BigIntegerField())
+    return Value(clock(), output_field=BigIntegerField())
+
+
+def token(horizon):
+    return '{}-{}'.format(horizon, int(time.time()))
+
+
+# The horizon a token was handed out with, or None once it is too old to sync from; raises ValueError for
+# anything that is not a token
+def token_horizon(token):
+    horizon, issued = (int(part) for part in token.split('-'))
+    if issued < time.time() - settings.SYNC_TOKEN_MAX_AGE:
+        return None
+    return horizon
+
+
+# Drops the tombstones no token still honoured can need; returns how many
+def prune():
+    cutoff = timezone.now() - timedelta(seconds=settings.SYNC_TOKEN_MAX_AGE + TOMBSTONE_GRACE)
+    return Tombstone.objects.filter(deleted__lt=cutoff).delete()[0]
+
+
+# The collection with the horizon to hand out as the next token and, given a token, whether anything
+# changed since; one query, answered from the (collection, changed_in) indexes
+def probe(collection_id, token):
+    collections = Collection.objects.filter(pk=collection_id).annotate(horizon=horizon())
+    if token is not None:
+        collections = collections.annotate(
+            links_changed=Exists(Link.objects.filter(collection_id=OuterRef('pk'), changed_in__gte=token)),
+            topics_changed=Exists(Topic.objects.filter(collection_id=OuterRef('pk'), changed_in__gte=token)),
+            removed=Exists(Tombstone.objects.filter(collection_id=OuterRef('pk'), changed_in__gte=token)),
+        )
+
+    return collections.first()
+
+
+def unchanged(collection, token):
+    return token is not None and collection.changed_in < token and \
+        not (collection.links_changed or collection.topics_changed or collection.removed)
+
+
+# Links and topics of the collection written or deleted at or after `token`, or all of them if None
+def changes_since(collection_id, token):
+    links = Link.objects.filter(collection_id=collection_id)
+    topics = Topic.objects.filter(collection_id=collection_id)
+    tombstones = Tombstone.objects.none()
+    if token is not None:
+        links = links.filter(changed_in__gte=token)
+        topics = topics.filter(changed_in__gte=token)
+        tombstones = Tombstone.objects.filter(collection_id=collection_id, changed_in__gte=token)
+
+    removed = {'link': [], 'topic': []}
+    for kind, item_id in tombstones.order_by('changed_in', 'pk').values_list('kind', 'item_id'):
+        removed[kind].append(item_id)
+
+    return {
+        'links': {
+            'upserted': list(links.order_by('changed_in', 'pk')
+                             .values('id', 'owner', 'url', 'description', 'version', 'created', 'updated')),
+            'deleted': removed['link'],
+        },
+        'topics': {
+            'upserted': list(topics.order_by('changed_in', 'pk').values('id', 'name', 'created', 'updated')),
+            'deleted': removed['topic'],
+        },
+    }
+
+
+def nothing():
+    return {'links': {'upserted': [], 'deleted': []}, 'topics': {'upserted': [], 'deleted': []}}
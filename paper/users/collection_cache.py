@@ -0,0 +1,78 @@
+"""
+Cache of CollectionView.get responses.
+
+Each collection's full payload (collection info, links, topics) is cached in the default
+cache under collectioncache:<id> together with the collection's version, so serving it is
+a single cache GET. The version, under collectioncache:version:<id>, is bumped and the
+payload dropped whenever the collection, one of its links or topics, or its author's
+public profile changes, immediately and again once the transaction commits. The version
+doubles as the response's ETag.
+
+A reader that misses builds the payload from the database and only keeps it if the version
+did not move while it did, so a payload read before a write committed is never served
+after it.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Collection
+from .search_cache import seed
+
+# User fields that appear in a collection's payload, through its author
+AUTHOR_FIELDS = {'username', 'first_name', 'last_name', 'name', 'image'}
+
+
+def payload_key(pk):
+    return 'collectioncache:{}'.format(pk)
+
+
+def version_key(pk):
+    return 'collectioncache:version:{}'.format(pk)
+
+
+def version(pk):
+    cache.add(version_key(pk), seed(), None)
+    return cache.get(version_key(pk))
+
+
+# The (version, payload) cached for collection `pk`, or built with `build` and cached on a miss
+def cached(pk, build):
+    found = cache.get(payload_key(pk))
+    if found is not None:
+        return found
+
+    current = version(pk)
+    found = current, build()
+    if cache.add(payload_key(pk), found, settings.COLLECTION_CACHE_TTL) and cache.get(version_key(pk)) != current:
+        cache.delete(payload_key(pk))
+
+    return found
+
+
+def etag(pk, current):
+    return '"{}-{}"'.format(pk, current)
+
+
+def changed(*collection_ids):
+    def bump():
+        for pk in collection_ids:
+            cache.add(version_key(pk), seed(), None)
+            try:
+                cache.incr(version_key(pk))
+            except ValueError:
+                cache.set(version_key(pk), seed(), None)
+        cache.delete_many([payload_key(pk) for pk in collection_ids])
+
+    collection_ids = [pk for pk in collection_ids if pk is not None]
+    if collection_ids:
+        # Again after commit, in case a read cached the old rows while this transaction was open
+        bump()
+        transaction.on_commit(bump)
+
+
+def author_changed(user, update_fields=None):
+    if update_fields is not None and not AUTHOR_FIELDS & set(update_fields):
+        return
+
+    changed(*Collection.objects.filter(author=user).values_list('pk', flat=True))
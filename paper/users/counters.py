@@ -0,0 +1,115 @@
+"""
+Denormalized counters on User, Collection and TopicName.
+
+Every Following, Collection, Link and Topic write adjusts the matching counters with a single
+conditional UPDATE ... SET x = x + n, issued inside the caller's transaction, so
+profile and listing endpoints can read them instead of running COUNT(*).
+"""
+from django.db.models import F, Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def increment(model, pk, field, amount=1):
+    if pk is None or not amount:
+        return
+    model.objects.filter(pk=pk).update(**{field: F(field) + amount})
+
+
+# Never lets a counter go negative; drift is left for reconcile_counters to repair
+def decrement(model, pk, field, amount=1):
+    if pk is None or not amount:
+        return
+    model.objects.filter(pk=pk, **{field + '__gte': amount}).update(**{field: F(field) - amount})
+
+
+def following_added(following, user_model):
+    increment(user_model, following.creator_id, 'followingCount')
+    increment(user_model, following.following_id, 'followerCount')
+
+
+def following_removed(following, user_model):
+    decrement(user_model, following.creator_id, 'followingCount')
+    decrement(user_model, following.following_id, 'followerCount')
+
+
+# bulk_create skips post_save, so bulk follows adjust every counter they touch in two UPDATEs
+def followings_added(user_model, creator_id, following_ids):
+    if not following_ids:
+        return
+    increment(user_model, creator_id, 'followingCount', len(following_ids))
+    user_model.objects.filter(pk__in=following_ids).update(followerCount=F('followerCount') + 1)
+
+
+def collection_added(collection, user_model):
+    increment(user_model, collection.author_id, 'collectionCount')
+
+
+def collection_removed(collection, user_model):
+    decrement(user_model, collection.author_id, 'collectionCount')
+
+
+# Reading list links have no collection and are not counted
+def links_added(user_model, collection_model, owner_id, collection_id, amount=1):
+    if collection_id is None:
+        return
+    increment(user_model, owner_id, 'linkCount', amount)
+    increment(collection_model, collection_id, 'linkCount', amount)
+
+
+def links_removed(user_model, collection_model, owner_id, collection_id, amount=1):
+    if collection_id is None:
+        return
+    decrement(user_model, owner_id, 'linkCount', amount)
+    decrement(collection_model, collection_id, 'linkCount', amount)
+
+
+# A collection counts once towards a topic, however many of its tags resolve to the same TopicName;
+# these return whether the count moved
+def topic_added(topic, topic_name_model):
+    if topic.collection_id is None or other_tags(topic, topic.topic_name_id).exists():
+        return False
+    increment(topic_name_model, topic.topic_name_id, 'collection_count')
+    return True
+
+
+def topic_removed(topic, topic_name_model, topic_name_id=None):
+    if topic_name_id is None:
+        topic_name_id = topic.topic_name_id
+    if topic.collection_id is None or other_tags(topic, topic_name_id).exists():
+        return False
+    decrement(topic_name_model, topic_name_id, 'collection_count')
+    return True
+
+
+def other_tags(topic, topic_name_id):
+    return type(topic).objects.filter(topic_name_id=topic_name_id, collection_id=topic.collection_id) \
+        .exclude(pk=topic.pk)
+
+
+# Correlated COUNT(*) of `model` rows whose `field` points at the outer row, or of their distinct `distinct` values
+def count_of(model, field, distinct=None, **filters):
+    count = Count(distinct, distinct=True) if distinct else Count('pk')
+    counted = model.objects.filter(**{field: OuterRef('pk')}, **filters).order_by().values(field) \
+        .annotate(count=count).values('count')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def user_counts(following_model, collection_model, link_model):
+    return {
+        'followerCount': count_of(following_model, 'following'),
+        'followingCount': count_of(following_model, 'creator'),
+        'collectionCount': count_of(collection_model, 'author'),
+        'linkCount': count_of(link_model, 'owner', collection__isnull=False),
+    }
+
+
+def collection_counts(link_model):
+    return {
+        'linkCount': count_of(link_model, 'collection'),
+    }
+
+
+def topic_name_counts(topic_model):
+    return {
+        'collection_count': count_of(topic_model, 'topic_name', distinct='collection'),
+    }
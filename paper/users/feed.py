@@ -0,0 +1,99 @@
+"""
+Home feed of collections published by the users someone follows.
+
+Feeds are hybrid push/pull. Publishing a non-private collection writes one FeedEntry per
+follower (fan-out on write), so most of a feed is a single range scan over that user's
+entries, capped at FEED_LENGTH. Authors with at least FEED_PULL_THRESHOLD followers are
+not fanned out; instead each reader pulls their recent collections at read time in one
+query, heap-merged with the pushed entries on (created, collection id). Unfollowing leaves
+pushed entries in place; reads only keep those whose author the reader still follows.
+"""
+from django.conf import settings
+from django.db.models import F, Q, OuterRef, Subquery
+
+from .enums import CollectionPermission
+from .models import User, Following, Collection, FeedEntry
+
+FEED_ORDERING = ('-created', '-collection_id')
+
+
+def is_pull_author(author):
+    return author.followerCount >= settings.FEED_PULL_THRESHOLD
+
+
+def fan_out(collection):
+    if collection.permission == CollectionPermission.Private.name or is_pull_author(collection.author):
+        return
+
+    follower_ids = Following.objects.filter(following_id=collection.author_id).order_by() \
+        .values_list('creator_id', flat=True)
+
+    batch = []
+    for follower_id in follower_ids.iterator():
+        batch.append(follower_id)
+        if len(batch) >= settings.FEED_FANOUT_BATCH_SIZE:
+            push(collection, batch)
+            batch = []
+
+    push(collection, batch)
+
+
+def push(collection, owner_ids):
+    if not owner_ids:
+        return
+
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(owner_id=owner_id, collection=collection, created=collection.created) for owner_id in owner_ids]
+    )
+    trim(owner_ids)
+
+
+# Drops every entry past FEED_LENGTH, in one DELETE covering only the feeds that are over the cap
+def trim(owner_ids):
+    length = settings.FEED_LENGTH
+    entries = FeedEntry.objects.filter(owner=OuterRef('pk')).order_by(*FEED_ORDERING)
+
+    overfull = User.objects.filter(pk__in=owner_ids) \
+        .annotate(cutoff=Subquery(entries.values('created')[length:length + 1]),
+                  cutoff_id=Subquery(entries.values('collection_id')[length:length + 1])) \
+        .filter(cutoff_id__isnull=False) \
+        .values_list('pk', 'cutoff', 'cutoff_id')
+
+    dropped = Q()
+    for owner_id, cutoff, cutoff_id in overfull:
+        dropped |= Q(owner_id=owner_id, created__lt=cutoff) | \
+            Q(owner_id=owner_id, created=cutoff, collection_id__lte=cutoff_id)
+
+    if dropped:
+        FeedEntry.objects.filter(dropped).delete()
+
+
+def pull_author_ids(owner_id):
+    return list(User.objects.filter(friend_following_set__creator_id=owner_id,
+                                    followerCount__gte=settings.FEED_PULL_THRESHOLD).values_list('pk', flat=True))
+
+
+# A stream of pushed entries plus, when following any pull authors, one of all their collections, to be
+# merged on FEED_ORDERING
+def feed_streams(owner_id):
+    pull_ids = pull_author_ids(owner_id)
+
+    pushed = FeedEntry.objects.filter(owner_id=owner_id,
+                                      collection__author__friend_following_set__creator_id=owner_id) \
+        .exclude(collection__permission=CollectionPermission.Private.name) \
+        .exclude(collection__author_id__in=pull_ids) \
+        .select_related('collection__author')
+
+    if not pull_ids:
+        return [pushed]
+
+    pulled = Collection.objects.filter(author_id__in=pull_ids) \
+        .exclude(permission=CollectionPermission.Private.name) \
+        .annotate(collection_id=F('id')) \
+        .select_related('author')
+
+    return [pushed, pulled]
+
+
+def feed_collection(row):
+    return row.collection if isinstance(row, FeedEntry) else row
@@ -0,0 +1,340 @@
+"""
+Follow graph adjacency cache.
+
+Each user's following and followers are kept as sorted sets of user ids scored by the
+microsecond timestamp of the Following row, under followgraph:following:<id> and
+followgraph:followers:<id>. Sets are loaded from the database the first time they are read
+(or all at once by `manage.py rebuild_follow_graph`) and written through after each follow
+or unfollow commits.
+
+Loaded sets expire FOLLOW_GRAPH_TTL seconds after they are loaded, so Redis only holds the
+sets of users read recently; a set only counts as loaded while it holds LOADED_MARKER, so a
+write-through landing just as its set expired cannot pass for a loaded set.
+
+A load claims a token under <key>:loading before it reads the database and only stores what
+it read if the token is still there; each write drops the token first. A follow that commits
+after the load's read but is applied before the load stores its rows therefore discards the
+load instead of being overwritten by it, and the next read loads again.
+
+Production talks to the django_redis connection. Any other cache backend (locmem in local and
+test settings) gets an in-process stand-in with the same semantics, which is only coherent
+within a single process. If Redis errors, every read falls back to the database.
+"""
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import Following
+from .pagination import get_param, CURSOR_PARAM
+
+logger = logging.getLogger(__name__)
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+KEY_PREFIX = 'followgraph'
+# Present in every loaded set so that an empty adjacency list is distinguishable from a cold key
+LOADED_MARKER = '*'
+# Seconds a load may take between reading the database and storing the set before its token lapses
+LOAD_TIMEOUT = 30
+
+
+def score_of(created):
+    return int(created.timestamp() * 1000000)
+
+
+def key_for(direction, user_id):
+    return '{}:{}:{}'.format(KEY_PREFIX, direction, user_id)
+
+
+def loading_key(key):
+    return '{}:loading'.format(key)
+
+
+class RedisSortedSets:
+    def __init__(self, client):
+        self.client = client
+
+    def exists(self, key):
+        return self.client.zscore(key, LOADED_MARKER) is not None
+
+    def score(self, key, member):
+        return self.client.zscore(key, member)
+
+    def add_if_exists(self, key, member, score):
+        if self.exists(key):
+            self.client.execute_command('ZADD', key, score, member)
+
+    def remove(self, key, member):
+        self.client.zrem(key, member)
+
+    def count_at(self, key, score):
+        return self.client.zcount(key, score, score)
+
+    def top(self, key, max_score, count):
+        max_score = '+inf' if max_score == float('inf') else max_score
+        return [
+            member.decode() if isinstance(member, bytes) else member
+            for member in self.client.zrevrangebyscore(key, max_score, '-inf', start=0, num=count)
+        ]
+
+    def begin_load(self, key):
+        token = uuid.uuid4().hex
+        self.client.set(loading_key(key), token, ex=LOAD_TIMEOUT)
+        return token
+
+    # Replaces the set only if no write has abandoned the load since `token` was claimed
+    def finish_load(self, key, token, scored_members, ttl):
+        from redis.exceptions import WatchError
+
+        with self.client.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(loading_key(key))
+                current = pipe.get(loading_key(key))
+                if (current.decode() if isinstance(current, bytes) else current) != token:
+                    return False
+
+                pipe.multi()
+                pipe.delete(key, loading_key(key))
+                pipe.execute_command('ZADD', key, '-inf', LOADED_MARKER)
+                for member, score in scored_members:
+                    pipe.execute_command('ZADD', key, score, member)
+                pipe.expire(key, ttl)
+                pipe.execute()
+            except WatchError:
+                return False
+
+        return True
+
+    def abandon_load(self, key):
+        self.client.delete(loading_key(key))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def increment(self, key, member, amount, ttl):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.execute_command('ZINCRBY', key, amount, member)
+        pipe.expire(key, ttl)
+        pipe.execute()
+
+    def increment_if_exists(self, key, member, amount):
+        if self.exists(key):
+            self.client.execute_command('ZINCRBY', key, amount, member)
+
+    # Stores the weighted sum of the `weighted_keys` sets at `key`, marked loaded even when they are all empty
+    def union(self, key, weighted_keys, ttl):
+        keys = [source for source, _ in weighted_keys]
+        weights = [weight for _, weight in weighted_keys]
+        pipe = self.client.pipeline(transaction=True)
+        pipe.execute_command('ZUNIONSTORE', key, len(keys), *keys, 'WEIGHTS', *weights)
+        pipe.execute_command('ZADD', key, '-inf', LOADED_MARKER)
+        pipe.expire(key, ttl)
+        pipe.execute()
+
+    def top_scored(self, key, count):
+        return [
+            (member.decode() if isinstance(member, bytes) else member, score)
+            for member, score in self.client.zrevrange(key, 0, count - 1, withscores=True)
+        ]
+
+
+class LocalSortedSets:
+    def __init__(self):
+        self.sets = {}
+        self.loading = {}
+        self.lock = threading.Lock()
+
+    def exists(self, key):
+        return LOADED_MARKER in self.sets.get(key, {})
+
+    def score(self, key, member):
+        return self.sets.get(key, {}).get(str(member))
+
+    def add_if_exists(self, key, member, score):
+        with self.lock:
+            if key in self.sets:
+                self.sets[key][str(member)] = score
+
+    def remove(self, key, member):
+        with self.lock:
+            self.sets.get(key, {}).pop(str(member), None)
+
+    def count_at(self, key, score):
+        return sum(1 for value in self.sets.get(key, {}).values() if value == score)
+
+    def top(self, key, max_score, count):
+        with self.lock:
+            members = [(score, member) for member, score in self.sets.get(key, {}).items() if score <= max_score]
+        return [member for score, member in sorted(members, reverse=True)[:count]]
+
+    def begin_load(self, key):
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.loading[key] = token
+        return token
+
+    # Keys never expire here, as with increment
+    def finish_load(self, key, token, scored_members, ttl):
+        members = {str(member): score for member, score in scored_members}
+        members[LOADED_MARKER] = float('-inf')
+        with self.lock:
+            if self.loading.get(key) != token:
+                return False
+            del self.loading[key]
+            self.sets[key] = members
+        return True
+
+    def abandon_load(self, key):
+        with self.lock:
+            self.loading.pop(key, None)
+
+    def delete(self, key):
+        with self.lock:
+            self.sets.pop(key, None)
+
+    # Keys never expire here; callers delete what they no longer need
+    def increment(self, key, member, amount, ttl):
+        with self.lock:
+            members = self.sets.setdefault(key, {})
+            members[str(member)] = members.get(str(member), 0) + amount
+
+    def increment_if_exists(self, key, member, amount):
+        with self.lock:
+            if key in self.sets:
+                members = self.sets[key]
+                members[str(member)] = members.get(str(member), 0) + amount
+
+    def union(self, key, weighted_keys, ttl):
+        with self.lock:
+            members = {LOADED_MARKER: float('-inf')}
+            for source, weight in weighted_keys:
+                for member, score in self.sets.get(source, {}).items():
+                    members[member] = members.get(member, 0) + score * weight
+            self.sets[key] = members
+
+    def top_scored(self, key, count):
+        with self.lock:
+            members = [(score, member) for member, score in self.sets.get(key, {}).items()]
+        return [(member, score) for score, member in sorted(members, reverse=True)[:count]]
+
+
+class FollowGraph:
+    def __init__(self, sets, errors=()):
+        self.sets = sets
+        self.errors = errors
+
+    # Returns False when a write landed during the load and the set was left cold
+    def load(self, direction, user_id):
+        key = key_for(direction, user_id)
+        token = self.sets.begin_load(key)
+        if direction == FOLLOWING:
+            rows = Following.objects.filter(creator_id=user_id).values_list('following_id', 'created')
+        else:
+            rows = Following.objects.filter(following_id=user_id).values_list('creator_id', 'created')
+
+        scored = [(other, score_of(created)) for other, created in rows]
+        return self.sets.finish_load(key, token, scored, settings.FOLLOW_GRAPH_TTL)
+
+    def ensure_loaded(self, direction, user_id):
+        if not self.sets.exists(key_for(direction, user_id)):
+            self.load(direction, user_id)
+
+    def is_following(self, follower_id, followee_id):
+        try:
+            self.ensure_loaded(FOLLOWING, follower_id)
+            return self.sets.score(key_for(FOLLOWING, follower_id), followee_id) is not None
+        except self.errors:
+            logger.warning("Follow graph unavailable, checking following in the database", exc_info=True)
+            return Following.objects.filter(creator_id=follower_id, following_id=followee_id).exists()
+
+    # Returns enough ids to cover the next keyset page of `paginator`, or None to use the database
+    def page_candidates(self, direction, user_id, paginator, request):
+        key = key_for(direction, user_id)
+        page_size = paginator.get_page_size(request)
+        cursor = get_param(request, CURSOR_PARAM)
+
+        try:
+            self.ensure_loaded(direction, user_id)
+
+            max_score = float('inf')
+            ties = 0
+            if cursor:
+                followed = parse_datetime(str(paginator.decode_cursor(cursor)[0]))
+                if followed is None:
+                    return None
+                max_score = score_of(followed)
+                ties = self.sets.count_at(key, max_score)
+
+            members = self.sets.top(key, max_score, page_size + ties + 2)
+        except self.errors:
+            logger.warning("Follow graph unavailable, listing %s from the database", direction, exc_info=True)
+            return None
+
+        return [int(member) for member in members if member != LOADED_MARKER]
+
+    def followed(self, follow):
+        score = score_of(follow.created)
+        self.write(lambda: (
+            self.sets.abandon_load(key_for(FOLLOWING, follow.creator_id)),
+            self.sets.abandon_load(key_for(FOLLOWERS, follow.following_id)),
+            self.sets.add_if_exists(key_for(FOLLOWING, follow.creator_id), follow.following_id, score),
+            self.sets.add_if_exists(key_for(FOLLOWERS, follow.following_id), follow.creator_id, score),
+        ), follow.creator_id, follow.following_id)
+
+    def unfollowed(self, follower_id, followee_id):
+        self.write(lambda: (
+            self.sets.abandon_load(key_for(FOLLOWING, follower_id)),
+            self.sets.abandon_load(key_for(FOLLOWERS, followee_id)),
+            self.sets.remove(key_for(FOLLOWING, follower_id), followee_id),
+            self.sets.remove(key_for(FOLLOWERS, followee_id), follower_id),
+        ), follower_id, followee_id)
+
+    # Applies a write once the surrounding transaction commits so a rollback never reaches the cache
+    def write(self, apply, follower_id, followee_id):
+        def on_commit():
+            try:
+                apply()
+            except self.errors:
+                logger.warning("Follow graph write failed, dropping affected sets", exc_info=True)
+                self.invalidate(follower_id, followee_id)
+
+        transaction.on_commit(on_commit)
+
+    def invalidate(self, follower_id, followee_id):
+        try:
+            self.sets.delete(key_for(FOLLOWING, follower_id))
+            self.sets.delete(key_for(FOLLOWERS, followee_id))
+        except self.errors:
+            logger.error("Follow graph sets for %s -> %s may be stale until rebuilt", follower_id, followee_id)
+
+    def rebuild(self, user_ids):
+        for user_id in user_ids:
+            self.load(FOLLOWING, user_id)
+            self.load(FOLLOWERS, user_id)
+
+
+# Sorted sets on the django_redis connection with the errors they raise, or the in-process stand-in
+def sorted_sets():
+    if settings.CACHES['default']['BACKEND'].startswith('django_redis'):
+        from django_redis import get_redis_connection
+        from redis.exceptions import RedisError
+
+        return RedisSortedSets(get_redis_connection('default')), (RedisError,)
+
+    return LocalSortedSets(), ()
+
+
+_graph = None
+
+
+def follow_graph():
+    global _graph
+    if _graph is None:
+        sets, errors = sorted_sets()
+        _graph = FollowGraph(sets, errors=errors)
+
+    return _graph
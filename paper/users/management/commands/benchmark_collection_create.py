@@ -0,0 +1,101 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+
+from paper.users.models import User, Collection, Link, Topic
+from paper.users.serializers import CollectionSerializer, LinkSerializer
+from paper.users.views import collection_view
+
+
+class Rollback(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def median(samples):
+    ordered = sorted(samples)
+    return ordered[len(ordered) // 2]
+
+
+# Collection creation as it was before the bulk path: one INSERT and one serialization per link and topic
+def create_row_by_row(owner, data):
+    collection = Collection(author=owner, name=data['name'], description=data['description'],
+                            permission=data['permission'])
+    collection.save()
+    response = {'collectionInfo': CollectionSerializer(collection).data, 'links': [], 'topics': []}
+
+    for linkObj in data['links']:
+        link = Link(owner=owner, url=linkObj['url'], collection=collection, description=linkObj['description'])
+        link.save()
+        response['links'].append(LinkSerializer(link).data)
+
+    for name in data['topics']:
+        Topic(name=name, collection=collection).save()
+        response['topics'].append(name)
+
+    return response
+
+
+class Command(BaseCommand):
+    help = (
+        "Times creating a collection through CollectionView.post against the former row-by-row inserts, "
+        "for collections of 10 to 10,000 links. Everything it writes is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+        parser.add_argument('--topics', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self, options):
+        owner = User.objects.create(username='collectionbench')
+        factory = RequestFactory()
+
+        self.stdout.write("{:>8}  {:>14}  {:>9}  {:>14}  {:>9}".format(
+            'links', 'row-by-row ms', 'queries', 'bulk ms', 'queries'))
+
+        for size in options['sizes']:
+            results = []
+            for label in ('row-by-row', 'bulk'):
+                times = []
+                for attempt in range(options['repeat']):
+                    data = {
+                        'name': 'bench', 'user_id': owner.pk, 'description': '', 'permission': 'Public',
+                        'links': [{'url': 'https://{}.example/{}/{}'.format(label, attempt, i), 'description': 'link'}
+                                  for i in range(size)],
+                        'topics': ['benchmark-{}'.format(i) for i in range(options['topics'])],
+                    }
+
+                    queries = QueryCounter()
+                    with connection.execute_wrapper(queries):
+                        started = time.perf_counter()
+                        if label == 'bulk':
+                            request = factory.post('/api/collections', json.dumps(data),
+                                                   content_type='application/json')
+                            collection_view(request)
+                        else:
+                            create_row_by_row(owner, data)
+                        times.append(time.perf_counter() - started)
+
+                results += [median(times) * 1000, queries.count]
+
+            self.stdout.write("{:>8}  {:>14.1f}  {:>9}  {:>14.1f}  {:>9}".format(size, *results))
@@ -0,0 +1,106 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from paper.users import counters, feed
+from paper.users.models import User, Following, Collection, Link, FeedEntry
+from paper.users.views import users_feed_view
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares push-only and hybrid push/pull home feeds on synthetic follow graphs, reporting feed rows "
+        "written per published collection and feed read latency. Everything it writes is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=50, help="Follows drawn per user, before de-duplication")
+        parser.add_argument('--collections', type=int, default=200)
+        parser.add_argument('--readers', type=int, default=100)
+        parser.add_argument('--threshold', type=int, default=200, help="FEED_PULL_THRESHOLD for the hybrid run")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        for distribution in ('uniform', 'powerlaw'):
+            try:
+                with transaction.atomic():
+                    self.run(distribution, options)
+                    raise Rollback()
+            except Rollback:
+                pass
+
+    def run(self, distribution, options):
+        rng = random.Random(options['seed'])
+        user_ids = self.build_graph(rng, distribution, options)
+        followers = sorted(User.objects.filter(pk__in=user_ids).values_list('followerCount', flat=True))
+
+        self.stdout.write("{} follow graph: {} users, max followers {}, median followers {}".format(
+            distribution, len(user_ids), followers[-1], followers[len(followers) // 2]
+        ))
+
+        for label, threshold in (('push', len(user_ids) + 1), ('hybrid', options['threshold'])):
+            with override_settings(FEED_PULL_THRESHOLD=threshold):
+                self.measure(label, rng, user_ids, options)
+
+    def build_graph(self, rng, distribution, options):
+        users = [User(username='feedbench-{}'.format(i)) for i in range(options['users'])]
+        User.objects.bulk_create(users)
+        user_ids = list(User.objects.filter(username__startswith='feedbench-').values_list('pk', flat=True))
+
+        if distribution == 'uniform':
+            weights = None
+        else:
+            # Zipf-like popularity: a handful of accounts collect most of the follows
+            weights = [1.0 / (rank + 1) for rank in range(len(user_ids))]
+
+        follows = []
+        for creator_id in user_ids:
+            targets = set(rng.choices(user_ids, weights=weights, k=options['follows']))
+            targets.discard(creator_id)
+            follows += [Following(creator_id=creator_id, following_id=target) for target in targets]
+        Following.objects.bulk_create(follows)
+
+        User.objects.filter(pk__in=user_ids).update(**counters.user_counts(Following, Collection, Link))
+        return user_ids
+
+    def measure(self, label, rng, user_ids, options):
+        FeedEntry.objects.filter(owner_id__in=user_ids).delete()
+        authors = rng.choices(user_ids, k=options['collections'])
+
+        publish_times = []
+        for author in User.objects.in_bulk(authors).values():
+            for _ in range(authors.count(author.pk)):
+                started = time.perf_counter()
+                collection = Collection.objects.create(author=author, name='bench', permission='Public')
+                feed.fan_out(collection)
+                publish_times.append(time.perf_counter() - started)
+
+        rows = FeedEntry.objects.filter(owner_id__in=user_ids).count()
+
+        factory = RequestFactory()
+        read_times = []
+        for reader in rng.sample(user_ids, min(options['readers'], len(user_ids))):
+            started = time.perf_counter()
+            users_feed_view(factory.get('/api/users/{}/feed'.format(reader)), pk=reader)
+            read_times.append(time.perf_counter() - started)
+
+        self.stdout.write(
+            "  {:<6} rows/publish {:>8.1f}  publish p95 {:>7.2f} ms  read p50 {:>6.2f} ms  read p95 {:>6.2f} ms".format(
+                label, rows / len(publish_times), percentile(publish_times, 0.95) * 1000,
+                percentile(read_times, 0.5) * 1000, percentile(read_times, 0.95) * 1000,
+            )
+        )
@@ -0,0 +1,121 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from paper.users.models import User
+from paper.users.search import typeahead_users, within_budget, trigram_enabled, BudgetExceeded
+
+FIRST_NAMES = [
+    'ada', 'alan', 'barbara', 'claude', 'donald', 'edsger', 'frances', 'grace', 'john', 'ken',
+    'leslie', 'margaret', 'niklaus', 'radia', 'shafi', 'tim', 'vint', 'whitfield', 'yukihiro', 'zhang',
+]
+LAST_NAMES = [
+    'lovelace', 'turing', 'liskov', 'shannon', 'knuth', 'dijkstra', 'allen', 'hopper', 'mccarthy', 'thompson',
+    'lamport', 'hamilton', 'wirth', 'perlman', 'goldwasser', 'berners', 'cerf', 'diffie', 'matsumoto', 'wei',
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# What a user types into the picker: a prefix, a fragment from the middle, or a prefix with one typo
+def keystrokes(rng, username):
+    length = rng.randint(3, min(8, len(username)))
+    kind = rng.choice(('prefix', 'infix', 'typo'))
+
+    if kind == 'infix' and len(username) > length:
+        start = rng.randint(1, len(username) - length)
+        return username[start:start + length]
+    if kind == 'typo' and length > 3:
+        prefix = list(username[:length])
+        i = rng.randint(1, length - 2)
+        prefix[i], prefix[i + 1] = prefix[i + 1], prefix[i]
+        return ''.join(prefix)
+    return username[:length]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures user typeahead latency over a generated user table, reporting percentiles against a p95 "
+        "target. Needs PostgreSQL with pg_trgm; everything it writes is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--target-ms', type=float, default=20.0)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not trigram_enabled():
+            raise CommandError("Typeahead benchmarking needs PostgreSQL with the pg_trgm extension installed")
+
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+
+        started = time.perf_counter()
+        usernames = self.build_users(rng, options)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE users_user')
+        self.stdout.write("Generated {} users in {:.1f} s".format(len(usernames), time.perf_counter() - started))
+
+        latencies, over_budget, empty = [], 0, 0
+        for username in rng.sample(usernames, min(options['queries'], len(usernames))):
+            query = keystrokes(rng, username)
+            matches = typeahead_users(query).values('id', 'username', 'first_name', 'last_name', 'name', 'image')
+
+            started = time.perf_counter()
+            try:
+                rows = within_budget(matches[:options['limit']])
+            except BudgetExceeded:
+                rows = None
+                over_budget += 1
+            latencies.append(time.perf_counter() - started)
+            empty += rows == []
+
+        p95 = percentile(latencies, 0.95) * 1000
+        self.stdout.write(
+            "{} queries: p50 {:.2f} ms  p95 {:.2f} ms  p99 {:.2f} ms  max {:.2f} ms  over budget {}  empty {}".format(
+                len(latencies), percentile(latencies, 0.5) * 1000, p95, percentile(latencies, 0.99) * 1000,
+                max(latencies) * 1000, over_budget, empty,
+            )
+        )
+
+        if p95 < options['target_ms']:
+            self.stdout.write(self.style.SUCCESS("p95 is within the {} ms target".format(options['target_ms'])))
+        else:
+            self.stdout.write(self.style.ERROR("p95 exceeds the {} ms target".format(options['target_ms'])))
+
+    def build_users(self, rng, options):
+        usernames = []
+        batch = []
+        for i in range(options['users']):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            username = '{}{}{}'.format(first, last, i)
+            usernames.append(username)
+            batch.append(User(username=username, first_name=first.title(), last_name=last.title(),
+                              name='{} {}'.format(first.title(), last.title())))
+
+            if len(batch) >= options['batch_size']:
+                User.objects.bulk_create(batch)
+                batch = []
+
+        User.objects.bulk_create(batch)
+        return usernames
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from paper.users import text_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the link and collection text index segments. By default every row is indexed from scratch; "
+        "--incremental adds a segment for rows created since the last build and --merge compacts the segments."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(text_index.DOCUMENTS), action='append',
+                            help="Index only this kind of document; may be repeated")
+        parser.add_argument('--incremental', action='store_true')
+        parser.add_argument('--merge', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=100000, help="Rows indexed in memory per segment")
+
+    def handle(self, *args, **options):
+        for kind in options['kind'] or sorted(text_index.DOCUMENTS):
+            started = time.perf_counter()
+
+            if options['merge']:
+                merged = text_index.merge(kind)
+                written = [merged] if merged else []
+            elif options['incremental']:
+                written = text_index.build_incremental(kind, options['batch_size'])
+            else:
+                written = text_index.rebuild(kind, options['batch_size'])
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write("{}: wrote {} segment(s) in {:.1f} s".format(kind, len(written), elapsed))
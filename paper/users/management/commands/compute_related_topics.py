@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from paper.users import related_topics
+
+
+class Command(BaseCommand):
+    help = "Recomputes every topic's related topics from how often topics are tagged on the same collections"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        computed = related_topics.compute(batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS("Computed related topics for {} topics".format(computed)))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from paper.users import suggestions
+
+
+class Command(BaseCommand):
+    help = "Precomputes friends-of-friends suggestions for users whose neighbourhood changed, " \
+           "or for everyone with --full"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Recompute every user instead of only stale ones")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        user_ids = None if options['full'] else suggestions.stale_user_ids()
+        if user_ids is not None and not user_ids:
+            self.stdout.write("No stale suggestions")
+            return
+
+        computed = suggestions.compute(user_ids, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS("Computed suggestions for {} users".format(computed)))
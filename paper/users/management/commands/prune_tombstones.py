@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from paper.users import changes
+
+
+class Command(BaseCommand):
+    help = "Deletes the tombstones of deleted links and topics that no unexpired sync token can still need"
+
+    def handle(self, *args, **options):
+        pruned = changes.prune()
+
+        self.stdout.write(self.style.SUCCESS("Pruned {} tombstones".format(pruned)))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from paper.users.graph import follow_graph
+from paper.users.models import User
+
+
+class Command(BaseCommand):
+    help = "Reloads every user's following and followers sets in the follow graph cache from the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        graph = follow_graph()
+        last_pk = 0
+        rebuilt = 0
+
+        while True:
+            batch = list(User.objects.filter(pk__gt=last_pk).order_by('pk')
+                         .values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+
+            graph.rebuild(batch)
+            rebuilt += len(batch)
+            last_pk = batch[-1]
+
+        self.stdout.write(self.style.SUCCESS("Rebuilt follow graph for {} users".format(rebuilt)))
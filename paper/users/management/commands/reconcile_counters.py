@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from paper.users import counters
+from paper.users.models import User, Following, Collection, Link, Topic, TopicName
+
+
+class Command(BaseCommand):
+    help = "Recomputes the denormalized User, Collection and TopicName counters in primary key batches " \
+           "and repairs any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        users = self.reconcile(User, counters.user_counts(Following, Collection, Link), batch_size)
+        collections = self.reconcile(Collection, counters.collection_counts(Link), batch_size)
+        topic_names = self.reconcile(TopicName, counters.topic_name_counts(Topic), batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            "Repaired {} users, {} collections and {} topic names".format(users, collections, topic_names)
+        ))
+
+    # Walks the table by primary key so each batch is a short transaction over an index range
+    def reconcile(self, model, expected, batch_size):
+        repaired = 0
+        last_pk = 0
+
+        while True:
+            with transaction.atomic():
+                batch = list(model.objects.filter(pk__gt=last_pk).order_by('pk')
+                             .values_list('pk', flat=True)[:batch_size])
+                if not batch:
+                    return repaired
+
+                actual = {'actual_' + field: expression for field, expression in expected.items()}
+                drifted = Q()
+                for field in expected:
+                    drifted |= ~Q(**{field: F('actual_' + field)})
+
+                drifted_pks = list(model.objects.filter(pk__in=batch).annotate(**actual).filter(drifted)
+                                   .values_list('pk', flat=True))
+
+                # Recounting inside the UPDATE itself keeps concurrent counter bumps from being lost
+                if drifted_pks:
+                    repaired += model.objects.filter(pk__in=drifted_pks).update(**expected)
+
+            last_pk = batch[-1]
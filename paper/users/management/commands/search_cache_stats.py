@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from paper.users import search_cache
+
+
+class Command(BaseCommand):
+    help = "Prints search cache hits, misses and hit ratio per source."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters after printing them")
+
+    def handle(self, *args, **options):
+        for source, counts in search_cache.stats().items():
+            total = counts['hits'] + counts['misses']
+            ratio = counts['hits'] / total if total else 0.0
+            self.stdout.write("{:<12} hits {:>10}  misses {:>10}  hit ratio {:>6.1%}".format(
+                source, counts['hits'], counts['misses'], ratio
+            ))
+
+        if options['reset']:
+            search_cache.reset_stats()
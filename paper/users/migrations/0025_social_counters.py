@@ -0,0 +1,63 @@
+# Generated by Django 2.0.10 on 2026-10-18 11:56
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# Copied from paper.users.counters as it stood here, so later changes to it cannot alter this migration
+def count_of(model, field, **filters):
+    counted = model.objects.filter(**{field: OuterRef('pk')}, **filters).order_by().values(field) \
+        .annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Following = apps.get_model('users', 'Following')
+    Collection = apps.get_model('users', 'Collection')
+    Link = apps.get_model('users', 'Link')
+
+    User.objects.update(
+        followerCount=count_of(Following, 'following'),
+        followingCount=count_of(Following, 'creator'),
+        collectionCount=count_of(Collection, 'author'),
+        linkCount=count_of(Link, 'owner', collection__isnull=False),
+    )
+    Collection.objects.update(linkCount=count_of(Link, 'collection'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0024_collection_permission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='linkCount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='collectionCount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followerCount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followingCount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='linkCount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.0.10 on 2026-10-18 11:59
+
+from django.db import migrations
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# Copied from paper.users.counters as it stood here, so later changes to it cannot alter this migration
+def count_of(model, field, **filters):
+    counted = model.objects.filter(**{field: OuterRef('pk')}, **filters).order_by().values(field) \
+        .annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+# Keeps the oldest row of every duplicated follow and recounts the users involved
+def remove_duplicate_followings(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Following = apps.get_model('users', 'Following')
+
+    duplicates = Following.objects.values('creator', 'following').order_by() \
+        .annotate(keep=Min('id'), rows=Count('id')).filter(rows__gt=1)
+
+    affected = set()
+    for duplicate in duplicates:
+        Following.objects.filter(creator=duplicate['creator'], following=duplicate['following']) \
+            .exclude(pk=duplicate['keep']).delete()
+        affected.update([duplicate['creator'], duplicate['following']])
+
+    # Removing duplicate follows only changes follow counts
+    if affected:
+        User.objects.filter(pk__in=affected).update(
+            followerCount=count_of(Following, 'following'),
+            followingCount=count_of(Following, 'creator'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0025_social_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_followings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.0.10 on 2026-10-18 11:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0026_remove_duplicate_followings'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='following',
+            unique_together={('creator', 'following')},
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 2.0.10 on 2026-10-18 12:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0029_feed_collection_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSuggestion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('mutual_count', models.IntegerField(default=0)),
+                ('shared_topic_count', models.IntegerField(default=0)),
+                ('expires', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='suggestionsDirty',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='usersuggestion',
+            name='suggested',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggested_to', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='usersuggestion',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='suggestions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='usersuggestion',
+            index=models.Index(fields=['user', '-score'], name='users_suggestion_user_score'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='usersuggestion',
+            unique_together={('user', 'suggested')},
+        ),
+    ]
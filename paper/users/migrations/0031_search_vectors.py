@@ -0,0 +1,82 @@
+# Generated by Django 2.0.10 on 2026-10-18 12:06
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Usernames and names are matched as typed ('simple'); free text is stemmed ('english')
+SEARCH_TRIGGERS = """
+CREATE FUNCTION users_collection_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER users_collection_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, description ON users_collection
+    FOR EACH ROW EXECUTE PROCEDURE users_collection_search_vector();
+
+CREATE FUNCTION users_user_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.username, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(NEW.first_name, '') || ' ' || coalesce(NEW.last_name, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.bio, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER users_user_search_vector_update
+    BEFORE INSERT OR UPDATE OF username, name, first_name, last_name, bio ON users_user
+    FOR EACH ROW EXECUTE PROCEDURE users_user_search_vector();
+
+UPDATE users_collection SET name = name;
+UPDATE users_user SET username = username;
+
+CREATE INDEX users_collection_search_vector_gin ON users_collection USING gin (search_vector);
+CREATE INDEX users_user_search_vector_gin ON users_user USING gin (search_vector);
+"""
+
+DROP_SEARCH_TRIGGERS = """
+DROP INDEX IF EXISTS users_user_search_vector_gin;
+DROP INDEX IF EXISTS users_collection_search_vector_gin;
+DROP TRIGGER IF EXISTS users_user_search_vector_update ON users_user;
+DROP TRIGGER IF EXISTS users_collection_search_vector_update ON users_collection;
+DROP FUNCTION IF EXISTS users_user_search_vector();
+DROP FUNCTION IF EXISTS users_collection_search_vector();
+"""
+
+
+# Other backends keep the columns empty and search with the LIKE fallback in paper.users.search
+def create_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_TRIGGERS)
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0030_usersuggestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.0.10 on 2026-10-18 14:40
+
+from django.db import migrations
+
+# Columns the user typeahead fuzzy-matches with pg_trgm's word similarity operator
+TYPEAHEAD_COLUMNS = ('username', 'name', 'first_name', 'last_name')
+
+
+# Needs a PostgreSQL with the pg_trgm contrib module available; elsewhere typeahead uses the LIKE fallback
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in TYPEAHEAD_COLUMNS:
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS users_user_{0}_trgm ON users_user USING gin ({0} gin_trgm_ops)'.format(column)
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for column in TYPEAHEAD_COLUMNS:
+        schema_editor.execute('DROP INDEX IF EXISTS users_user_{0}_trgm'.format(column))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0031_search_vectors'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
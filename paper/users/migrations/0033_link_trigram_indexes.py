@@ -0,0 +1,43 @@
+# Generated by Django 2.0.10 on 2026-10-18 16:05
+
+from django.db import migrations
+
+# Link columns the federated search matches with icontains, which compiles to UPPER(column::text) LIKE
+LINK_COLUMNS = ('url', 'description')
+
+
+# Needs a PostgreSQL with the pg_trgm contrib module available; elsewhere link search scans
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in LINK_COLUMNS:
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS users_link_{0}_upper_trgm ON users_link '
+            'USING gin (UPPER({0}::text) gin_trgm_ops)'.format(column)
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for column in LINK_COLUMNS:
+        schema_editor.execute('DROP INDEX IF EXISTS users_link_{0}_upper_trgm'.format(column))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0032_user_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.0.10 on 2026-10-18 12:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0033_link_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopicName',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('key', models.CharField(blank=True, max_length=255, unique=True)),
+                ('collection_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='topicname',
+            index=models.Index(fields=['key', 'name'], name='users_topicname_key_name'),
+        ),
+        migrations.AddIndex(
+            model_name='topicname',
+            index=models.Index(fields=['-collection_count', 'key', 'name'], name='users_topicname_popular'),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='topics',
+            field=models.ManyToManyField(related_name='collections', through='users.Topic', to='users.TopicName'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='topic_name',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='users.TopicName'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 2.0.10 on 2026-10-18 12:24
+
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+# Resolves Topic rows to TopicNames one primary key range at a time, creating names as they are first seen
+def link_topic_names(apps, schema_editor):
+    Topic = apps.get_model('users', 'Topic')
+    TopicName = apps.get_model('users', 'TopicName')
+
+    last_pk = 0
+    while True:
+        batch = list(Topic.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'name')[:BATCH_SIZE])
+        if not batch:
+            break
+        first_pk, last_pk = batch[0][0], batch[-1][0]
+
+        spellings = {}
+        for _, name in batch:
+            spellings.setdefault(name.strip().lower(), name.strip())
+
+        known = dict(TopicName.objects.filter(key__in=spellings).values_list('key', 'pk'))
+        TopicName.objects.bulk_create(
+            [TopicName(key=key, name=name) for key, name in spellings.items() if key not in known]
+        )
+        known = dict(TopicName.objects.filter(key__in=spellings).values_list('key', 'pk'))
+
+        names = {}
+        for _, name in batch:
+            names.setdefault(name, known[name.strip().lower()])
+        for name, topic_name_id in names.items():
+            Topic.objects.filter(pk__gte=first_pk, pk__lte=last_pk, name=name).update(topic_name_id=topic_name_id)
+
+    # A collection tagged twice with one name still counts once
+    collections = Topic.objects.filter(topic_name=OuterRef('pk')).order_by().values('topic_name') \
+        .annotate(count=Count('collection', distinct=True)).values('count')
+    TopicName.objects.update(collection_count=Coalesce(Subquery(collections, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0034_topicname'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_topic_names, migrations.RunPython.noop),
+    ]
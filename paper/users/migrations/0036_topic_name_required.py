@@ -0,0 +1,19 @@
+# Generated by Django 2.0.10 on 2026-10-18 12:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0035_topic_names_data'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='topic',
+            name='topic_name',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='users.TopicName'),
+        ),
+    ]
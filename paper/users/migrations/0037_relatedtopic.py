@@ -0,0 +1,32 @@
+# Generated by Django 2.0.10 on 2026-10-18 12:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0036_topic_name_required'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedTopic',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('shared_count', models.IntegerField(default=0)),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.TopicName')),
+                ('topic_name', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_topics', to='users.TopicName')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='relatedtopic',
+            index=models.Index(fields=['topic_name', '-score'], name='users_relatedtopic_score'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='relatedtopic',
+            unique_together={('topic_name', 'related')},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.0.10 on 2026-10-18 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0037_relatedtopic'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='version',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='link',
+            name='version',
+            field=models.IntegerField(default=1),
+        ),
+    ]
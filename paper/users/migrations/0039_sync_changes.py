@@ -0,0 +1,66 @@
+# Generated by Django 2.0.10 on 2026-10-18 12:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0038_edit_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('deleted', models.DateTimeField(auto_now_add=True)),
+                ('kind', models.CharField(choices=[('link', 'Link'), ('topic', 'Topic')], max_length=10)),
+                ('item_id', models.IntegerField()),
+                ('changed_in', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='changed_in',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='link',
+            name='changed_in',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='link',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='changed_in',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='link',
+            index=models.Index(fields=['collection', 'changed_in'], name='users_link_changes'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['collection', 'changed_in'], name='users_topic_changes'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='collection',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='users.Collection'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['collection', 'changed_in'], name='users_tombstone_changes'),
+        ),
+    ]
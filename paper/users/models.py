@@ -3,6 +3,7 @@ from io import BytesIO
 import base64
 import PIL
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.urls import reverse
 from django.utils.translation import ugettext_lazy as _
@@ -18,6 +19,15 @@ class User(AbstractUser):
     image = models.ImageField(upload_to='profile_image', blank=True, null=True)
     linksProposed = models.IntegerField(default=0)
     linksAccepted = models.IntegerField(default=0)
+    # Denormalized counters, maintained by paper.users.counters and repaired by `manage.py reconcile_counters`
+    followerCount = models.IntegerField(default=0)
+    followingCount = models.IntegerField(default=0)
+    collectionCount = models.IntegerField(default=0)
+    linkCount = models.IntegerField(default=0)
+    # Set whenever the user's follows or topics change, cleared by `manage.py compute_suggestions`
+    suggestionsDirty = models.BooleanField(default=True)
+    # Full-text document over the user's names and bio, kept up to date by a PostgreSQL trigger
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def get_absolute_url(self):
         return reverse("users:detail", kwargs={"username": self.username})
@@ -28,6 +38,9 @@ class Following(models.Model):
     creator = models.ForeignKey(User, related_name="friendship_creator_set", on_delete=models.CASCADE)
     following = models.ForeignKey(User, related_name="friend_following_set", on_delete=models.CASCADE)
 
+    class Meta:
+        unique_together = ('creator', 'following')
+
 
 class Collection(models.Model):
     created = models.DateTimeField(auto_now_add=True, editable=False)
@@ -35,15 +48,65 @@ class Collection(models.Model):
     name = models.CharField(blank=True, max_length=255)
     description = models.CharField(blank=True, max_length=3000)
     permission = models.CharField(blank=True, max_length=30, choices=[(permission.name, permission.value) for permission in CollectionPermission])
+    linkCount = models.IntegerField(default=0)
+    # Full-text document over name and description, kept up to date by a PostgreSQL trigger
+    search_vector = SearchVectorField(null=True, editable=False)
+    topics = models.ManyToManyField('TopicName', through='Topic', related_name='collections')
+    # Bumped by every edit; edits carry the version they started from and are refused if it moved on
+    version = models.IntegerField(default=1)
+    # The transaction that last wrote this row, for the sync endpoint
+    changed_in = models.BigIntegerField(default=0)
 
     def __str__(self):  # what will be displayed in the admin
         return "Name: " + self.name + ", Id: " + str(self.id)
 
 
+def topic_key(name):
+    return name.strip().lower()
+
+
+# Canonical topic shared by every collection tagged with any capitalization of its name
+class TopicName(models.Model):
+    created = models.DateTimeField(auto_now_add=True, editable=False)
+    # Spelling of the first tag to use this topic
+    name = models.CharField(blank=True, max_length=255)
+    key = models.CharField(blank=True, max_length=255, unique=True)
+    # Topic rows using this name, maintained by paper.users.counters
+    collection_count = models.IntegerField(default=0)
+
+    class Meta:
+        # Alphabetical and by-popularity listings read names straight from these indexes
+        indexes = [
+            models.Index(fields=['key', 'name'], name='users_topicname_key_name'),
+            models.Index(fields=['-collection_count', 'key', 'name'], name='users_topicname_popular'),
+        ]
+
+
+# A collection's tag: the name as entered, and the canonical TopicName it resolves to
 class Topic(models.Model):
     created = models.DateTimeField(auto_now_add=True, editable=False)
     name = models.CharField(blank=True, max_length=255)
     collection = models.ForeignKey(Collection, blank=True, null=True, related_name="tag_set", on_delete=models.CASCADE)
+    topic_name = models.ForeignKey(TopicName, related_name="tags", on_delete=models.CASCADE)
+    updated = models.DateTimeField(auto_now=True)
+    # The transaction that last wrote this row, for the sync endpoint
+    changed_in = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['collection', 'changed_in'], name='users_topic_changes')]
+
+
+# Topics most often tagged on the same public collections, computed by `manage.py compute_related_topics`
+class RelatedTopic(models.Model):
+    topic_name = models.ForeignKey(TopicName, related_name="related_topics", on_delete=models.CASCADE)
+    related = models.ForeignKey(TopicName, related_name="+", on_delete=models.CASCADE)
+    # Cosine similarity of the two topics' collection sets
+    score = models.FloatField()
+    shared_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('topic_name', 'related')
+        indexes = [models.Index(fields=['topic_name', '-score'], name='users_relatedtopic_score')]
 
 
 class Link(models.Model):
@@ -53,6 +116,52 @@ class Link(models.Model):
     collection = models.ForeignKey(Collection, blank=True, null=True, related_name="collection_set", on_delete=models.CASCADE)
     description = models.CharField(blank=True, max_length=3000)
     inReadingList = models.BooleanField(default=False)
+    # Bumped by every edit, like Collection.version
+    version = models.IntegerField(default=1)
+    updated = models.DateTimeField(auto_now=True)
+    # The transaction that last wrote this row, for the sync endpoint
+    changed_in = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['collection', 'changed_in'], name='users_link_changes')]
+
+
+# Left behind by a deleted link or topic so syncing clients learn of the deletion; dropped with the collection
+class Tombstone(models.Model):
+    deleted = models.DateTimeField(auto_now_add=True, editable=False)
+    collection = models.ForeignKey(Collection, related_name="+", on_delete=models.DO_NOTHING, db_constraint=False)
+    kind = models.CharField(max_length=10, choices=[('link', 'Link'), ('topic', 'Topic')])
+    item_id = models.IntegerField()
+    changed_in = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['collection', 'changed_in'], name='users_tombstone_changes')]
+
+
+# One row per collection in a follower's home feed, written when the collection is published
+class FeedEntry(models.Model):
+    owner = models.ForeignKey(User, related_name="feed_entries", on_delete=models.CASCADE)
+    collection = models.ForeignKey(Collection, related_name="feed_entries", on_delete=models.CASCADE)
+    # Copied from the collection so a feed page is a range scan over (owner, created, collection)
+    created = models.DateTimeField(editable=False)
+
+    class Meta:
+        unique_together = ('owner', 'collection')
+        indexes = [models.Index(fields=['owner', '-created', '-collection'], name='users_feed_owner_created')]
+
+
+# Precomputed "people you may know" candidates, valid until `expires`
+class UserSuggestion(models.Model):
+    user = models.ForeignKey(User, related_name="suggestions", on_delete=models.CASCADE)
+    suggested = models.ForeignKey(User, related_name="suggested_to", on_delete=models.CASCADE)
+    score = models.FloatField()
+    mutual_count = models.IntegerField(default=0)
+    shared_topic_count = models.IntegerField(default=0)
+    expires = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'suggested')
+        indexes = [models.Index(fields=['user', '-score'], name='users_suggestion_user_score')]
 
 
 class CollectionRelationship(models.Model):
@@ -0,0 +1,145 @@
+import base64
+import binascii
+import heapq
+import json
+from datetime import datetime
+from itertools import islice
+
+from django.db.models import Q
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+CURSOR_PARAM = 'cursor'
+PAGE_SIZE_PARAM = 'page_size'
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on an ordering that is unique across rows, (created, id) by default.
+
+    Each page is a single range scan: rather than an OFFSET, the next page is selected with
+    a "strictly after the last row seen" filter on the ordering columns. The cursor handed
+    back to clients is an opaque, url-safe encoding of those column values.
+
+    List-shaped responses report the next cursor in the X-Next-Cursor header so their body
+    stays unchanged. Dict-shaped responses also carry it under "next".
+    """
+    page_size = 50
+    max_page_size = 200
+
+    def __init__(self, ordering=('-created', '-id')):
+        self.ordering = ordering
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.next_cursor = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        cursor = get_param(request, CURSOR_PARAM)
+
+        queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(cursor)))
+
+        return self.cut(list(queryset[:page_size + 1]), page_size)
+
+    # Pages through several querysets sharing the ordering as one stream, via a k-way heap merge of their pages
+    def paginate_merged(self, querysets, request, view=None):
+        directions = set(ordered.startswith('-') for ordered in self.ordering)
+        assert len(directions) == 1, "Merged pagination needs every ordering column in the same direction"
+
+        page_size = self.get_page_size(request)
+        cursor = get_param(request, CURSOR_PARAM)
+        after = self.after(self.decode_cursor(cursor)) if cursor else Q()
+
+        streams = [queryset.order_by(*self.ordering).filter(after)[:page_size + 1] for queryset in querysets]
+        merged = heapq.merge(*streams, key=lambda row: tuple(self.key_values(row)), reverse=directions.pop())
+
+        return self.cut(list(islice(merged, page_size + 1)), page_size)
+
+    # Pages through an in-memory index, where `fetch(after, count)` returns up to count rows past the cursor's
+    # key values
+    def paginate_index(self, fetch, request, view=None):
+        page_size = self.get_page_size(request)
+        cursor = get_param(request, CURSOR_PARAM)
+
+        after = None
+        if cursor:
+            after = self.decode_cursor(cursor)
+            if len(after) != len(self.fields):
+                raise ParseError('Invalid cursor')
+
+        return self.cut(list(fetch(after, page_size + 1)), page_size)
+
+    # Keeps the first page_size of page_size + 1 fetched rows, noting a cursor if there was one more
+    def cut(self, rows, page_size):
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_cursor = self.encode_cursor(self.key_values(rows[-1]))
+
+        return rows
+
+    def get_paginated_response(self, data):
+        if isinstance(data, dict):
+            data['next'] = self.next_cursor
+
+        response = Response(data)
+        if self.next_cursor:
+            response[NEXT_CURSOR_HEADER] = self.next_cursor
+
+        return response
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(get_param(request, PAGE_SIZE_PARAM) or self.page_size)
+        except (TypeError, ValueError):
+            return self.page_size
+
+        return max(1, min(page_size, self.max_page_size))
+
+    def key_values(self, row):
+        if isinstance(row, dict):
+            return [row[field] for field in self.fields]
+        if len(self.fields) == 1 and not hasattr(row, self.fields[0]):
+            # values_list(..., flat=True) rows are the key itself
+            return [row]
+        return [getattr(row, field) for field in self.fields]
+
+    # Builds (a < x) OR (a = x AND b < y) OR ... for the ordering columns
+    def after(self, values):
+        if len(values) != len(self.fields):
+            raise ParseError('Invalid cursor')
+
+        condition = Q()
+        equal = {}
+        for ordered, field, value in zip(self.ordering, self.fields, values):
+            lookup = 'lt' if ordered.startswith('-') else 'gt'
+            condition |= Q(**equal, **{'{}__{}'.format(field, lookup): value})
+            equal[field] = value
+
+        return condition
+
+    def encode_cursor(self, values):
+        raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        except (binascii.Error, UnicodeError, ValueError):
+            raise ParseError('Invalid cursor')
+
+        if not isinstance(values, list):
+            raise ParseError('Invalid cursor')
+
+        return values
+
+
+# Paginated list views read their cursor from the query string, search views also accept it in the POST body
+def get_param(request, name):
+    value = request.query_params.get(name)
+    if value is None and request.method == 'POST' and hasattr(request.data, 'get'):
+        value = request.data.get(name)
+
+    return value
@@ -0,0 +1,85 @@
+"""
+Related topics, computed offline by `manage.py compute_related_topics`.
+
+Tags on non-private collections are loaded into a binary sparse matrix M (topic x
+collection). For a batch of topics, M[batch] @ M.T counts the collections each shares with
+every other topic; dividing by sqrt(n_a * n_b), where n is a topic's collection count,
+gives their cosine similarity. Pairs sharing fewer than RELATED_TOPICS_MIN_SHARED
+collections are dropped as noise, and the top RELATED_TOPICS_PER_TOPIC for every topic
+replace the stored RelatedTopic rows, so reading them is one index range scan.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from .enums import CollectionPermission
+from .models import Topic, RelatedTopic
+from .suggestions import pairs
+
+STORE_BATCH_SIZE = 1000
+
+
+class TopicMatrix:
+    def __init__(self):
+        tags = pairs(Topic.objects.exclude(collection__permission=CollectionPermission.Private.name)
+                     .order_by().values_list('topic_name_id', 'collection_id'))
+
+        self.topic_ids, rows = np.unique(tags[:, 0], return_inverse=True)
+        collection_ids, columns = np.unique(tags[:, 1], return_inverse=True)
+        self.tags = sparse.csr_matrix(
+            (np.ones(len(tags), dtype=np.int32), (rows, columns)), shape=(len(self.topic_ids), len(collection_ids)),
+        )
+        # A collection tagged twice with one topic still counts once
+        self.tags.data[:] = 1
+        self.counts = np.asarray(self.tags.sum(axis=1)).ravel()
+
+    def related(self, rows, limit, min_shared):
+        shared = sparse.csr_matrix(self.tags[rows] @ self.tags.T)
+        shared.sort_indices()
+
+        for i, row in enumerate(rows):
+            start, end = shared.indptr[i], shared.indptr[i + 1]
+            columns = shared.indices[start:end]
+            counts = shared.data[start:end]
+
+            keep = (columns != row) & (counts >= min_shared)
+            columns, counts = columns[keep], counts[keep]
+            if not len(columns):
+                continue
+
+            scores = counts / np.sqrt(self.counts[row] * self.counts[columns])
+            top = np.argsort(-scores, kind='stable')[:limit] if len(scores) <= limit \
+                else np.argpartition(-scores, limit - 1)[:limit]
+            for j in top:
+                yield int(self.topic_ids[row]), int(self.topic_ids[columns[j]]), float(scores[j]), int(counts[j])
+
+
+# Recomputes every topic's related topics; returns how many topics were processed
+def compute(batch_size=1000):
+    matrix = TopicMatrix()
+
+    related = []
+    for start in range(0, len(matrix.topic_ids), batch_size):
+        rows = np.arange(start, min(start + batch_size, len(matrix.topic_ids)))
+        related.extend(matrix.related(rows, settings.RELATED_TOPICS_PER_TOPIC, settings.RELATED_TOPICS_MIN_SHARED))
+
+    store(related)
+    return len(matrix.topic_ids)
+
+
+def store(related):
+    with transaction.atomic():
+        RelatedTopic.objects.all().delete()
+        for start in range(0, len(related), STORE_BATCH_SIZE):
+            RelatedTopic.objects.bulk_create([
+                RelatedTopic(topic_name_id=topic_name_id, related_id=related_id, score=score, shared_count=shared)
+                for topic_name_id, related_id, score, shared in related[start:start + STORE_BATCH_SIZE]
+            ])
+
+
+def related_names(key):
+    return list(
+        RelatedTopic.objects.filter(topic_name__key=key).order_by('-score', '-shared_count', 'related__name')
+        .values_list('related__name', flat=True)[:settings.RELATED_TOPICS_PER_TOPIC]
+    )
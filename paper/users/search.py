@@ -0,0 +1,299 @@
+"""
+Search over users and collections.
+
+On PostgreSQL, queries run against the trigger-maintained `search_vector` columns through
+their GIN indexes: every word of the query must prefix-match a lexeme, and results are
+ranked with ts_rank. Other backends (the SQLite test database) fall back to the original
+case-insensitive prefix filters in creation order.
+
+The user typeahead fuzzy-matches names with pg_trgm's word similarity instead, so typos and
+infixes still match. It returns only the top few users by similarity, and its query runs
+under a statement timeout so a slow keystroke gives up rather than holding a worker.
+
+Federated search fans one query out to users, collections, topics and links on a shared
+thread pool and returns one section per source, each ranked on its own. Links come from the
+offline text index once it has been built, and from LIKE scans until then. A source that misses
+SEARCH_SOURCE_TIMEOUT_MS or fails comes back as an empty section with that status, so one
+slow source cannot stall the whole response.
+"""
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.lookups import PostgresSimpleLookup
+from django.contrib.postgres.search import SearchQueryField, SearchRank
+from django.db import connection, transaction, close_old_connections, OperationalError
+from django.db.models import F, Q, Func, Value, CharField, FloatField
+from django.db.models.functions import Cast, Greatest
+
+from . import search_cache
+from .enums import CollectionPermission
+from .models import Collection, Link
+from .serializers import UserPartSerializer
+from .text_index import text_index, matches
+from .topic_index import topic_index
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+RANKED_ORDERING = ('-rank', '-id')
+TYPEAHEAD_COLUMNS = ('username', 'name', 'first_name', 'last_name')
+QUERY_CANCELED = '57014'
+
+_trigram_enabled = None
+_executor = None
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class PrefixQuery(Func):
+    """to_tsquery(config, 'word1:* & word2:*') for the words of a free-text query"""
+    function = 'to_tsquery'
+    output_field = SearchQueryField()
+
+    def __init__(self, config, words):
+        super().__init__(Value(config), Value(' & '.join(word + ':*' for word in words)))
+
+
+class WordSimilarity(Func):
+    function = 'word_similarity'
+    output_field = FloatField()
+
+
+class TrigramWordSimilar(PostgresSimpleLookup):
+    """column %> query: some extent of the column is at least word_similarity_threshold similar to the query"""
+    lookup_name = 'trigram_word_similar'
+    operator = '%%>'
+
+
+CharField.register_lookup(TrigramWordSimilar)
+
+
+def full_text_enabled():
+    return connection.vendor == 'postgresql'
+
+
+def trigram_enabled():
+    global _trigram_enabled
+    if _trigram_enabled is None:
+        _trigram_enabled = False
+        if full_text_enabled():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                _trigram_enabled = cursor.fetchone() is not None
+
+    return _trigram_enabled
+
+
+def words_of(query):
+    return re.findall(r'\w+', query.lower())
+
+
+# Ordering columns that a values() listing has to select for its cursor, beyond the model's own fields
+def extra_keys(ordering):
+    return [field.lstrip('-') for field in ordering if field.lstrip('-') == 'rank']
+
+
+def ranked(queryset, config, words):
+    query = PrefixQuery(config, words)
+    # ts_rank is a real; as double precision it round-trips exactly through the page cursor
+    rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+    return queryset.filter(search_vector=query).annotate(rank=rank)
+
+
+# Returns the matching users and the keyset ordering to page them by
+def search_users(query):
+    words = words_of(query)
+    if full_text_enabled() and words:
+        return ranked(User.objects.all(), 'simple', words), RANKED_ORDERING
+
+    username_query = Q(username__istartswith=query)
+    first_name_query = Q(first_name__istartswith=query)
+    name_query = Q(name__istartswith=query)
+    email_query = Q(email__istartswith=query)
+
+    return User.objects.filter(username_query | first_name_query | name_query | email_query), ('-date_joined', '-id')
+
+
+# Returns the matching public collections and the keyset ordering to page them by
+def search_collections(query):
+    public = Collection.objects.filter(permission=CollectionPermission.Public.name)
+
+    words = words_of(query)
+    if full_text_enabled() and words:
+        return ranked(public, 'english', words), RANKED_ORDERING
+
+    matching = Q(name__istartswith=query)
+    # Without full-text search, descriptions are only searchable through the offline text index
+    index = text_index('collections')
+    if words and index.available():
+        matching |= Q(pk__in=index.search(query))
+
+    return public.filter(matching), ('-created', '-id')
+
+
+# Returns users whose names resemble the query, most similar first; evaluate it with `within_budget`
+def typeahead_users(query):
+    query = query.strip()
+    if not query:
+        return User.objects.none()
+
+    if trigram_enabled():
+        similar = Q()
+        for column in TYPEAHEAD_COLUMNS:
+            similar |= Q(**{column + '__trigram_word_similar': query})
+        similarity = Greatest(*[WordSimilarity(Value(query), F(column)) for column in TYPEAHEAD_COLUMNS])
+
+        return User.objects.filter(similar).annotate(similarity=similarity).order_by('-similarity', 'id')
+
+    contains = Q()
+    for column in TYPEAHEAD_COLUMNS:
+        contains |= Q(**{column + '__icontains': query})
+
+    return User.objects.filter(contains).order_by('username', 'id')
+
+
+# Evaluates the queryset under a TYPEAHEAD_TIMEOUT_MS statement timeout, raising BudgetExceeded when it runs over
+def within_budget(queryset):
+    if not full_text_enabled():
+        return list(queryset)
+
+    try:
+        # The savepoint undoes the settings if the query is cancelled; otherwise the timeout is restored by hand
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT current_setting('statement_timeout')")
+            previous = cursor.fetchone()[0]
+            cursor.execute(
+                "SELECT set_config('statement_timeout', %s, true), "
+                "set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                [str(settings.TYPEAHEAD_TIMEOUT_MS), str(settings.TYPEAHEAD_SIMILARITY_THRESHOLD)]
+            )
+            rows = list(queryset)
+            cursor.execute("SELECT set_config('statement_timeout', %s, true)", [previous])
+    except OperationalError as error:
+        if getattr(error.__cause__, 'pgcode', None) == QUERY_CANCELED:
+            raise BudgetExceeded()
+        raise
+
+    return rows
+
+
+# Links in public collections whose url or description contains the query, newest first
+def search_links(query):
+    query = query.strip()
+    if not query:
+        return Link.objects.none()
+
+    return Link.objects.filter(Q(url__icontains=query) | Q(description__icontains=query),
+                               collection__permission=CollectionPermission.Public.name) \
+        .order_by('-created', '-id')
+
+
+def user_results(query, limit):
+    users, ordering = search_users(query)
+    return list(users.order_by(*ordering).values('id', 'username', 'first_name', 'last_name', 'name', 'image')[:limit])
+
+
+def collection_results(query, limit):
+    collections, ordering = search_collections(query)
+    rows = list(collections.order_by(*ordering)
+                .values('id', 'created', 'name', 'author', 'description', 'permission')[:limit])
+
+    authors = User.objects.in_bulk({row['author'] for row in rows})
+    for row in rows:
+        row['author'] = UserPartSerializer(authors[row['author']]).data
+
+    return rows
+
+
+def topic_results(query, limit):
+    return topic_index().complete(query, limit=limit)
+
+
+def link_results(query, limit):
+    fields = ('id', 'created', 'url', 'description', 'collection', 'owner')
+    index = text_index('links')
+    if not index.available():
+        return list(search_links(query).values(*fields)[:limit])
+
+    # Hydrate the index's candidates in chunks, newest first, until enough are visible and still match
+    public = Link.objects.filter(collection__permission=CollectionPermission.Public.name)
+    candidates = index.search(query)
+    results = []
+    for start in range(0, len(candidates), limit * 4):
+        rows = public.filter(pk__in=candidates[start:start + limit * 4]).order_by('-id').values(*fields)
+        results += [row for row in rows if matches(query, (row['url'], row['description']))]
+        if len(results) >= limit:
+            break
+
+    return results[:limit]
+
+
+SOURCES = (
+    ('users', user_results),
+    ('collections', collection_results),
+    ('topics', topic_results),
+    ('links', link_results),
+)
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.SEARCH_WORKERS, thread_name_prefix='search')
+
+    return _executor
+
+
+# Pool threads manage their own database connections the way request threads do, and give up on their SQL
+# once the search's deadline passes instead of holding the thread past it
+def in_thread(name, source, query, limit, deadline):
+    close_old_connections()
+    try:
+        with transaction.atomic():
+            statement_budget(deadline)
+            if name in search_cache.SOURCES:
+                return search_cache.cached(name, query, {'section': limit}, lambda: source(query, limit))
+            return source(query, limit)
+    except OperationalError as error:
+        if getattr(error.__cause__, 'pgcode', None) == QUERY_CANCELED:
+            raise TimeoutError()
+        raise
+    finally:
+        close_old_connections()
+
+
+# Limits each statement of the current transaction to the time left until `deadline`
+def statement_budget(deadline):
+    remaining_ms = int((deadline - time.monotonic()) * 1000)
+    if remaining_ms <= 0:
+        raise TimeoutError()
+    if full_text_enabled():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('statement_timeout', %s, true)", [str(remaining_ms)])
+
+
+# Runs every source concurrently and returns a section per source, in SOURCES order
+def federated_search(query, limit):
+    deadline = time.monotonic() + settings.SEARCH_SOURCE_TIMEOUT_MS / 1000
+    futures = [(name, executor().submit(in_thread, name, source, query, limit, deadline)) for name, source in SOURCES]
+
+    sections = []
+    for name, future in futures:
+        section = {'type': name, 'status': 'ok', 'results': []}
+        try:
+            section['results'] = future.result(timeout=max(0, deadline - time.monotonic()))
+        except TimeoutError:
+            future.cancel()
+            section['status'] = 'timeout'
+        except Exception:
+            logger.exception("Search source %s failed", name)
+            section['status'] = 'error'
+        sections.append(section)
+
+    return sections
@@ -0,0 +1,115 @@
+"""
+Shared cache of search results.
+
+Results are cached in the default cache under the source, the source's current generation
+and a digest of the normalized query plus the paging parameters. Saving or deleting a row a
+source reads bumps that source's generation, immediately and again once the transaction
+commits, so entries cached from older data are never looked up again and simply expire
+after SEARCH_CACHE_TTL.
+
+Cached results never depend on who is searching: user results get the viewer's follow
+relationships added after they are read from the cache, so follows leave them valid.
+
+Topic autocomplete is not cached here: it is answered from the in-process topic index,
+which is cheaper than a cache round-trip.
+
+Hits and misses are counted per source; see `manage.py search_cache_stats`.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+SOURCES = ('users', 'collections', 'links')
+STATS = ('hits', 'misses')
+# Rows of each model feed these sources' results, including collections' author previews
+INVALIDATES = {
+    'User': ('users', 'collections'),
+    'Collection': ('collections', 'links'),
+    'Link': ('links',),
+}
+# User saves touching only other fields, such as last_login on every login, leave results as they were
+SEARCHED_USER_FIELDS = {'username', 'first_name', 'last_name', 'name', 'email', 'bio', 'image'}
+
+
+def normalize(query):
+    return ' '.join(query.lower().split())
+
+
+def generation_key(source):
+    return 'searchcache:generation:{}'.format(source)
+
+
+def stats_key(source, stat):
+    return 'searchcache:stats:{}:{}'.format(source, stat)
+
+
+# Generations start from the clock, so one lost to eviction restarts above any still-cached entries' generations
+def seed():
+    return int(time.time() * 1000)
+
+
+def generation(source):
+    cache.add(generation_key(source), seed(), None)
+    return cache.get(generation_key(source))
+
+
+def result_key(source, query, params):
+    digest = hashlib.sha1(json.dumps([query, params], sort_keys=True).encode('utf-8')).hexdigest()
+    return 'searchcache:{}:{}:{}'.format(source, generation(source), digest)
+
+
+# Returns the cached result for an already normalized query, or computes and caches it
+def cached(source, query, params, compute):
+    key = result_key(source, query, params)
+    result = cache.get(key)
+    if result is not None:
+        record(source, 'hits')
+        return result
+
+    record(source, 'misses')
+    result = compute()
+    cache.set(key, result, settings.SEARCH_CACHE_TTL)
+    return result
+
+
+def record(source, stat):
+    key = stats_key(source, stat)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def stats():
+    values = cache.get_many([stats_key(source, stat) for source in SOURCES for stat in STATS])
+    return {
+        source: {stat: values.get(stats_key(source, stat), 0) for stat in STATS}
+        for source in SOURCES
+    }
+
+
+def reset_stats():
+    cache.delete_many([stats_key(source, stat) for source in SOURCES for stat in STATS])
+
+
+def invalidate(instance, update_fields=None):
+    model = type(instance).__name__
+    if model == 'User' and update_fields is not None and not SEARCHED_USER_FIELDS & set(update_fields):
+        return
+
+    def bump():
+        for source in INVALIDATES[model]:
+            cache.add(generation_key(source), seed(), None)
+            try:
+                cache.incr(generation_key(source))
+            except ValueError:
+                cache.set(generation_key(source), seed(), None)
+
+    # Again after commit, in case a search cached the old rows while this transaction was open
+    bump()
+    transaction.on_commit(bump)
@@ -10,7 +10,8 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         # exclude = ('username', )
-        fields = '__all__'
+        # Denormalized counters and bookkeeping flags are internal; endpoints that list counts annotate them
+        exclude = ('search_vector', 'followerCount', 'followingCount', 'collectionCount', 'linkCount', 'suggestionsDirty')
         extra_kwargs = {
             'password': {'write_only': True}
         }
@@ -34,14 +35,15 @@ class FollowingSerializer(serializers.ModelSerializer):
 class LinkSerializer(serializers.ModelSerializer):
     class Meta:
         model = Link
-        fields = '__all__'
+        # changed_in is the id of the transaction that last wrote the row, for the sync endpoint only
+        exclude = ('changed_in', )
 
 
 class CollectionSerializer(serializers.ModelSerializer):
     author = UserPartSerializer()
     class Meta:
         model = Collection
-        fields = '__all__'
+        exclude = ('search_vector', 'linkCount', 'changed_in')
 
 
 class CollectionRelationshipSerializer(serializers.ModelSerializer):
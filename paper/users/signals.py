@@ -0,0 +1,174 @@
+from collections import Counter
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import changes, collection_cache, counters, search_cache, text_index, topic_bitmaps, topic_index
+from .graph import follow_graph
+from .models import User, Following, Collection, Link, Topic, TopicName, Tombstone, topic_key
+
+
+@receiver(post_save, sender=Following)
+def following_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.following_added(instance, User)
+        follow_graph().followed(instance)
+        suggestions_changed(pk=instance.creator_id)
+
+
+@receiver(post_delete, sender=Following)
+def following_deleted(sender, instance, **kwargs):
+    counters.following_removed(instance, User)
+    follow_graph().unfollowed(instance.creator_id, instance.following_id)
+    suggestions_changed(pk=instance.creator_id)
+
+
+@receiver(pre_save, sender=Collection)
+def collection_saving(sender, instance, **kwargs):
+    changes.saving(instance)
+
+
+@receiver(post_save, sender=Collection)
+def collection_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        counters.collection_added(instance, User)
+    collection_cache.changed(instance.pk)
+
+
+@receiver(post_delete, sender=Collection)
+def collection_deleted(sender, instance, **kwargs):
+    counters.collection_removed(instance, User)
+    collection_cache.changed(instance.pk)
+    # Nobody can sync a deleted collection, including the tombstones its cascade just left
+    Tombstone.objects.filter(collection_id=instance.pk).delete()
+
+
+# Points the tag at the canonical TopicName for its name, creating that on first use
+@receiver(pre_save, sender=Topic)
+def topic_saving(sender, instance, **kwargs):
+    instance.previous_topic_name_id = instance.topic_name_id
+    key = topic_key(instance.name)
+    if instance.topic_name_id is None or instance.topic_name.key != key:
+        instance.topic_name, _ = TopicName.objects.get_or_create(key=key, defaults={'name': instance.name.strip()})
+    changes.saving(instance)
+
+
+@receiver(post_save, sender=Topic)
+def topic_saved(sender, instance, created, **kwargs):
+    if created:
+        if counters.topic_added(instance, TopicName):
+            topic_index.topic_added(instance)
+        topic_bitmaps.topic_added(instance)
+    else:
+        if instance.previous_topic_name_id != instance.topic_name_id:
+            counters.topic_removed(instance, TopicName, instance.previous_topic_name_id)
+            counters.topic_added(instance, TopicName)
+            topic_bitmaps.topic_removed(instance, instance.previous_topic_name_id)
+            topic_bitmaps.topic_added(instance)
+        topic_index.topic_edited(instance)
+    suggestions_changed(collection__id=instance.collection_id)
+    collection_cache.changed(instance.collection_id)
+
+
+@receiver(post_delete, sender=Topic)
+def topic_deleted(sender, instance, **kwargs):
+    if counters.topic_removed(instance, TopicName):
+        topic_index.topic_removed(instance)
+    topic_bitmaps.topic_removed(instance)
+    suggestions_changed(collection__id=instance.collection_id)
+    collection_cache.changed(instance.collection_id)
+    changes.deleted(instance, 'topic')
+
+
+# Queues the matching users for the next incremental `manage.py compute_suggestions`
+def suggestions_changed(**filters):
+    User.objects.filter(suggestionsDirty=False, **filters).update(suggestionsDirty=True)
+
+
+@receiver(pre_save, sender=Link)
+def link_saving(sender, instance, **kwargs):
+    changes.saving(instance)
+
+
+@receiver(post_save, sender=Link)
+def link_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.links_added(User, Collection, instance.owner_id, instance.collection_id)
+    collection_cache.changed(instance.collection_id)
+
+
+@receiver(post_delete, sender=Link)
+def link_deleted(sender, instance, **kwargs):
+    counters.links_removed(User, Collection, instance.owner_id, instance.collection_id)
+    collection_cache.changed(instance.collection_id)
+    changes.deleted(instance, 'link')
+
+
+# bulk_create sends no post_save, so bulk inserts apply what link_saved and searched_row_saved would, in aggregate
+def links_bulk_created(links):
+    if not links:
+        return
+
+    for (owner_id, collection_id), count in Counter((link.owner_id, link.collection_id) for link in links).items():
+        counters.links_added(User, Collection, owner_id, collection_id, count)
+    collection_cache.changed(*set(link.collection_id for link in links))
+    search_cache.invalidate(links[0])
+    for link in links:
+        text_index.document_saved(link)
+
+
+# Compare-and-swap edits are queryset updates, which send no post_save either, so apply what collection_saved would
+def collection_updated(collection, update_fields):
+    collection_cache.changed(collection.pk)
+    search_cache.invalidate(collection)
+    text_index.document_saved(collection)
+
+
+# Likewise for link descriptions written by queryset update
+def links_bulk_updated(links):
+    if not links:
+        return
+
+    collection_cache.changed(*set(link.collection_id for link in links))
+    search_cache.invalidate(links[0])
+    for link in links:
+        text_index.document_saved(link)
+
+
+# Bulk-inserted topics skip topic_saving and topic_saved too; their topic_name must already be set
+def topics_bulk_created(topics):
+    for topic in topics:
+        # Bulk inserts only add topics their collection did not carry yet, so each one counts
+        counters.increment(TopicName, topic.topic_name_id, 'collection_count')
+        topic_index.topic_added(topic)
+        topic_bitmaps.topic_added(topic)
+
+    collection_ids = set(topic.collection_id for topic in topics)
+    for collection_id in collection_ids:
+        suggestions_changed(collection__id=collection_id)
+    collection_cache.changed(*collection_ids)
+
+
+# Respelling a tag keeps its TopicName, so only the collection's cached payload changes
+def topics_bulk_updated(topics):
+    collection_cache.changed(*set(topic.collection_id for topic in topics))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Collection)
+@receiver(post_save, sender=Link)
+def searched_row_saved(sender, instance, update_fields=None, **kwargs):
+    search_cache.invalidate(instance, update_fields)
+    text_index.document_saved(instance)
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, update_fields=None, **kwargs):
+    collection_cache.author_changed(instance, update_fields)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Collection)
+@receiver(post_delete, sender=Link)
+def searched_row_deleted(sender, instance, **kwargs):
+    search_cache.invalidate(instance)
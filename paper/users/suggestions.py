@@ -0,0 +1,134 @@
+"""
+"People you may know" suggestions, computed offline by `manage.py compute_suggestions`.
+
+The follow graph is loaded into a sparse adjacency matrix A (user x user) and topics into a
+binary matrix T (user x topic, from the user's non-private collections). For a batch of users,
+A[batch] @ A counts, for every candidate, how many of the people they follow follow that
+candidate; T[batch] @ T.T counts the topics they share. Candidates they already follow, or
+who are themselves, are dropped, and the top SUGGESTIONS_PER_USER by
+mutual + SUGGESTIONS_TOPIC_WEIGHT * shared topics are stored with an expiry.
+"""
+from datetime import timedelta
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .enums import CollectionPermission
+from .models import User, Following, Topic, UserSuggestion
+
+
+def pairs(queryset):
+    flat = np.fromiter(chain.from_iterable(queryset.iterator()), dtype=np.int64)
+    return flat.reshape(-1, 2)
+
+
+class SocialGraph:
+    def __init__(self):
+        self.user_ids = np.fromiter(User.objects.order_by('pk').values_list('pk', flat=True).iterator(), dtype=np.int64)
+        size = len(self.user_ids)
+
+        edges = pairs(Following.objects.order_by().values_list('creator_id', 'following_id'))
+        self.follows = sparse.csr_matrix(
+            (np.ones(len(edges), dtype=np.int32), (self.rows_of(edges[:, 0]), self.rows_of(edges[:, 1]))),
+            shape=(size, size),
+        )
+
+        authors, names = [], []
+        topics = Topic.objects.exclude(collection__permission=CollectionPermission.Private.name) \
+            .order_by().values_list('collection__author_id', 'name')
+        for author_id, name in topics.iterator():
+            authors.append(author_id)
+            names.append(name.strip().lower())
+
+        _, topic_columns = np.unique(np.array(names, dtype=object), return_inverse=True)
+        self.topics = sparse.csr_matrix(
+            (np.ones(len(authors), dtype=np.int32), (self.rows_of(np.array(authors, dtype=np.int64)), topic_columns)),
+            shape=(size, topic_columns.max() + 1 if len(names) else 0),
+        )
+        # Repeated (user, topic) pairs were summed; only whether the user uses the topic matters
+        self.topics.data[:] = 1
+
+    def rows_of(self, user_ids):
+        return np.searchsorted(self.user_ids, user_ids)
+
+    # The users themselves plus everyone following them, whose friends-of-friends go through them
+    def neighbourhood(self, user_ids):
+        rows = np.flatnonzero(np.isin(self.user_ids, list(user_ids)))
+        followers = self.follows.tocsc()[:, rows].nonzero()[0]
+        return np.union1d(rows, followers)
+
+    def suggest(self, rows, limit, topic_weight):
+        followed = self.follows[rows]
+        mutual = followed @ self.follows
+        # Drop candidates already followed and the users themselves
+        mutual = mutual - mutual.multiply(followed)
+        batch = np.arange(len(rows))
+        diagonal = np.asarray(mutual[batch, rows]).ravel()
+        mutual = mutual - sparse.csr_matrix((diagonal, (batch, rows)), shape=mutual.shape)
+        mutual = sparse.csr_matrix(mutual)
+        mutual.eliminate_zeros()
+        mutual.sort_indices()
+
+        # shared + 1 on exactly mutual's sparsity pattern, so both data arrays line up entry for entry
+        pattern = (mutual > 0).astype(np.int32)
+        shared = sparse.csr_matrix((self.topics[rows] @ self.topics.T).multiply(pattern) + pattern)
+        shared.sort_indices()
+
+        for i, row in enumerate(rows):
+            start, end = mutual.indptr[i], mutual.indptr[i + 1]
+            if start == end:
+                continue
+
+            columns = mutual.indices[start:end]
+            mutual_counts = mutual.data[start:end]
+            shared_counts = shared.data[start:end] - 1
+            scores = mutual_counts + topic_weight * shared_counts
+
+            top = np.argsort(-scores, kind='stable')[:limit] if len(scores) <= limit \
+                else np.argpartition(-scores, limit - 1)[:limit]
+            for j in top:
+                yield (int(self.user_ids[row]), int(self.user_ids[columns[j]]),
+                       float(scores[j]), int(mutual_counts[j]), int(shared_counts[j]))
+
+
+def stale_user_ids():
+    dirty = set(User.objects.filter(suggestionsDirty=True).values_list('pk', flat=True))
+    expired = set(UserSuggestion.objects.filter(expires__lte=timezone.now()).values_list('user_id', flat=True))
+    return dirty | expired
+
+
+# Recomputes suggestions for every user, or only for `user_ids` and their followers; returns how many were processed
+def compute(user_ids=None, batch_size=1000):
+    # Flags are cleared before the graph is read so that changes made while we run mark users dirty again
+    if user_ids is None:
+        User.objects.filter(suggestionsDirty=True).update(suggestionsDirty=False)
+    else:
+        User.objects.filter(pk__in=user_ids).update(suggestionsDirty=False)
+
+    graph = SocialGraph()
+    if not len(graph.user_ids):
+        return 0
+    rows = np.arange(len(graph.user_ids)) if user_ids is None else graph.neighbourhood(user_ids)
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        suggestions = graph.suggest(batch, settings.SUGGESTIONS_PER_USER, settings.SUGGESTIONS_TOPIC_WEIGHT)
+        store(graph.user_ids[batch].tolist(), suggestions)
+
+    return len(rows)
+
+
+def store(user_ids, suggestions):
+    expires = timezone.now() + timedelta(seconds=settings.SUGGESTIONS_TTL)
+
+    with transaction.atomic():
+        UserSuggestion.objects.filter(user_id__in=user_ids).delete()
+        UserSuggestion.objects.bulk_create([
+            UserSuggestion(user_id=user_id, suggested_id=suggested_id, score=score,
+                           mutual_count=mutual, shared_topic_count=shared, expires=expires)
+            for user_id, suggested_id, score, mutual, shared in suggestions
+        ])
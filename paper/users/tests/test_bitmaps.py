@@ -0,0 +1,59 @@
+import random
+
+from paper.users.bitmaps import Bitmap, ARRAY_MAX
+
+
+class TestBitmap:
+
+    def sample(self, rng, count, spread):
+        return set(rng.randrange(spread) for _ in range(count))
+
+    def test_operations_match_sets(self):
+        rng = random.Random(0)
+        # Sparse and dense containers, alone and against each other
+        for count, spread in [(10, 1 << 16), (3000, 1 << 16), (20000, 1 << 16), (20000, 1 << 20), (50, 1 << 30)]:
+            a, b = self.sample(rng, count, spread), self.sample(rng, 5000, 1 << 16)
+            left, right = Bitmap(a), Bitmap(b)
+
+            assert list(left) == sorted(a)
+            assert len(left) == len(a)
+            assert list(left & right) == sorted(a & b)
+            assert list(left | right) == sorted(a | b)
+            assert list(left - right) == sorted(a - b)
+            assert list(right - left) == sorted(b - a)
+
+    def test_containers_switch_representation_with_density(self):
+        bitmap = Bitmap(range(ARRAY_MAX))
+        assert not isinstance(bitmap.containers[0], int)
+
+        bitmap.add(ARRAY_MAX)
+        assert isinstance(bitmap.containers[0], int)
+        assert ARRAY_MAX in bitmap
+
+        bitmap.discard(0)
+        bitmap.discard(0)
+        assert not isinstance(bitmap.containers[0], int)
+        assert list(bitmap) == list(range(1, ARRAY_MAX + 1))
+
+        for value in range(1, ARRAY_MAX + 1):
+            bitmap.discard(value)
+        assert bitmap.containers == {}
+
+    def test_updates_leave_operands_alone(self):
+        a, b = Bitmap([1, 2, 70000]), Bitmap([2, 3])
+        union = a | b
+        union.add(4)
+        union.discard(70000)
+
+        assert list(a) == [1, 2, 70000]
+        assert list(b) == [2, 3]
+        assert list(union) == [1, 2, 3, 4]
+
+    def test_descending_resumes_below_a_value(self):
+        values = [5, 65535, 65536, 70000, 1 << 20]
+        bitmap = Bitmap(values)
+
+        assert list(bitmap.descending()) == values[::-1]
+        assert list(bitmap.descending(before=70000)) == [65536, 65535, 5]
+        assert list(bitmap.descending(before=65536)) == [65535, 5]
+        assert list(bitmap.descending(before=5)) == []
@@ -0,0 +1,84 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from paper.users.models import Collection, Link, Topic
+from paper.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestCollectionCache:
+
+    def setup_collection(self):
+        author = UserFactory()
+        collection = Collection.objects.create(author=author, name="Reading", description="", permission="Public")
+        Link.objects.create(owner=author, collection=collection, url="https://a.example", description="a")
+        Topic.objects.create(name="python", collection=collection)
+        return author, collection
+
+    def get(self, client, collection, etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return client.get("/api/collections/{}".format(collection.pk), **headers)
+
+    def test_repeat_reads_are_served_from_the_cache(self):
+        _, collection = self.setup_collection()
+        client = APIClient()
+        first = self.get(client, collection)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.get(client, collection)
+
+        assert not [query for query in queries if "users_" in query["sql"]]
+        assert second.json() == first.json()
+        assert second["ETag"] == first["ETag"]
+        assert first.json()["topics"] == ["python"]
+
+    def test_etag_answers_conditional_requests_until_a_write(self):
+        author, collection = self.setup_collection()
+        client = APIClient()
+        etag = self.get(client, collection)["ETag"]
+
+        response = self.get(client, collection, etag)
+        assert response.status_code == 304
+        assert response["ETag"] == etag
+
+        client.post("/api/collections/link", {
+            "user_id": author.pk, "collection_id": collection.pk,
+            "link": {"url": "https://b.example", "description": "b"},
+        }, format="json")
+
+        response = self.get(client, collection, etag)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+        assert [link["url"] for link in response.json()["links"]] == ["https://a.example", "https://b.example"]
+
+    def test_writes_through_each_view_refresh_the_payload(self):
+        author, collection = self.setup_collection()
+        client = APIClient()
+        self.get(client, collection)
+
+        client.post("/api/collections/link/edit", {
+            "user_id": author.pk, "collection_id": collection.pk,
+            "link": {"url": "https://a.example", "description": "edited"},
+        }, format="json")
+        assert self.get(client, collection).json()["links"][0]["description"] == "edited"
+
+        client.post("/api/topics/create", {"topic_name": "django", "collection_id": collection.pk}, format="json")
+        assert self.get(client, collection).json()["topics"] == ["python", "django"]
+
+        client.post("/api/collections/edit", {
+            "collection_id": collection.pk, "name": "Renamed", "user_id": author.pk, "description": "",
+            "links": [], "topics": [], "permission": "Public",
+        }, format="json")
+        data = self.get(client, collection).json()
+        assert data["collectionInfo"]["name"] == "Renamed"
+        assert data["links"] == [] and data["topics"] == []
+
+        author.name = "New name"
+        author.save()
+        assert self.get(client, collection).json()["collectionInfo"]["author"]["name"] == "New name"
+
+        Collection.objects.filter(pk=collection.pk).delete()
+        assert self.get(client, collection).status_code == 404
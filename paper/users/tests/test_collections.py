@@ -0,0 +1,327 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from paper.users import changes
+from paper.users.models import Collection, Link, Tombstone, Topic, TopicName
+from paper.users.tests.factories import UserFactory
+from paper.users.views import edit_collection_view, edit_link_view
+
+pytestmark = pytest.mark.django_db
+
+
+def payload(author, links=(), topics=(), **fields):
+    data = {
+        "name": "Reading", "user_id": author.pk, "description": "", "permission": "Public",
+        "links": [{"url": url, "description": "about " + url} for url in links], "topics": list(topics),
+    }
+    data.update(fields)
+    return data
+
+
+class TestCreateCollection:
+
+    def test_creates_links_and_topics(self):
+        author = UserFactory()
+        TopicName.objects.create(key="python", name="Python")
+
+        response = APIClient().post("/api/collections", payload(
+            author, links=["https://b.example", "https://a.example"], topics=["python", "Django", "django"],
+        ), format="json")
+        data = response.json()
+
+        collection = Collection.objects.get(pk=data["collectionInfo"]["id"])
+        assert [link["url"] for link in data["links"]] == ["https://b.example", "https://a.example"]
+        assert [link["id"] for link in data["links"]] == list(
+            Link.objects.filter(collection=collection).order_by("pk").values_list("pk", flat=True))
+        assert set(data["links"][0]) == {"id", "created", "owner", "url", "collection", "description", "inReadingList",
+                                         "version", "updated"}
+        assert not {"linkCount", "changed_in", "search_vector"} & set(data["collectionInfo"])
+        # Spellings of one topic tag the collection once, so the response lists each topic's first spelling
+        assert data["topics"] == ["python", "Django"]
+        assert sorted(data["collectionInfo"]["topics"]) == sorted(TopicName.objects.values_list("pk", flat=True))
+
+        collection.refresh_from_db()
+        author.refresh_from_db()
+        assert collection.linkCount == 2 and author.linkCount == 2
+        assert dict(TopicName.objects.values_list("key", "collection_count")) == {"python": 1, "django": 1}
+        assert Topic.objects.filter(collection=collection, topic_name__key="django").count() == 1
+
+    def test_rejects_duplicate_links(self):
+        author = UserFactory()
+
+        response = APIClient().post("/api/collections", payload(
+            author, links=["https://a.example", "https://b.example", "https://a.example"],
+        ), format="json")
+
+        assert response.status_code == 400
+        assert not Collection.objects.exists()
+
+    def test_query_count_does_not_grow_with_links(self):
+        author = UserFactory()
+        client = APIClient()
+        client.post("/api/collections", payload(author, links=["https://warmup.example"], topics=["a", "b"]),
+                    format="json")
+
+        def create(count, topics):
+            links = ["https://{}.example/{}".format(count, i) for i in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                client.post("/api/collections", payload(author, links=links, topics=topics), format="json")
+            return len(queries)
+
+        assert create(5, ["a", "b"]) == create(100, ["a", "b"])
+
+
+class TestEditCollection:
+
+    def create(self, client, author, links, topics):
+        return client.post("/api/collections", payload(author, links=links, topics=topics), format="json").json()
+
+    def edit(self, client, author, collection_id, links, topics, **fields):
+        data = payload(author, topics=topics, collection_id=collection_id, **fields)
+        data["links"] = links
+        return client.post("/api/collections/edit", data, format="json")
+
+    def test_applies_only_the_difference(self):
+        author = UserFactory()
+        client = APIClient()
+        created = self.create(client, author, ["https://a.example", "https://b.example", "https://c.example"],
+                              ["python", "django", "rust"])
+        collection_id = created["collectionInfo"]["id"]
+        ids = {link["url"]: link["id"] for link in created["links"]}
+        topic_ids = dict(Topic.objects.filter(collection_id=collection_id).values_list("topic_name__key", "pk"))
+
+        data = self.edit(client, author, collection_id, [
+            {"url": "https://c.example", "description": "about https://c.example"},
+            {"url": "https://a.example", "description": "edited"},
+            {"url": "https://d.example", "description": "new"},
+        ], ["Python", "go", "django"], name="Renamed").json()
+
+        assert [(link["url"], link["description"]) for link in data["links"]] == [
+            ("https://c.example", "about https://c.example"), ("https://a.example", "edited"),
+            ("https://d.example", "new"),
+        ]
+        assert data["links"][0]["id"] == ids["https://c.example"]
+        assert data["links"][1]["id"] == ids["https://a.example"]
+        assert not Link.objects.filter(pk=ids["https://b.example"]).exists()
+        assert data["topics"] == ["Python", "go", "django"]
+        assert data["collectionInfo"]["name"] == "Renamed"
+
+        topics = dict(Topic.objects.filter(collection_id=collection_id).values_list("topic_name__key", "pk"))
+        assert topics["python"] == topic_ids["python"] and topics["django"] == topic_ids["django"]
+        assert set(topics) == {"python", "django", "go"}
+        assert Topic.objects.get(pk=topic_ids["python"]).name == "Python"
+        assert Collection.objects.get(pk=collection_id).linkCount == 3
+        assert dict(TopicName.objects.values_list("key", "collection_count")) == {
+            "python": 1, "django": 1, "rust": 0, "go": 1,
+        }
+
+    def test_write_volume_follows_the_change_not_the_collection(self):
+        author = UserFactory()
+        client = APIClient()
+
+        def edit_one_description(size):
+            links = ["https://{}.example/{}".format(size, i) for i in range(size)]
+            collection_id = self.create(client, author, links, ["a", "b"])["collectionInfo"]["id"]
+            edited = [{"url": url, "description": "about " + url} for url in links]
+            edited[0]["description"] = "edited"
+
+            with CaptureQueriesContext(connection) as queries:
+                self.edit(client, author, collection_id, edited, ["a", "b"])
+            return [query["sql"] for query in queries
+                    if not query["sql"].startswith(("SELECT", "SAVEPOINT", "RELEASE"))]
+
+        small, large = edit_one_description(5), edit_one_description(100)
+        assert len(small) == len(large)
+        # The collection's compare-and-swap and the one description
+        assert [sql.split()[0] for sql in large] == ["UPDATE", "UPDATE"]
+
+
+class TestEditConflicts:
+
+    def setup_collection(self, client):
+        author = UserFactory()
+        data = client.post("/api/collections", payload(author, links=["https://a.example"], topics=["python"]),
+                           format="json").json()
+        return author, data["collectionInfo"]
+
+    def edit(self, client, author, info, **fields):
+        data = payload(author, links=["https://a.example"], topics=["python"], collection_id=info["id"])
+        data.update(fields)
+        return client.post("/api/collections/edit", data, format="json")
+
+    def edit_link(self, client, author, info, description, version=None):
+        link = {"url": "https://a.example", "description": description}
+        if version is not None:
+            link["version"] = version
+        return client.post("/api/collections/link/edit", {
+            "user_id": author.pk, "collection_id": info["id"], "link": link,
+        }, format="json")
+
+    def test_stale_collection_edit_is_refused(self):
+        client = APIClient()
+        author, info = self.setup_collection(client)
+        assert info["version"] == 1
+
+        first = self.edit(client, author, info, name="First tab", version=1)
+        assert first.status_code == 200
+        assert first.json()["collectionInfo"]["version"] == 2
+
+        second = self.edit(client, author, info, name="Second tab", version=1)
+        assert second.status_code == 409
+        assert second.json()["version"] == 2
+        assert Collection.objects.get(pk=info["id"]).name == "First tab"
+
+        # Retrying from the current version goes through
+        assert self.edit(client, author, info, name="Second tab", version=2).status_code == 200
+        assert Collection.objects.get(pk=info["id"]).name == "Second tab"
+
+    def test_link_edits_use_the_same_scheme_and_move_the_collection_on(self):
+        client = APIClient()
+        author, info = self.setup_collection(client)
+
+        edited = self.edit_link(client, author, info, "first", version=1)
+        assert edited.status_code == 200
+        assert edited.json()["version"] == 2
+
+        stale = self.edit_link(client, author, info, "second", version=1)
+        assert stale.status_code == 409
+        assert stale.json()["version"] == 2
+        assert Link.objects.get(url="https://a.example").description == "first"
+
+        # A collection edit started before the link edit would overwrite it
+        assert self.edit(client, author, info, version=1).status_code == 409
+
+    def test_edits_without_a_version_apply_to_the_current_one(self):
+        client = APIClient()
+        author, info = self.setup_collection(client)
+
+        assert self.edit_link(client, author, info, "edited").status_code == 200
+        assert self.edit(client, author, info, name="Renamed").json()["collectionInfo"]["version"] == 3
+        assert self.edit(client, author, info, version="two").status_code == 400
+
+    def test_link_edit_writes_the_link_once(self):
+        client = APIClient()
+        author, info = self.setup_collection(client)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.edit_link(client, author, info, "edited")
+        link_updates = [query["sql"] for query in queries if query["sql"].startswith('UPDATE "users_link"')]
+        assert len(link_updates) == 1
+
+    def test_loaded_links_carry_the_version_to_edit_from(self):
+        client = APIClient()
+        author, info = self.setup_collection(client)
+
+        loaded = client.get("/api/collections/{}".format(info["id"])).json()["links"][0]
+        assert loaded["id"] == Link.objects.get(url="https://a.example").pk
+        assert self.edit_link(client, author, info, "first", version=loaded["version"]).status_code == 200
+        # A second tab still holding the loaded version loses
+        assert self.edit_link(client, author, info, "second", version=loaded["version"]).status_code == 409
+        assert client.get("/api/collections/{}".format(info["id"])).json()["links"][0]["version"] == 2
+
+    def test_edits_lock_only_for_their_own_transaction(self):
+        # Not the request's: the compare-and-swap's row lock is released before the response is built
+        assert "default" in edit_collection_view._non_atomic_requests
+        assert "default" in edit_link_view._non_atomic_requests
+
+
+# Tokens come from transaction ids, so each request has to commit its own
+@pytest.mark.django_db(transaction=True)
+class TestCollectionSync:
+
+    def sync(self, client, collection_id, token=None):
+        params = {} if token is None else {"token": token}
+        return client.get("/api/collections/{}/sync".format(collection_id), params)
+
+    def test_returns_only_changes_since_the_token(self):
+        client = APIClient()
+        author = UserFactory()
+        info = client.post("/api/collections", payload(
+            author, links=["https://a.example", "https://b.example"], topics=["python", "django"],
+        ), format="json").json()["collectionInfo"]
+
+        full = self.sync(client, info["id"]).json()
+        assert [link["url"] for link in full["links"]["upserted"]] == ["https://a.example", "https://b.example"]
+        assert [topic["name"] for topic in full["topics"]["upserted"]] == ["python", "django"]
+
+        removed = Link.objects.get(url="https://b.example").pk
+        client.post("/api/collections/edit", payload(
+            author, links=["https://a.example", "https://c.example"], topics=["python", "Django"],
+            collection_id=info["id"], version=1,
+        ), format="json")
+
+        delta = self.sync(client, info["id"], full["token"]).json()
+        assert full["full"] is True and delta["full"] is False
+        assert delta["collectionInfo"]["version"] == 2
+        assert [link["url"] for link in delta["links"]["upserted"]] == ["https://c.example"]
+        assert delta["links"]["deleted"] == [removed]
+        assert [topic["name"] for topic in delta["topics"]["upserted"]] == ["Django"]
+        assert delta["topics"]["deleted"] == []
+
+        client.delete("/api/collections/link", {
+            "user_id": author.pk, "collection_id": info["id"], "url": "https://a.example",
+        }, format="json")
+        client.post("/api/topics/create", {"topic_name": "rust", "collection_id": info["id"]}, format="json")
+
+        latest = self.sync(client, info["id"], delta["token"]).json()
+        assert latest["links"]["upserted"] == [] and len(latest["links"]["deleted"]) == 1
+        assert [topic["name"] for topic in latest["topics"]["upserted"]] == ["rust"]
+
+    def test_unchanged_collection_is_one_query(self):
+        client = APIClient()
+        author = UserFactory()
+        info = client.post("/api/collections", payload(author, links=["https://a.example"]),
+                           format="json").json()["collectionInfo"]
+
+        token = self.sync(client, info["id"]).json()["token"]
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.sync(client, info["id"], token).json()
+        assert data == {"token": data["token"], "full": False, "links": {"upserted": [], "deleted": []},
+                        "topics": {"upserted": [], "deleted": []}}
+        assert len([query for query in queries if query["sql"].startswith("SELECT")]) == 1
+
+    def test_bad_tokens(self):
+        client = APIClient()
+        author = UserFactory()
+        info = client.post("/api/collections", payload(author, links=["https://a.example"]),
+                           format="json").json()["collectionInfo"]
+
+        assert self.sync(client, info["id"], "abc").status_code == 400
+        assert self.sync(client, 0).status_code == 404
+
+    def test_expired_tokens_resync_everything(self):
+        client = APIClient()
+        author = UserFactory()
+        info = client.post("/api/collections", payload(author, links=["https://a.example"]),
+                           format="json").json()["collectionInfo"]
+        horizon = self.sync(client, info["id"]).json()["token"].split("-")[0]
+
+        # Issued at the epoch, long before SYNC_TOKEN_MAX_AGE ago
+        data = self.sync(client, info["id"], "{}-0".format(horizon)).json()
+        assert data["full"] is True
+        assert [link["url"] for link in data["links"]["upserted"]] == ["https://a.example"]
+
+    def test_old_tombstones_are_pruned(self, settings):
+        client = APIClient()
+        author = UserFactory()
+        info = client.post("/api/collections", payload(author, links=["https://a.example", "https://b.example"]),
+                           format="json").json()["collectionInfo"]
+        for url in ("https://a.example", "https://b.example"):
+            client.delete("/api/collections/link", {
+                "user_id": author.pk, "collection_id": info["id"], "url": url,
+            }, format="json")
+        old = Tombstone.objects.order_by("pk").first()
+        Tombstone.objects.filter(pk=old.pk).update(
+            deleted=timezone.now() - timedelta(seconds=settings.SYNC_TOKEN_MAX_AGE + changes.TOMBSTONE_GRACE + 1))
+
+        call_command("prune_tombstones", stdout=StringIO())
+
+        assert Tombstone.objects.count() == 1 and not Tombstone.objects.filter(pk=old.pk).exists()
@@ -0,0 +1,98 @@
+import pytest
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from paper.users import feed
+from paper.users.models import Following, FeedEntry
+from paper.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def publish(client, author, name, permission="Public"):
+    return client.post("/api/collections", {
+        "name": name, "user_id": author.pk, "description": "", "links": [], "topics": [], "permission": permission
+    }, format="json").json()
+
+
+class TestHomeFeed:
+
+    def test_publishing_fans_out_to_followers(self, user: settings.AUTH_USER_MODEL):
+        author = UserFactory()
+        Following.objects.create(creator=user, following=author)
+        client = APIClient()
+
+        publish(client, author, "first")
+        publish(client, author, "hidden", permission="Private")
+        publish(client, author, "second")
+
+        data = client.get("/api/users/{}/feed".format(user.pk)).json()
+
+        assert [c["name"] for c in data["collections"]] == ["second", "first"]
+        assert data["collections"][0]["author"]["id"] == author.pk
+        assert not FeedEntry.objects.filter(owner=author).exists()
+
+    def test_unfollowed_authors_leave_the_feed(self, user: settings.AUTH_USER_MODEL):
+        author, friend = UserFactory(), UserFactory()
+        follow = Following.objects.create(creator=user, following=author)
+        Following.objects.create(creator=user, following=friend)
+        client = APIClient()
+
+        publish(client, author, "unfollowed")
+        publish(client, friend, "kept")
+        follow.delete()
+
+        data = client.get("/api/users/{}/feed".format(user.pk)).json()
+
+        assert [c["name"] for c in data["collections"]] == ["kept"]
+
+    def test_feeds_are_trimmed_to_length(self, user: settings.AUTH_USER_MODEL, settings):
+        settings.FEED_LENGTH = 2
+        author = UserFactory()
+        Following.objects.create(creator=user, following=author)
+        client = APIClient()
+
+        for name in ["a", "b", "c", "d"]:
+            publish(client, author, name)
+
+        data = client.get("/api/users/{}/feed".format(user.pk)).json()
+
+        assert [c["name"] for c in data["collections"]] == ["d", "c"]
+        assert FeedEntry.objects.filter(owner=user).count() == 2
+
+    def test_high_follower_authors_are_pulled_and_merged(self, user: settings.AUTH_USER_MODEL, settings):
+        settings.FEED_PULL_THRESHOLD = 2
+        celebrity, friend = UserFactory(), UserFactory()
+        for follower in [user, UserFactory()]:
+            Following.objects.create(creator=follower, following=celebrity)
+        Following.objects.create(creator=user, following=friend)
+        client = APIClient()
+
+        for name, author in [("f1", friend), ("c1", celebrity), ("f2", friend), ("c2", celebrity), ("f3", friend)]:
+            publish(client, author, name)
+
+        url = "/api/users/{}/feed".format(user.pk)
+        first = client.get(url, {"page_size": 3}).json()
+        second = client.get(url, {"page_size": 3, "cursor": first["next"]}).json()
+
+        assert not FeedEntry.objects.filter(collection__author=celebrity).exists()
+        assert [c["name"] for c in first["collections"]] == ["f3", "c2", "f2"]
+        assert [c["name"] for c in second["collections"]] == ["c1", "f1"]
+        assert second["next"] is None
+
+    def test_pull_authors_are_read_in_one_query(self, user: settings.AUTH_USER_MODEL, settings):
+        settings.FEED_PULL_THRESHOLD = 1
+        client = APIClient()
+        for name in ["a", "b", "c"]:
+            author = UserFactory()
+            Following.objects.create(creator=user, following=author)
+            publish(client, author, name)
+
+        with CaptureQueriesContext(connection) as queries:
+            streams = [list(stream) for stream in feed.feed_streams(user.pk)]
+
+        # The pull author ids, the pushed entries and every pull author's collections
+        assert len(queries) == 3
+        assert [sorted(feed.feed_collection(row).name for row in stream) for stream in streams] == [[], ["a", "b", "c"]]
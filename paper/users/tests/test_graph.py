@@ -0,0 +1,187 @@
+from io import StringIO
+
+import fakeredis
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+
+from paper.users import graph
+from paper.users.graph import FollowGraph, LocalSortedSets, RedisSortedSets, FOLLOWING, FOLLOWERS, key_for
+from paper.users.models import Following
+from paper.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+class BrokenSortedSets(LocalSortedSets):
+    def exists(self, key):
+        raise ConnectionError("redis is down")
+
+
+# Every test taking `sets` runs against both the in-process stand-in and the Redis implementation
+@pytest.fixture(params=["local", "redis"])
+def sets(request):
+    if request.param == "redis":
+        return RedisSortedSets(fakeredis.FakeStrictRedis())
+    return LocalSortedSets()
+
+
+@pytest.fixture
+def follow_graph(sets, monkeypatch):
+    monkeypatch.setattr(graph, "_graph", FollowGraph(sets))
+    return graph.follow_graph()
+
+
+def load(sets, key, scored_members):
+    return sets.finish_load(key, sets.begin_load(key), scored_members, 60)
+
+
+class TestSortedSets:
+
+    def test_top_pages_down_from_a_score(self, sets):
+        load(sets, "k", [("1", 10), ("2", 20), ("3", 20), ("4", 30)])
+
+        assert sets.exists("k")
+        assert sets.top("k", float('inf'), 2) == ["4", "3"]
+        assert sets.top("k", 20, 3) == ["3", "2", "1"]
+        assert sets.top("k", 10, 5) == ["1", graph.LOADED_MARKER]
+        assert sets.count_at("k", 20) == 2
+
+    def test_writes_only_reach_loaded_sets(self, sets):
+        sets.add_if_exists("cold", "1", 10)
+        assert not sets.exists("cold")
+
+        load(sets, "k", [("1", 10)])
+        sets.add_if_exists("k", "2", 20)
+        sets.remove("k", "1")
+
+        assert sets.score("k", "2") == 20
+        assert sets.score("k", "1") is None
+
+    def test_abandoned_and_superseded_loads_are_discarded(self, sets):
+        token = sets.begin_load("k")
+        sets.abandon_load("k")
+        assert not sets.finish_load("k", token, [("1", 10)], 60)
+
+        stale = sets.begin_load("k")
+        fresh = sets.begin_load("k")
+        assert not sets.finish_load("k", stale, [("1", 10)], 60)
+        assert sets.finish_load("k", fresh, [("2", 20)], 60)
+        assert sets.top("k", float('inf'), 5) == ["2", graph.LOADED_MARKER]
+
+    def test_union_sums_weighted_sets(self, sets):
+        sets.increment("a", "1", 2, 60)
+        sets.increment("a", "2", 1, 60)
+        sets.increment("b", "1", 4, 60)
+
+        sets.union("sum", [("a", 1), ("b", 0.5)], 60)
+        sets.union("empty", [("missing", 1)], 60)
+
+        assert sets.top_scored("sum", 2) == [("1", 4), ("2", 1)]
+        assert sets.exists("empty")
+        sets.increment_if_exists("sum", "2", 5)
+        assert sets.score("sum", "2") == 6
+
+
+class TestRedisSortedSets:
+
+    def test_loaded_sets_expire(self):
+        client = fakeredis.FakeStrictRedis()
+        sets = RedisSortedSets(client)
+
+        load(sets, "k", [("1", 10)])
+
+        assert 0 < client.ttl("k") <= 60
+        assert client.get(graph.loading_key("k")) is None
+
+    def test_a_write_between_the_token_check_and_the_store_discards_the_load(self, monkeypatch):
+        server = fakeredis.FakeServer()
+        sets = RedisSortedSets(fakeredis.FakeStrictRedis(server=server))
+        writer = RedisSortedSets(fakeredis.FakeStrictRedis(server=server))
+        token = sets.begin_load("k")
+
+        pipeline = sets.client.pipeline
+
+        def racing_pipeline(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            get = pipe.get
+
+            def get_then_write(name):
+                value = get(name)
+                writer.abandon_load("k")
+                return value
+
+            pipe.get = get_then_write
+            return pipe
+
+        monkeypatch.setattr(sets.client, "pipeline", racing_pipeline)
+
+        assert not sets.finish_load("k", token, [("1", 10)], 60)
+        assert not sets.exists("k")
+
+    def test_a_write_through_onto_an_expired_set_does_not_count_as_loaded(self):
+        client = fakeredis.FakeStrictRedis()
+        sets = RedisSortedSets(client)
+        load(sets, "k", [("1", 10)])
+
+        client.delete("k")
+        client.execute_command("ZADD", "k", 20, "2")
+
+        assert not sets.exists("k")
+
+
+class TestFollowGraph:
+
+    def test_writes_go_through_to_loaded_sets(self, user: settings.AUTH_USER_MODEL, follow_graph):
+        other = UserFactory()
+        assert not follow_graph.is_following(user.pk, other.pk)
+
+        follow = Following.objects.create(creator=user, following=other)
+        assert follow_graph.is_following(user.pk, other.pk)
+
+        follow.delete()
+        assert not follow_graph.is_following(user.pk, other.pk)
+
+    def test_cold_sets_load_from_the_database(self, user: settings.AUTH_USER_MODEL, follow_graph):
+        others = [UserFactory() for _ in range(3)]
+        for other in others:
+            Following.objects.create(creator=other, following=user)
+
+        key = key_for(FOLLOWERS, user.pk)
+        assert not follow_graph.sets.exists(key)
+
+        follow_graph.ensure_loaded(FOLLOWERS, user.pk)
+
+        assert follow_graph.sets.top(key, float('inf'), 10)[:3] == [str(other.pk) for other in reversed(others)]
+
+    def test_falls_back_to_the_database_when_unavailable(self, user: settings.AUTH_USER_MODEL):
+        other = UserFactory()
+        Following.objects.create(creator=user, following=other)
+        follow_graph = FollowGraph(BrokenSortedSets(), errors=(ConnectionError,))
+
+        assert follow_graph.is_following(user.pk, other.pk)
+        assert not follow_graph.is_following(other.pk, user.pk)
+
+    def test_rebuild_command_loads_every_user(self, user: settings.AUTH_USER_MODEL, follow_graph):
+        other = UserFactory()
+        Following.objects.create(creator=user, following=other)
+        follow_graph.sets.delete(key_for(FOLLOWING, user.pk))
+        follow_graph.sets.delete(key_for(FOLLOWERS, other.pk))
+
+        call_command("rebuild_follow_graph", stdout=StringIO())
+
+        sets = follow_graph.sets
+        assert sets.top(key_for(FOLLOWING, user.pk), float('inf'), 10) == [str(other.pk), graph.LOADED_MARKER]
+        assert sets.top(key_for(FOLLOWERS, other.pk), float('inf'), 10) == [str(user.pk), graph.LOADED_MARKER]
+
+    def test_a_follow_during_a_load_discards_the_load(self, user: settings.AUTH_USER_MODEL, follow_graph):
+        other = UserFactory()
+        key = key_for(FOLLOWING, user.pk)
+
+        # The load reads before the follow commits, and would store its rows after the follow is applied
+        token = follow_graph.sets.begin_load(key)
+        Following.objects.create(creator=user, following=other)
+
+        assert not follow_graph.sets.finish_load(key, token, [], 60)
+        assert not follow_graph.sets.exists(key)
+        assert follow_graph.is_following(user.pk, other.pk)
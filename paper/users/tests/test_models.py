@@ -1,8 +1,103 @@
+from io import StringIO
+
 import pytest
 from django.conf import settings
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from paper.users.models import User, Following, Collection, Link, Topic, TopicName
+from paper.users.tests.factories import UserFactory
 
 pytestmark = pytest.mark.django_db
 
 
 # def test_user_get_absolute_url(user: settings.AUTH_USER_MODEL):
 #     assert user.get_absolute_url() == f"/users/{user.username}/"
+
+
+class TestSocialCounters:
+
+    def test_counters_follow_writes(self, user: settings.AUTH_USER_MODEL):
+        other = UserFactory()
+        follow = Following.objects.create(creator=user, following=other)
+        collection = Collection.objects.create(author=user, name="c", permission="Public")
+        Link.objects.create(owner=user, url="https://a.com", collection=collection)
+        Link.objects.create(owner=user, url="https://b.com", inReadingList=True)
+
+        user.refresh_from_db()
+        other.refresh_from_db()
+        collection.refresh_from_db()
+        assert (user.followingCount, user.collectionCount, user.linkCount) == (1, 1, 1)
+        assert other.followerCount == 1
+        assert collection.linkCount == 1
+
+        follow.delete()
+        collection.delete()
+
+        user.refresh_from_db()
+        other.refresh_from_db()
+        assert (user.followingCount, user.collectionCount, user.linkCount) == (0, 0, 0)
+        assert other.followerCount == 0
+
+    def test_decrement_never_goes_negative(self, user: settings.AUTH_USER_MODEL):
+        follow = Following.objects.create(creator=user, following=UserFactory())
+        User.objects.filter(pk=user.pk).update(followingCount=0)
+
+        follow.delete()
+
+        user.refresh_from_db()
+        assert user.followingCount == 0
+
+    def test_reconcile_counters_repairs_drift(self, user: settings.AUTH_USER_MODEL):
+        collection = Collection.objects.create(author=user, name="c", permission="Public")
+        Link.objects.create(owner=user, url="https://a.com", collection=collection)
+        Following.objects.create(creator=UserFactory(), following=user)
+        User.objects.filter(pk=user.pk).update(followerCount=7, collectionCount=0)
+        Collection.objects.filter(pk=collection.pk).update(linkCount=3)
+
+        call_command("reconcile_counters", batch_size=1, stdout=StringIO())
+
+        user.refresh_from_db()
+        collection.refresh_from_db()
+        assert (user.followerCount, user.collectionCount, user.linkCount) == (1, 1, 1)
+        assert collection.linkCount == 1
+
+
+class TestTopicNames:
+
+    def test_tags_resolve_to_case_folded_names_with_counts(self, user: settings.AUTH_USER_MODEL):
+        first = Collection.objects.create(author=user, name="a", permission="Public")
+        second = Collection.objects.create(author=user, name="b", permission="Public")
+        Topic.objects.create(name="Python", collection=first)
+        tag = Topic.objects.create(name=" python", collection=second)
+
+        name = TopicName.objects.get()
+        assert (name.name, name.key, name.collection_count) == ("Python", "python", 2)
+        assert list(first.topics.all()) == [name]
+
+        tag.name = "Rust"
+        tag.save()
+        second.delete()
+
+        assert dict(TopicName.objects.values_list("key", "collection_count")) == {"python": 1, "rust": 0}
+
+    def test_popular_topics(self, user: settings.AUTH_USER_MODEL):
+        collection = Collection.objects.create(author=user, name="a", permission="Public")
+        for name in ["rust", "Go", "go", "python", "GO", "rust"]:
+            Topic.objects.create(name=name, collection=collection)
+        # Tags sharing a name count their collection once
+        assert dict(TopicName.objects.values_list("key", "collection_count")) == {"go": 1, "python": 1, "rust": 1}
+
+        for name, count in [("go", 2), ("rust", 1)]:
+            for i in range(count):
+                other = Collection.objects.create(author=user, name=name, permission="Public")
+                Topic.objects.create(name=name, collection=other)
+
+        data = APIClient().get("/api/topics/popular", {"limit": 2}).json()
+
+        assert data == [{"name": "Go", "collection_count": 3}, {"name": "rust", "collection_count": 2}]
+
+        Topic.objects.filter(collection=collection, name="GO").delete()
+        assert TopicName.objects.get(key="go").collection_count == 3
+        call_command("reconcile_counters", stdout=StringIO())
+        assert TopicName.objects.get(key="go").collection_count == 3
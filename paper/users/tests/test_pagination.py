@@ -0,0 +1,61 @@
+import pytest
+from django.conf import settings
+from rest_framework.test import APIClient
+
+from paper.users.models import Following, Collection, Topic
+from paper.users.pagination import NEXT_CURSOR_HEADER
+from paper.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestKeysetPagination:
+
+    def test_followers_pages_cover_every_row_once(self, user: settings.AUTH_USER_MODEL):
+        followers = [UserFactory() for _ in range(7)]
+        for follower in followers:
+            Following.objects.create(creator=follower, following=user)
+
+        client = APIClient()
+        url = "/api/users/{}/followers".format(user.pk)
+        seen = []
+        response = client.get(url, {"page_size": 3})
+        while True:
+            assert len(response.json()) <= 3
+            seen += [row["id"] for row in response.json()]
+            cursor = response.get(NEXT_CURSOR_HEADER)
+            if not cursor:
+                break
+            response = client.get(url, {"page_size": 3, "cursor": cursor})
+
+        assert seen == [follower.pk for follower in reversed(followers)]
+
+    def test_dict_responses_carry_next_cursor(self, user: settings.AUTH_USER_MODEL):
+        for i in range(3):
+            Collection.objects.create(author=user, name="c{}".format(i), permission="Public")
+
+        client = APIClient()
+        url = "/api/users/{}/collections".format(user.pk)
+        first = client.get(url, {"page_size": 2}).json()
+        second = client.get(url, {"page_size": 2, "cursor": first["next"]}).json()
+
+        assert [c["name"] for c in first["collections"]] == ["c2", "c1"]
+        assert [c["name"] for c in second["collections"]] == ["c0"]
+        assert second["next"] is None
+
+    def test_topics_paginate_by_name(self, user: settings.AUTH_USER_MODEL):
+        collection = Collection.objects.create(author=user, name="c", permission="Public")
+        for name in ["delta", "alpha", "charlie", "bravo", "alpha"]:
+            Topic.objects.create(name=name, collection=collection)
+
+        client = APIClient()
+        first = client.get("/api/topics/all", {"page_size": 2})
+        second = client.get("/api/topics/all", {"page_size": 2, "cursor": first[NEXT_CURSOR_HEADER]})
+
+        assert first.json() == ["alpha", "bravo"]
+        assert second.json() == ["charlie", "delta"]
+
+    def test_invalid_cursor_is_rejected(self, user: settings.AUTH_USER_MODEL):
+        response = APIClient().get("/api/users/{}/following".format(user.pk), {"cursor": "not-a-cursor"})
+
+        assert response.status_code == 400
@@ -0,0 +1,143 @@
+import time
+from concurrent.futures import TimeoutError
+
+import pytest
+from django.db import connection
+from rest_framework.test import APIClient
+
+from paper.users import search
+from paper.users.models import Collection, Link, Topic
+from paper.users.search import full_text_enabled, trigram_enabled
+from paper.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestSearch:
+
+    def test_collection_search_is_public_and_paginated(self):
+        author = UserFactory()
+        for i in range(3):
+            Collection.objects.create(author=author, name="Python reading {}".format(i), description="",
+                                      permission="Public")
+        Collection.objects.create(author=author, name="Python secrets", description="", permission="Private")
+        Collection.objects.create(author=author, name="Gardening", description="", permission="Public")
+        client = APIClient()
+
+        first = client.post("/api/collections/search", {"query": "pyth", "page_size": 2}, format="json").json()
+        second = client.post("/api/collections/search", {"query": "pyth", "cursor": first["next"]},
+                             format="json").json()
+
+        names = [c["name"] for c in first["collections"] + second["collections"]]
+        assert sorted(names) == ["Python reading 0", "Python reading 1", "Python reading 2"]
+        assert second["next"] is None
+        assert first["collections"][0]["author"]["id"] == author.pk
+
+    def test_user_search_matches_username_prefix(self):
+        match = UserFactory(username="ada_lovelace")
+        UserFactory(username="grace")
+        client = APIClient()
+
+        data = client.post("/api/users/search", {"query": "ada"}, format="json").json()
+
+        assert [u["id"] for u in data] == [match.pk]
+
+    @pytest.mark.skipif(not full_text_enabled(), reason="full text search needs PostgreSQL")
+    def test_full_text_matches_every_word_across_fields_ranked(self):
+        author = UserFactory()
+        named = Collection.objects.create(author=author, name="Distributed systems", description="papers",
+                                          permission="Public")
+        described = Collection.objects.create(author=author, name="Weekend reading",
+                                              description="notes on distributed systems", permission="Public")
+        Collection.objects.create(author=author, name="Distributed cooking", description="", permission="Public")
+        client = APIClient()
+
+        data = client.post("/api/collections/search", {"query": "distributed system"}, format="json").json()
+
+        # Name matches are weighted above description matches
+        assert [c["id"] for c in data["collections"]] == [named.pk, described.pk]
+
+        named.name = "Renamed"
+        named.save()
+        data = client.post("/api/collections/search", {"query": "distributed system"}, format="json").json()
+        assert [c["id"] for c in data["collections"]] == [described.pk]
+
+    def test_typeahead_returns_top_matches(self, settings):
+        settings.TYPEAHEAD_LIMIT = 2
+        for username in ["lovelace", "ada_lovelace", "adalove"]:
+            UserFactory(username=username)
+        UserFactory(username="grace")
+        client = APIClient()
+
+        data = client.post("/api/users/search", {"query": "lovel", "mode": "typeahead"}, format="json").json()
+
+        assert len(data) == 2
+        assert all("love" in u["username"] for u in data)
+        assert set(data[0]) == {"id", "username", "first_name", "last_name", "name", "image"}
+
+    def test_typeahead_tolerates_typos(self):
+        # Checking for pg_trgm takes a query, so it cannot run while tests are collected
+        if not trigram_enabled():
+            pytest.skip("typo tolerance needs the pg_trgm extension")
+        match = UserFactory(username="lovelace")
+        UserFactory(username="grace")
+        client = APIClient()
+
+        data = client.post("/api/users/search", {"query": "lovleace", "mode": "typeahead"}, format="json").json()
+
+        assert [u["id"] for u in data] == [match.pk]
+
+
+@pytest.mark.django_db(transaction=True)
+class TestFederatedSearch:
+
+    def test_returns_a_section_per_source(self):
+        author = UserFactory(username="rustacean")
+        public = Collection.objects.create(author=author, name="Rust reading", description="", permission="Public")
+        private = Collection.objects.create(author=author, name="Rust notes", description="", permission="Private")
+        Topic.objects.create(name="rust", collection=public)
+        link = Link.objects.create(owner=author, collection=public, url="https://rust-lang.org", description="home")
+        Link.objects.create(owner=author, collection=private, url="https://rust-lang.org/private", description="")
+
+        data = APIClient().post("/api/search", {"query": "rust"}, format="json").json()
+
+        sections = {section["type"]: section for section in data["sections"]}
+        assert [section["type"] for section in data["sections"]] == ["users", "collections", "topics", "links"]
+        assert all(section["status"] == "ok" for section in data["sections"])
+        assert [u["id"] for u in sections["users"]["results"]] == [author.pk]
+        assert [c["id"] for c in sections["collections"]["results"]] == [public.pk]
+        assert sections["collections"]["results"][0]["author"]["username"] == "rustacean"
+        assert sections["topics"]["results"] == ["rust"]
+        assert [result["id"] for result in sections["links"]["results"]] == [link.pk]
+
+    def test_slow_and_failing_sources_do_not_block_the_rest(self, monkeypatch, settings):
+        settings.SEARCH_SOURCE_TIMEOUT_MS = 50
+
+        def slow(query, limit):
+            time.sleep(0.5)
+            return ["late"]
+
+        def failing(query, limit):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(search, "SOURCES", (("slow", slow), ("failing", failing), ("topics", search.topic_results)))
+
+        data = APIClient().post("/api/search", {"query": "x"}, format="json").json()
+
+        assert [(s["type"], s["status"], s["results"]) for s in data["sections"]] == [
+            ("slow", "timeout", []), ("failing", "error", []), ("topics", "ok", []),
+        ]
+
+    @pytest.mark.skipif(not full_text_enabled(), reason="full text search needs PostgreSQL")
+    def test_timed_out_sources_stop_their_sql(self):
+        def sleepy(query, limit):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_sleep(5)")
+
+        started = time.monotonic()
+        future = search.executor().submit(search.in_thread, "sleepy", sleepy, "x", 5, started + 0.05)
+
+        # Cancelled by the statement timeout, freeing the pool thread long before the sleep would end
+        with pytest.raises(TimeoutError):
+            future.result(timeout=4)
+        assert time.monotonic() - started < 2
@@ -0,0 +1,68 @@
+import pytest
+from django.contrib.auth.models import update_last_login
+from rest_framework.test import APIClient
+
+from paper.users import search_cache
+from paper.users.models import Collection, Following
+from paper.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def search(client, query):
+    return client.post("/api/collections/search", {"query": query}, format="json").json()["collections"]
+
+
+class TestSearchCache:
+
+    def test_normalized_queries_share_an_entry(self):
+        author = UserFactory()
+        Collection.objects.create(author=author, name="Rust reading", description="", permission="Public")
+        client = APIClient()
+
+        first = search(client, "rust")
+        second = search(client, "  RUST ")
+
+        assert first == second
+        assert search_cache.stats()["collections"] == {"hits": 1, "misses": 1}
+
+    def test_writes_invalidate_cached_results(self):
+        author = UserFactory()
+        Collection.objects.create(author=author, name="Rust reading", description="", permission="Public")
+        client = APIClient()
+        assert len(search(client, "rust")) == 1
+
+        Collection.objects.create(author=author, name="Rust notes", description="", permission="Public")
+        assert len(search(client, "rust")) == 2
+
+        author.username = "renamed"
+        author.save()
+        assert {c["author"]["username"] for c in search(client, "rust")} == {"renamed"}
+        assert search_cache.stats()["collections"] == {"hits": 0, "misses": 3}
+
+    def test_logins_do_not_invalidate(self):
+        user = UserFactory()
+        generation = search_cache.generation("users")
+
+        update_last_login(None, user)
+
+        assert search_cache.generation("users") == generation
+
+    def test_relationship_flags_are_added_to_cached_results(self):
+        viewer, other_viewer = UserFactory(), UserFactory()
+        target = UserFactory(username="rustacean")
+        client = APIClient()
+
+        def flags(viewer):
+            data = {"query": "rustacean", "viewer_id": viewer.pk}
+            return client.post("/api/users/search", data, format="json").json()[0]["viewer_follows"]
+
+        assert flags(viewer) is False
+        following = Following.objects.create(creator=viewer, following=target)
+        assert flags(viewer) is True
+        assert flags(other_viewer) is False
+        following.delete()
+        assert flags(viewer) is False
+
+        # Follows leave the cached rows valid, and every viewer shares them
+        assert search_cache.stats()["users"] == {"hits": 3, "misses": 1}
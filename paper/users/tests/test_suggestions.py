@@ -0,0 +1,79 @@
+from io import StringIO
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from paper.users.models import User, Following, Collection, Topic, UserSuggestion
+from paper.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def follow(creator, *others):
+    for other in others:
+        Following.objects.create(creator=creator, following=other)
+
+
+def tag(author, *names):
+    collection = Collection.objects.create(author=author, name="c", permission="Public")
+    for name in names:
+        Topic.objects.create(name=name, collection=collection)
+
+
+class TestSuggestions:
+
+    def test_ranks_friends_of_friends(self, user: settings.AUTH_USER_MODEL):
+        a, b, popular, niche = [UserFactory() for _ in range(4)]
+        follow(user, a, b)
+        follow(a, popular, niche, user)
+        follow(b, popular)
+        tag(user, "Python")
+        tag(niche, "python ")
+
+        call_command("compute_suggestions", stdout=StringIO())
+
+        data = APIClient().get("/api/users/{}/suggestions".format(user.pk)).json()["suggestions"]
+        assert [(s["id"], s["mutual_count"], s["shared_topic_count"]) for s in data] == [
+            (popular.pk, 2, 0), (niche.pk, 1, 1)
+        ]
+
+    def test_incremental_run_only_touches_changed_neighbourhoods(self, user: settings.AUTH_USER_MODEL):
+        a, b, c, bystander, d = [UserFactory() for _ in range(5)]
+        follow(user, a)
+        follow(a, b)
+        follow(bystander, d)
+        follow(d, c)
+        call_command("compute_suggestions", stdout=StringIO())
+        assert not User.objects.filter(suggestionsDirty=True).exists()
+        UserSuggestion.objects.filter(user=bystander).update(score=99)
+
+        follow(a, c)
+        call_command("compute_suggestions", stdout=StringIO())
+
+        assert set(UserSuggestion.objects.filter(user=user).values_list("suggested_id", flat=True)) == {b.pk, c.pk}
+        assert UserSuggestion.objects.get(user=bystander).score == 99
+
+    def test_bulk_follows_queue_both_sides_for_recompute(self, user: settings.AUTH_USER_MODEL):
+        a, b, c = [UserFactory() for _ in range(3)]
+        follow(a, b)
+        call_command("compute_suggestions", stdout=StringIO())
+        assert not User.objects.filter(suggestionsDirty=True).exists()
+
+        url = "/api/users/{}/following/bulk".format(user.pk)
+        APIClient().post(url, {"user_ids": [a.pk, c.pk]}, format="json")
+
+        assert set(User.objects.filter(suggestionsDirty=True).values_list("pk", flat=True)) == {user.pk, a.pk, c.pk}
+        call_command("compute_suggestions", stdout=StringIO())
+        assert list(UserSuggestion.objects.filter(user=user).values_list("suggested_id", flat=True)) == [b.pk]
+
+    def test_followed_users_are_hidden_before_recompute(self, user: settings.AUTH_USER_MODEL):
+        a, b = UserFactory(), UserFactory()
+        follow(user, a)
+        follow(a, b)
+        call_command("compute_suggestions", stdout=StringIO())
+
+        follow(user, b)
+
+        assert APIClient().get("/api/users/{}/suggestions".format(user.pk)).json()["suggestions"] == []
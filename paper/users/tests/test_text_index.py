@@ -0,0 +1,104 @@
+import os
+import time
+
+import pytest
+from rest_framework.test import APIClient
+
+from paper.users import text_index
+from paper.users.models import Collection, Link
+from paper.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(autouse=True)
+def index_dir(settings, tmpdir, monkeypatch):
+    settings.TEXT_INDEX_DIR = tmpdir.strpath
+    settings.TEXT_INDEX_REFRESH_INTERVAL = 0
+    monkeypatch.setattr(text_index, "_indexes", {})
+
+
+@pytest.fixture
+def collection():
+    return Collection.objects.create(author=UserFactory(), name="c", description="", permission="Public")
+
+
+def link(collection, url, description=""):
+    return Link.objects.create(owner=collection.author, collection=collection, url=url, description=description)
+
+
+class TestSegments:
+
+    def test_postings_round_trip(self):
+        keys = [1, 2, 127, 128, 300, 16384, 2 ** 40]
+        assert text_index.decode_postings(text_index.encode_postings(keys)) == keys
+
+    def test_segment_prefix_lookup_and_merge(self, tmpdir):
+        first = tmpdir.join("a.idx").strpath
+        second = tmpdir.join("b.idx").strpath
+        text_index.write_segment(first, [("rust", [1, 5]), ("rustacean", [2]), ("zig", [3])], 5)
+        text_index.write_segment(second, [("python", [7]), ("rust", [6, 7])], 7)
+
+        segment = text_index.Segment(first)
+        assert list(segment.prefix_postings("rust")) == [[1, 5], [2]]
+        assert list(segment.prefix_postings("ruby")) == []
+
+        merged = tmpdir.join("merged.idx").strpath
+        text_index.merge_segments([segment, text_index.Segment(second)], merged, live={1, 2, 3, 6, 7})
+        merged = text_index.Segment(merged)
+        assert [(term, merged.postings(i)) for term, i in merged.terms()] == [
+            ("python", [7]), ("rust", [1, 6, 7]), ("rustacean", [2]), ("zig", [3]),
+        ]
+        assert merged.max_pk == 7
+
+
+class TestTextIndex:
+
+    def test_builds_merge_and_serve_link_search(self, collection):
+        rust = link(collection, "https://rust-lang.org", "The Rust book")
+        link(collection, "https://python.org", "Docs")
+        text_index.rebuild("links", batch_size=1)
+
+        index = text_index.text_index("links")
+        assert index.search("rust BOOK") == [rust.pk]
+
+        # Rows created after the build are served from the delta segment until the next build
+        newer = link(collection, "https://doc.rust-lang.org/std", "Rust standard library")
+        assert index.search("rust") == [newer.pk, rust.pk]
+
+        text_index.build_incremental("links", batch_size=100)
+        assert len(text_index.read_manifest(text_index.index_directory("links"))["segments"]) == 2
+        rust.delete()
+        text_index.merge("links")
+
+        assert len(text_index.read_manifest(text_index.index_directory("links"))["segments"]) == 1
+        assert index.search("rust") == [newer.pk]
+
+    def test_replaced_segments_outlive_one_manifest_swap(self, collection):
+        link(collection, "https://rust-lang.org", "The Rust book")
+        directory = text_index.index_directory("links")
+        first = text_index.rebuild("links", batch_size=100)
+        # Segment names carry the build's millisecond
+        time.sleep(0.002)
+
+        # A worker that read the first manifest can still open its segments after the next swap
+        second = text_index.rebuild("links", batch_size=100)
+        assert text_index.read_manifest(directory)["retired"] == [os.path.basename(path) for path in first]
+        assert all(os.path.exists(path) for path in first)
+
+        time.sleep(0.002)
+        text_index.rebuild("links", batch_size=100)
+        assert not any(os.path.exists(path) for path in first)
+        assert all(os.path.exists(path) for path in second)
+
+    def test_federated_links_come_from_the_index(self, collection):
+        rust = link(collection, "https://rust-lang.org", "The Rust book")
+        edited = link(collection, "https://example.com", "rust notes")
+        text_index.rebuild("links", batch_size=100)
+        edited.description = "gardening"
+        edited.save()
+
+        data = APIClient().post("/api/search", {"query": "rust"}, format="json").json()
+
+        links = next(section for section in data["sections"] if section["type"] == "links")
+        assert [result["id"] for result in links["results"]] == [rust.pk]
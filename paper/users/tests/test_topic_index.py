@@ -0,0 +1,62 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from paper.users.models import Collection, Topic
+from paper.users.topic_index import TopicIndex
+from paper.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def collection():
+    cache.clear()
+    return Collection.objects.create(author=UserFactory(), name="c", description="", permission="Public")
+
+
+class TestTopicIndex:
+
+    def test_prefix_queries_are_case_insensitive_over_canonical_names(self, collection):
+        for name in ["Python", "python", "pytest", "Rust", "pytest"]:
+            Topic.objects.create(name=name, collection=collection)
+        index = TopicIndex()
+
+        assert index.complete("PY") == ["pytest", "Python"]
+        assert index.complete("py", after="pytest", limit=1) == ["Python"]
+        # Counts are of collections, and every tag here is on the same one
+        assert index.count("pytest") == 1
+        assert index.count("Python") == 1
+
+    def test_workers_replay_writes_without_reloading(self, collection):
+        Topic.objects.create(name="python", collection=collection)
+        index = TopicIndex()
+        assert index.complete("p") == ["python"]
+
+        Topic.objects.create(name="perl", collection=collection)
+        Topic.objects.filter(name="python").delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            assert index.complete("p") == ["perl"]
+        assert len(queries) == 0
+
+    def test_expired_deltas_reload_the_table(self, collection):
+        index = TopicIndex()
+        assert index.complete("") == []
+
+        Topic.objects.create(name="go", collection=collection)
+        cache.delete("topicindex:change:{}".format(cache.get("topicindex:version")))
+
+        assert index.complete("") == ["go"]
+
+    def test_search_endpoint_pages_through_index(self, collection):
+        client = APIClient()
+        for name in ["django", "docker", "dart", "rust"]:
+            client.post("/api/topics/create", {"topic_name": name, "collection_id": collection.pk}, format="json")
+
+        first = client.post("/api/topics/search", {"query": "d", "page_size": 2}, format="json")
+        second = client.post("/api/topics/search", {"query": "d", "cursor": first["X-Next-Cursor"]}, format="json")
+
+        assert first.json() + second.json() == ["dart", "django", "docker"]
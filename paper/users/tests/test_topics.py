@@ -0,0 +1,253 @@
+import math
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from paper.users import topic_bitmaps, trending
+from paper.users.bitmaps import Bitmap
+from paper.users.models import Collection, RelatedTopic, Topic
+from paper.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def tag(name, count, permission="Public"):
+    collections = []
+    for i in range(count):
+        collection = Collection.objects.create(author=UserFactory(), name="{} {}".format(name, i), description="d",
+                                               permission=permission)
+        Topic.objects.create(name=name, collection=collection)
+        collections.append(collection)
+    return collections
+
+
+class TestTopicView:
+
+    def count_queries(self, url, params=None):
+        client = APIClient()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, params or {})
+        assert response.status_code == 200
+        return len(queries), response.json()
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        tag("small", 2)
+        tag("large", 40)
+
+        small, _ = self.count_queries("/api/topic/small")
+        large, data = self.count_queries("/api/topic/LARGE")
+
+        assert large == small
+        assert len(data["collections"]) == 40
+
+    def test_lists_public_collections_once_in_the_original_shape(self):
+        public = tag("rust", 3)
+        tag("rust", 1, permission="Private")
+        Topic.objects.create(name="Rust", collection=public[0])
+
+        _, first = self.count_queries("/api/topic/rust", {"page_size": 2})
+        _, second = self.count_queries("/api/topic/rust", {"page_size": 2, "cursor": first["next"]})
+
+        collections = first["collections"] + second["collections"]
+        assert [c["id"] for c in collections] == [c.pk for c in reversed(public)]
+        assert set(collections[0]) == {"created", "author", "name", "description", "id", "permission"}
+        assert collections[0]["author"]["id"] == public[-1].author_id
+        assert second["next"] is None
+
+
+@pytest.mark.django_db(transaction=True)
+class TestTopicQuery:
+
+    def query(self, **terms):
+        return APIClient().post("/api/topics/query", terms, format="json")
+
+    def ids(self, **terms):
+        return [c["id"] for c in self.query(**terms).json()["collections"]]
+
+    def test_combines_topics_with_and_or_not(self):
+        author = UserFactory()
+        tagged = {}
+        for name, topics in [("ab", "a b"), ("abc", "a b c"), ("a", "a"), ("bd", "b d"), ("abd", "A B d")]:
+            collection = Collection.objects.create(author=author, name=name, description="", permission="Public")
+            for topic in topics.split():
+                Topic.objects.create(name=topic, collection=collection)
+            tagged[name] = collection.pk
+        private = Collection.objects.create(author=author, name="private", description="", permission="Private")
+        Topic.objects.create(name="a", collection=private)
+        Topic.objects.create(name="b", collection=private)
+
+        assert self.ids(all=["a", "b"]) == [tagged["abd"], tagged["abc"], tagged["ab"]]
+        assert self.ids(all=["a", "b"], none=["c"]) == [tagged["abd"], tagged["ab"]]
+        assert self.ids(any=["c", "d"]) == [tagged["abd"], tagged["bd"], tagged["abc"]]
+        assert self.ids(all=["a"], any=["c", "d"], none=["missing"]) == [tagged["abd"], tagged["abc"]]
+        assert self.ids(all=["a", "missing"]) == []
+
+    def test_bitmaps_follow_topic_and_collection_writes(self):
+        author = UserFactory()
+        first = Collection.objects.create(author=author, name="first", description="", permission="Public")
+        second = Collection.objects.create(author=author, name="second", description="", permission="Public")
+        Topic.objects.create(name="go", collection=first)
+        assert self.ids(all=["go"]) == [first.pk]
+
+        # Served from the cached bitmaps from here on, which the writes update in place
+        topic = Topic.objects.create(name="go", collection=second)
+        cached = cache.get(topic_bitmaps.BITMAP_KEY.format(topic_bitmaps.topic_bitmap_name(topic.topic_name_id)))
+        assert list(cached) == [first.pk, second.pk]
+        assert self.ids(all=["go"]) == [second.pk, first.pk]
+
+        Topic.objects.filter(collection=first).delete()
+        assert self.ids(all=["go"]) == [second.pk]
+
+        second.permission = "Private"
+        second.save()
+        assert self.ids(all=["go"]) == []
+
+        topic = Topic.objects.get(collection=second)
+        topic.name = "rust"
+        topic.save()
+        second.permission = "Public"
+        second.save()
+        assert self.ids(all=["go"]) == []
+        assert self.ids(all=["rust"]) == [second.pk]
+
+    def test_writers_patch_one_at_a_time(self, monkeypatch):
+        monkeypatch.setattr(topic_bitmaps.transaction, "on_commit", lambda apply: apply())
+        name = topic_bitmaps.topic_bitmap_name(1)
+        key = topic_bitmaps.BITMAP_KEY.format(name)
+        cache.set(key, Bitmap([1]))
+
+        topic_bitmaps.update(name, add=[2])
+        assert list(cache.get(key)) == [1, 2]
+
+        # While another writer holds the bitmap, patching it too could lose that writer's change
+        cache.add(topic_bitmaps.LOCK_KEY.format(name), 0)
+        topic_bitmaps.update(name, add=[3])
+        assert cache.get(key) is None
+
+    def test_pages_newest_first(self):
+        author = UserFactory()
+        collections = []
+        for i in range(5):
+            collection = Collection.objects.create(author=author, name=str(i), description="", permission="Public")
+            Topic.objects.create(name="python", collection=collection)
+            collections.append(collection.pk)
+
+        client = APIClient()
+        first = client.post("/api/topics/query", {"all": ["python"], "page_size": 3}, format="json").json()
+        second = client.post("/api/topics/query", {"all": ["python"], "cursor": first["next"]}, format="json").json()
+
+        assert [c["id"] for c in first["collections"] + second["collections"]] == collections[::-1]
+        assert second["next"] is None
+        assert first["collections"][0]["author"]["id"] == author.pk
+
+    def test_pages_skip_private_collections(self):
+        author = UserFactory()
+        public = []
+        for i in range(6):
+            permission = "Public" if i % 3 == 0 else "Private"
+            collection = Collection.objects.create(author=author, name=str(i), description="", permission=permission)
+            Topic.objects.create(name="python", collection=collection)
+            if permission == "Public":
+                public.append(collection.pk)
+
+        client = APIClient()
+        first = client.post("/api/topics/query", {"all": ["python"], "page_size": 1}, format="json").json()
+        second = client.post("/api/topics/query", {"all": ["python"], "cursor": first["next"]}, format="json").json()
+
+        assert [c["id"] for c in first["collections"] + second["collections"]] == public[::-1]
+        assert second["next"] is None
+
+    def test_rejects_queries_without_topics_to_match(self):
+        assert self.query(none=["a"]).status_code == 400
+        assert self.query(all="a").status_code == 400
+
+
+@pytest.mark.django_db(transaction=True)
+class TestTrendingTopics:
+
+    def create(self, client, author, topics):
+        return client.post("/api/collections", {
+            "name": "c", "user_id": author.pk, "description": "", "links": [], "topics": topics,
+            "permission": "Public",
+        }, format="json").json()["collectionInfo"]["id"]
+
+    def trending(self, client):
+        return [(t["name"], t["score"]) for t in client.get("/api/topics/trending").json()]
+
+    def test_counts_attaches_from_every_view(self, monkeypatch, settings):
+        monkeypatch.setattr(trending, "now", lambda: 10 * settings.TRENDING_BUCKET_SECONDS)
+        author = UserFactory()
+        client = APIClient()
+
+        collection_id = self.create(client, author, ["python", "django"])
+        self.create(client, author, ["Python"])
+        client.post("/api/topics/create", {"topic_name": "rust", "collection_id": collection_id}, format="json")
+        assert self.trending(client)[0] == ("python", 2.0)
+        assert dict(self.trending(client)) == {"python": 2.0, "rust": 1.0, "django": 1.0}
+
+        # Re-saving topics the collection already has is not a new attach, whether or not scores were materialized
+        client.post("/api/collections/edit", {
+            "collection_id": collection_id, "name": "c", "user_id": author.pk, "description": "", "links": [],
+            "topics": ["python", "django", "rust", "go"], "permission": "Public",
+        }, format="json")
+        assert dict(self.trending(client)) == {"python": 2.0, "rust": 1.0, "go": 1.0, "django": 1.0}
+
+    def test_older_attaches_decay(self, monkeypatch, settings):
+        settings.TRENDING_HALF_LIFE_SECONDS = settings.TRENDING_BUCKET_SECONDS
+        settings.TRENDING_WINDOW_BUCKETS = 3
+        clock = [10 * settings.TRENDING_BUCKET_SECONDS]
+        monkeypatch.setattr(trending, "now", lambda: clock[0])
+        author = UserFactory()
+        client = APIClient()
+
+        self.create(client, author, ["old"])
+        self.create(client, author, ["old"])
+        self.create(client, author, ["old"])
+        clock[0] += 2 * settings.TRENDING_BUCKET_SECONDS
+        self.create(client, author, ["new"])
+        assert self.trending(client) == [("new", 1.0), ("old", 0.75)]
+
+        # Once out of the window an attach no longer counts at all
+        clock[0] += settings.TRENDING_BUCKET_SECONDS
+        assert self.trending(client) == [("new", 0.5)]
+
+
+class TestRelatedTopics:
+
+    def test_topic_view_lists_topics_sharing_its_collections(self, settings):
+        settings.RELATED_TOPICS_MIN_SHARED = 1
+        settings.RELATED_TOPICS_PER_TOPIC = 2
+        author = UserFactory()
+        for topics, permission in [("python django", "Public"), ("python django", "Public"), ("python numpy", "Public"),
+                                   ("python numpy scipy", "Public"), ("python flask", "Public"),
+                                   ("python flask", "Private"), ("python flask", "Private"), ("rust", "Public")]:
+            collection = Collection.objects.create(author=author, name="c", description="", permission=permission)
+            for topic in topics.split():
+                Topic.objects.create(name=topic, collection=collection)
+
+        call_command("compute_related_topics", stdout=StringIO())
+
+        data = APIClient().get("/api/topic/Python").json()
+        # django and numpy share two collections with python, scipy shares one but only has that one
+        assert data["related"] == ["django", "numpy"]
+        assert APIClient().get("/api/topic/scipy").json()["related"] == ["numpy", "python"]
+        assert APIClient().get("/api/topic/rust").json()["related"] == []
+
+        related = RelatedTopic.objects.get(topic_name__key="scipy", related__key="numpy")
+        assert related.shared_count == 1
+        assert related.score == pytest.approx(1 / math.sqrt(2))
+
+    def test_rare_pairs_are_dropped(self, settings):
+        settings.RELATED_TOPICS_MIN_SHARED = 2
+        collection = Collection.objects.create(author=UserFactory(), name="c", description="", permission="Public")
+        Topic.objects.create(name="a", collection=collection)
+        Topic.objects.create(name="b", collection=collection)
+
+        call_command("compute_related_topics", stdout=StringIO())
+
+        assert not RelatedTopic.objects.exists()
@@ -1,7 +1,12 @@
 import pytest
 from django.conf import settings
+from django.db import connection
 from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
+from paper.users.models import Following, Collection
+from paper.users.tests.factories import UserFactory
 from paper.users.views import UserRedirectView, UserUpdateView
 
 pytestmark = pytest.mark.django_db
@@ -51,3 +56,165 @@ pytestmark = pytest.mark.django_db
 #         view.request = request
 #
 #         assert view.get_redirect_url() == f"/users/{user.username}/"
+
+
+class TestUserInformationView:
+
+    def test_internal_columns_are_not_exposed(self, user: settings.AUTH_USER_MODEL):
+        data = APIClient().post("/api/users", {"user_id": user.pk, "isLoggedInUser": True}, format="json").json()
+
+        assert data["username"] == user.username
+        assert not {"followerCount", "followingCount", "collectionCount", "linkCount", "suggestionsDirty"} & set(data)
+
+
+@pytest.mark.django_db(transaction=True)
+class TestUserFollowViews:
+
+    def follow_all(self, target, count, as_follower):
+        users = [UserFactory() for _ in range(count)]
+        for other in users:
+            if as_follower:
+                Following.objects.create(creator=other, following=target)
+            else:
+                Following.objects.create(creator=target, following=other)
+            Collection.objects.create(author=other, name="c", permission="Public")
+        return users
+
+    def count_queries(self, url):
+        client = APIClient()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        assert response.status_code == 200
+        return len(queries), response.json()
+
+    def test_following_returns_collection_counts(self, user: settings.AUTH_USER_MODEL):
+        followed = self.follow_all(user, 2, as_follower=False)
+        Collection.objects.create(author=followed[0], name="second", permission="Private")
+
+        _, data = self.count_queries("/api/users/{}/following".format(user.pk))
+
+        counts = {row["id"]: row["collection_count"] for row in data}
+        assert counts == {followed[0].pk: 2, followed[1].pk: 1}
+        assert set(data[0].keys()) == {
+            "id", "username", "first_name", "last_name", "name", "image", "collection_count", "followed", "follow_id"
+        }
+
+    def test_following_query_count_is_constant(self, user: settings.AUTH_USER_MODEL):
+        url = "/api/users/{}/following".format(user.pk)
+        # Warms the follow graph so both measurements read it
+        self.count_queries(url)
+        self.follow_all(user, 1, as_follower=False)
+        few, _ = self.count_queries(url)
+        self.follow_all(user, 10, as_follower=False)
+        many, data = self.count_queries(url)
+
+        assert len(data) == 11
+        assert few == many
+
+    def test_followers_query_count_is_constant(self, user: settings.AUTH_USER_MODEL):
+        url = "/api/users/{}/followers".format(user.pk)
+        # Warms the follow graph so both measurements read it
+        self.count_queries(url)
+        self.follow_all(user, 1, as_follower=True)
+        few, _ = self.count_queries(url)
+        self.follow_all(user, 10, as_follower=True)
+        many, data = self.count_queries(url)
+
+        assert len(data) == 11
+        assert all(row["collection_count"] == 1 for row in data)
+        assert few == many
+
+
+class TestUserBulkFollowingView:
+
+    def test_bulk_follow_reports_each_id(self, user: settings.AUTH_USER_MODEL):
+        first, second = UserFactory(), UserFactory()
+        Following.objects.create(creator=user, following=second)
+        client = APIClient()
+        url = "/api/users/{}/following/bulk".format(user.pk)
+
+        response = client.post(url, {"user_ids": [first.pk, second.pk, 0, first.pk]}, format="json")
+
+        assert response.json()["results"] == [
+            {"id": first.pk, "status": "followed"},
+            {"id": second.pk, "status": "already_following"},
+            {"id": 0, "status": "not_found"},
+        ]
+        assert Following.objects.filter(creator=user).count() == 2
+        user.refresh_from_db()
+        first.refresh_from_db()
+        assert user.followingCount == 2
+        assert first.followerCount == 1
+
+    def test_bulk_follow_refuses_self_follows(self, user: settings.AUTH_USER_MODEL):
+        other = UserFactory()
+        url = "/api/users/{}/following/bulk".format(user.pk)
+
+        response = APIClient().post(url, {"user_ids": [user.pk, other.pk]}, format="json")
+
+        assert response.json()["results"] == [
+            {"id": user.pk, "status": "invalid"},
+            {"id": other.pk, "status": "followed"},
+        ]
+        assert list(Following.objects.filter(creator=user).values_list("following_id", flat=True)) == [other.pk]
+        user.refresh_from_db()
+        assert (user.followingCount, user.followerCount) == (1, 0)
+
+    def test_bulk_unfollow(self, user: settings.AUTH_USER_MODEL):
+        followed = UserFactory()
+        Following.objects.create(creator=user, following=followed)
+        client = APIClient()
+        url = "/api/users/{}/following/bulk".format(user.pk)
+
+        response = client.delete(url, {"user_ids": [followed.pk, 0]}, format="json")
+
+        assert response.json()["results"] == [
+            {"id": followed.pk, "status": "unfollowed"},
+            {"id": 0, "status": "not_following"},
+        ]
+        assert not Following.objects.filter(creator=user).exists()
+
+    def test_bulk_follow_rejects_malformed_ids(self, user: settings.AUTH_USER_MODEL):
+        url = "/api/users/{}/following/bulk".format(user.pk)
+
+        response = APIClient().post(url, {"user_ids": ["abc"]}, format="json")
+
+        assert response.status_code == 400
+
+
+class TestUserRelationshipsView:
+
+    def test_resolves_both_directions(self, user: settings.AUTH_USER_MODEL):
+        mutual, fan, idol, stranger = [UserFactory() for _ in range(4)]
+        Following.objects.create(creator=user, following=mutual)
+        Following.objects.create(creator=mutual, following=user)
+        Following.objects.create(creator=fan, following=user)
+        Following.objects.create(creator=user, following=idol)
+
+        response = APIClient().post("/api/users/relationships", {
+            "user_id": user.pk, "user_ids": [mutual.pk, fan.pk, idol.pk, stranger.pk]
+        }, format="json")
+
+        assert response.json()["relationships"] == [
+            {"id": mutual.pk, "viewer_follows": True, "follows_viewer": True},
+            {"id": fan.pk, "viewer_follows": False, "follows_viewer": True},
+            {"id": idol.pk, "viewer_follows": True, "follows_viewer": False},
+            {"id": stranger.pk, "viewer_follows": False, "follows_viewer": False},
+        ]
+
+    def test_followers_listing_inlines_relationship(self, user: settings.AUTH_USER_MODEL):
+        viewer, fan = UserFactory(), UserFactory()
+        Following.objects.create(creator=fan, following=user)
+        Following.objects.create(creator=viewer, following=fan)
+        client = APIClient()
+        url = "/api/users/{}/followers".format(user.pk)
+        client.get(url)
+
+        with CaptureQueriesContext(connection) as plain:
+            client.get(url)
+        with CaptureQueriesContext(connection) as inlined:
+            data = client.get(url, {"viewer_id": viewer.pk}).json()
+
+        assert len(plain) == len(inlined)
+        assert data[0]["viewer_follows"] is True
+        assert data[0]["follows_viewer"] is False
@@ -0,0 +1,395 @@
+"""
+Inverted index over link and collection text, built offline by `manage.py build_text_index`.
+
+Each kind of document (links: url and description; collections: description) has a
+directory under TEXT_INDEX_DIR holding immutable segment files and a MANIFEST naming the
+live segments, the highest primary key they cover and the segments the previous manifest
+retired. A segment is
+
+    header | postings | dictionary entries | terms
+
+where terms are sorted, every dictionary entry is a fixed-width (term offset, postings
+offset, document frequency) record so the dictionary can be binary searched in place, and
+each posting list is its ascending primary keys delta-encoded as varints.
+
+Query workers mmap the segments, so gunicorn workers on one host share their pages through
+the page cache. Rows past the manifest's highest key, and rows this process saves, go into a
+small in-memory delta segment until the next incremental build writes them out. Segments
+are never rewritten in place: incremental builds add one, merges replace several with one,
+and full rebuilds replace all, each by swapping the MANIFEST. Replaced segments are deleted
+one swap later, so a worker that read the previous manifest can still open them.
+
+Postings are not updated when text changes, so candidates are re-checked against the rows
+they hydrate to; merges drop deleted rows and full rebuilds drop edited-away terms.
+"""
+import heapq
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from collections import defaultdict
+from itertools import groupby
+
+from django.conf import settings
+
+from .models import Link, Collection
+
+MAGIC = b'PIDX'
+VERSION = 1
+# magic, version, term count, highest primary key covered, dictionary entries offset, terms offset
+HEADER = struct.Struct('<4sIIQQQ')
+# term offset within the terms blob, postings offset within the file, document frequency
+ENTRY = struct.Struct('<QQI')
+MANIFEST = 'MANIFEST'
+
+DOCUMENTS = {
+    'links': (Link, ('url', 'description')),
+    'collections': (Collection, ('description',)),
+}
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def document_terms(texts):
+    return set(tokenize(' '.join(text or '' for text in texts)))
+
+
+def encode_postings(keys):
+    data = bytearray()
+    previous = 0
+    for key in keys:
+        delta = key - previous
+        previous = key
+        while delta >= 0x80:
+            data.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        data.append(delta)
+
+    return bytes(data)
+
+
+def decode_postings(data):
+    keys = []
+    previous = value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            previous += value
+            keys.append(previous)
+            value = shift = 0
+
+    return keys
+
+
+# Writes (term, ascending keys) pairs, given in ascending term order, as a segment at `path`
+def write_segment(path, terms, max_pk):
+    entries = []
+    blob = bytearray()
+
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as out:
+        out.write(bytes(HEADER.size))
+        offset = HEADER.size
+
+        for term, keys in terms:
+            postings = encode_postings(keys)
+            entries.append((len(blob), offset, len(keys)))
+            blob += term.encode('utf-8')
+            out.write(postings)
+            offset += len(postings)
+
+        entries_offset = offset
+        for entry in entries:
+            out.write(ENTRY.pack(*entry))
+        terms_offset = entries_offset + len(entries) * ENTRY.size
+        out.write(blob)
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, len(entries), max_pk, entries_offset, terms_offset))
+        out.flush()
+        os.fsync(out.fileno())
+
+    os.replace(temporary, path)
+
+
+class Segment:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as segment_file:
+            self.data = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.term_count, self.max_pk, self.entries_offset, self.terms_offset = \
+            HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a version {} text index segment".format(path, VERSION))
+
+    def entry(self, i):
+        return ENTRY.unpack_from(self.data, self.entries_offset + i * ENTRY.size)
+
+    def term(self, i):
+        start = self.terms_offset + self.entry(i)[0]
+        end = self.terms_offset + self.entry(i + 1)[0] if i + 1 < self.term_count else len(self.data)
+        return self.data[start:end]
+
+    def postings(self, i):
+        start = self.entry(i)[1]
+        end = self.entry(i + 1)[1] if i + 1 < self.term_count else self.entries_offset
+        return decode_postings(self.data[start:end])
+
+    # Index of the first term not less than `prefix`
+    def lower_bound(self, prefix):
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.term(middle) < prefix:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def prefix_postings(self, prefix):
+        prefix = prefix.encode('utf-8')
+        i = self.lower_bound(prefix)
+        while i < self.term_count and self.term(i).startswith(prefix):
+            yield self.postings(i)
+            i += 1
+
+    def terms(self):
+        for i in range(self.term_count):
+            yield self.term(i).decode('utf-8'), i
+
+
+# Merges segments into one at `path`, keeping only keys in `live` when given
+def merge_segments(segments, path, live=None):
+    def tagged(n):
+        return ((term, n, i) for term, i in segments[n].terms())
+
+    def terms():
+        streams = [tagged(n) for n in range(len(segments))]
+        for term, group in groupby(heapq.merge(*streams), key=lambda item: item[0]):
+            keys = heapq.merge(*[segments[n].postings(i) for _, n, i in group])
+            keys = [key for key, _ in groupby(keys) if live is None or key in live]
+            if keys:
+                yield term, keys
+
+    write_segment(path, terms(), max((segment.max_pk for segment in segments), default=0))
+
+
+def rows_of(kind, after=0):
+    model, fields = DOCUMENTS[kind]
+    return model.objects.filter(pk__gt=after).order_by('pk').values_list('pk', *fields)
+
+
+# Indexes `rows` (ascending by key) into one segment per `batch_size` rows, returning their paths and the last key
+def build_segments(directory, rows, batch_size):
+    paths = []
+    postings = defaultdict(list)
+    count = max_pk = 0
+
+    def flush():
+        path = segment_path(directory, len(paths))
+        write_segment(path, sorted(postings.items()), max_pk)
+        paths.append(path)
+        postings.clear()
+
+    for pk, *texts in rows:
+        for term in document_terms(texts):
+            postings[term].append(pk)
+        count += 1
+        max_pk = pk
+        if count % batch_size == 0:
+            flush()
+
+    if postings:
+        flush()
+
+    return paths, max_pk
+
+
+def segment_path(directory, label):
+    return os.path.join(directory, 'segment-{}-{}.idx'.format(int(time.time() * 1000), label))
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return {'segments': [], 'max_pk': 0, 'retired': []}
+
+
+def write_manifest(directory, segments, max_pk, retired=()):
+    temporary = os.path.join(directory, MANIFEST + '.tmp')
+    with open(temporary, 'w') as manifest:
+        json.dump({
+            'segments': [os.path.basename(path) for path in segments], 'max_pk': max_pk, 'retired': list(retired)
+        }, manifest)
+    os.replace(temporary, os.path.join(directory, MANIFEST))
+
+
+# Replaces the manifest's segments with `segments`. Segments it drops are only listed as retired, and deleted by
+# the next publish: a worker may have read the current manifest and not yet opened its segments.
+def publish(directory, segments, max_pk):
+    previous = read_manifest(directory)
+    kept = {os.path.basename(path) for path in segments}
+    retired = [name for name in previous['segments'] if name not in kept]
+    write_manifest(directory, segments, max_pk, retired)
+
+    # Workers that still have a deleted segment mapped keep reading it until they reopen the manifest
+    for name in previous.get('retired', []):
+        if name not in kept:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def index_directory(kind):
+    directory = os.path.join(settings.TEXT_INDEX_DIR, kind)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+# Indexes every row from scratch
+def rebuild(kind, batch_size):
+    directory = index_directory(kind)
+    paths, max_pk = build_segments(directory, rows_of(kind).iterator(), batch_size)
+    if len(paths) > 1:
+        merged = segment_path(directory, 'full')
+        merge_segments([Segment(path) for path in paths], merged)
+        for path in paths:
+            os.remove(path)
+        paths = [merged]
+
+    publish(directory, paths, max_pk)
+    return paths
+
+
+# Writes rows added since the last build as a new segment, merging everything once there are too many segments
+def build_incremental(kind, batch_size):
+    directory = index_directory(kind)
+    manifest = read_manifest(directory)
+    segments = [os.path.join(directory, name) for name in manifest['segments']]
+
+    paths, max_pk = build_segments(directory, rows_of(kind, after=manifest['max_pk']).iterator(), batch_size)
+    publish(directory, segments + paths, max(max_pk, manifest['max_pk']))
+
+    if len(segments) + len(paths) > settings.TEXT_INDEX_MAX_SEGMENTS:
+        merge(kind)
+
+    return paths
+
+
+# Merges all segments into one, dropping keys whose rows have been deleted
+def merge(kind):
+    directory = index_directory(kind)
+    manifest = read_manifest(directory)
+    if not manifest['segments']:
+        return None
+
+    model, _ = DOCUMENTS[kind]
+    live = set(model.objects.values_list('pk', flat=True).iterator())
+    merged = segment_path(directory, 'merged')
+    merge_segments([Segment(os.path.join(directory, name)) for name in manifest['segments']], merged, live)
+
+    publish(directory, [merged], manifest['max_pk'])
+    return merged
+
+
+class TextIndex:
+    def __init__(self, kind):
+        self.kind = kind
+        self.lock = threading.Lock()
+        self.segments = []
+        self.manifest = None
+        self.delta = defaultdict(set)
+        self.delta_max_pk = 0
+        self.checked_at = None
+
+    def available(self):
+        self.refresh()
+        return bool(self.segments)
+
+    # Candidate keys for documents with a term starting with every query word, highest key first
+    def search(self, query):
+        self.refresh()
+        words = set(tokenize(query))
+        if not words:
+            return []
+
+        with self.lock:
+            segments, delta = self.segments, self.delta
+
+            candidates = None
+            # Longer words tend to be rarer, so the candidate set shrinks fastest taking them first
+            for word in sorted(words, key=len, reverse=True):
+                keys = set()
+                for segment in segments:
+                    for postings in segment.prefix_postings(word):
+                        keys.update(postings)
+                for term in delta:
+                    if term.startswith(word):
+                        keys |= delta[term]
+
+                candidates = keys if candidates is None else candidates & keys
+                if not candidates:
+                    return []
+
+        return sorted(candidates, reverse=True)[:settings.TEXT_INDEX_CANDIDATES]
+
+    def add(self, pk, texts):
+        with self.lock:
+            for term in document_terms(texts):
+                self.delta[term].add(pk)
+
+    def refresh(self):
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < settings.TEXT_INDEX_REFRESH_INTERVAL:
+            return
+
+        with self.lock:
+            self.checked_at = now
+            directory = os.path.join(settings.TEXT_INDEX_DIR, self.kind)
+            manifest = read_manifest(directory)
+            if manifest != self.manifest:
+                self.segments = [Segment(os.path.join(directory, name)) for name in manifest['segments']]
+                self.manifest = manifest
+                self.delta = defaultdict(set)
+                self.delta_max_pk = manifest['max_pk']
+
+            if self.segments:
+                for pk, *texts in rows_of(self.kind, after=self.delta_max_pk):
+                    for term in document_terms(texts):
+                        self.delta[term].add(pk)
+                    self.delta_max_pk = pk
+
+
+# Whether every query word starts some term of the document, to weed out stale postings
+def matches(query, texts):
+    terms = document_terms(texts)
+    return all(any(term.startswith(word) for term in terms) for word in set(tokenize(query)))
+
+
+_indexes = {}
+
+
+def text_index(kind):
+    if kind not in _indexes:
+        _indexes[kind] = TextIndex(kind)
+
+    return _indexes[kind]
+
+
+# Adds a saved row to this process's delta segment, if it has the index open
+def document_saved(instance):
+    for kind, (model, fields) in DOCUMENTS.items():
+        if isinstance(instance, model) and kind in _indexes:
+            _indexes[kind].add(instance.pk, [getattr(instance, field) for field in fields])
@@ -0,0 +1,143 @@
+"""
+Bitmaps of collection ids per topic, for boolean topic queries.
+
+Each TopicName's tagged collections are cached in the default cache as compressed bitmaps,
+built from the database on first use. Topic writes update the cached bitmaps in place once
+their transaction commits, so a query such as "tagged a and b but not c" is a handful of
+bitmap operations followed by a query hydrating the page. Bitmaps hold private collections
+too: the hydrating query keeps only public ones, so permission changes touch no bitmap and
+no write contends on a bitmap shared by every collection.
+
+Writers patch a bitmap only while holding its lock, taken with an atomic cache add, so two
+patches never interleave; a writer that finds the lock taken deletes the bitmap instead.
+Each bitmap also has a write counter next to it. A writer bumps the counter before touching
+the bitmap and a reader building from the database reads it before its query; when either
+sees the counter moved by the time it has stored the bitmap, a write it did not see may be
+missing, so it deletes the bitmap for the next reader to rebuild. Bitmaps also expire after
+TOPIC_BITMAP_TTL, which bounds any drift left by cache evictions.
+"""
+from functools import reduce
+from itertools import islice
+from operator import and_, or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .bitmaps import Bitmap
+from .models import Collection, Topic, TopicName
+
+BITMAP_KEY = 'topicbitmap:{}'
+WRITES_KEY = 'topicbitmap:writes:{}'
+LOCK_KEY = 'topicbitmap:lock:{}'
+# Seconds a writer may hold a bitmap's lock, should it die holding it
+LOCK_TIMEOUT = 10
+
+
+def topic_bitmap_name(topic_name_id):
+    return 'topic:{}'.format(topic_name_id)
+
+
+def build(name):
+    ids = Topic.objects.filter(topic_name_id=int(name.split(':')[1])).values_list('collection_id', flat=True)
+    return Bitmap(ids.iterator())
+
+
+def bitmap(name):
+    found = cache.get(BITMAP_KEY.format(name))
+    if found is not None:
+        return found
+
+    writes = cache.get(WRITES_KEY.format(name))
+    found = build(name)
+    if cache.add(BITMAP_KEY.format(name), found, settings.TOPIC_BITMAP_TTL) \
+            and cache.get(WRITES_KEY.format(name)) != writes:
+        # A write that committed while the rows were read may be missing from what was just cached
+        cache.delete(BITMAP_KEY.format(name))
+
+    return found
+
+
+# Adds and removes collection ids in a cached bitmap once the current transaction commits
+def update(name, add=(), remove=()):
+    def apply():
+        key = BITMAP_KEY.format(name)
+        cache.add(WRITES_KEY.format(name), 0, None)
+        try:
+            writes = cache.incr(WRITES_KEY.format(name))
+        except ValueError:
+            cache.delete(key)
+            return
+
+        if not cache.add(LOCK_KEY.format(name), writes, LOCK_TIMEOUT):
+            # Another writer is patching it; patching too would lose one of the two writes
+            cache.delete(key)
+            return
+
+        try:
+            found = cache.get(key)
+            if found is None:
+                return
+            for pk in add:
+                found.add(pk)
+            for pk in remove:
+                found.discard(pk)
+            cache.set(key, found, settings.TOPIC_BITMAP_TTL)
+
+            if cache.get(WRITES_KEY.format(name)) != writes:
+                cache.delete(key)
+        finally:
+            cache.delete(LOCK_KEY.format(name))
+
+    transaction.on_commit(apply)
+
+
+def topic_added(topic):
+    update(topic_bitmap_name(topic.topic_name_id), add=[topic.collection_id])
+
+
+# The collection leaves the topic's bitmap unless it still carries another tag with the same name
+def topic_removed(topic, topic_name_id=None):
+    if topic_name_id is None:
+        topic_name_id = topic.topic_name_id
+    if not Topic.objects.filter(topic_name_id=topic_name_id, collection_id=topic.collection_id).exists():
+        update(topic_bitmap_name(topic_name_id), remove=[topic.collection_id])
+
+
+# Collections tagged with every topic key in `all_of`, at least one in `any_of` and none in `none_of`
+def query(all_of=(), any_of=(), none_of=()):
+    assert all_of or any_of, "A topic query needs topics to match"
+
+    ids = dict(TopicName.objects.filter(key__in=set(all_of) | set(any_of) | set(none_of)).values_list('key', 'id'))
+    if any(key not in ids for key in all_of):
+        return Bitmap()
+
+    def bitmaps(keys):
+        return [bitmap(topic_bitmap_name(ids[key])) for key in keys if key in ids]
+
+    required = bitmaps(all_of)
+    if any_of:
+        required.append(reduce(or_, bitmaps(any_of), Bitmap()))
+
+    # Smallest first, so every intersection walks as few containers as possible
+    required.sort(key=len)
+    result = reduce(and_, required[1:], required[0])
+    for excluded in bitmaps(none_of):
+        result = result - excluded
+
+    return result
+
+
+# Up to `count` public collections among `matches` with ids below `before`, newest first, read a batch of ids at a
+# time until enough of them turn out to be public
+def public_collections(matches, before, count):
+    ids = matches.descending(before=before)
+    found = []
+    while len(found) < count:
+        batch = list(islice(ids, count))
+        if not batch:
+            break
+        public = Collection.objects.filter(pk__in=batch, permission="Public").select_related('author').in_bulk()
+        found.extend(public[pk] for pk in batch if pk in public)
+
+    return found[:count]
@@ -0,0 +1,150 @@
+"""
+Per-process autocomplete index over topic names.
+
+Each worker keeps every TopicName in use in a sorted array of (case-folded name, name)
+pairs, next to how many tags use that name, so a prefix query is a bisect plus a short
+scan and never touches the database.
+
+Topic writes bump a shared version counter in the default cache and, once their transaction
+commits, record their delta under the new version. Before answering, a worker compares its
+version with the shared one and replays only the deltas it missed. It reloads the whole
+table when deltas have expired from the cache, when a topic was edited in place (its old
+name is unknown), or every TOPIC_INDEX_RELOAD_INTERVAL seconds to shed any drift.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import TopicName
+
+VERSION_KEY = 'topicindex:version'
+CHANGE_KEY = 'topicindex:change:{}'
+# Recorded for changes that cannot be replayed as a count delta
+RELOAD = 'reload'
+
+
+def fold(name):
+    return name.lower()
+
+
+class TopicIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = []
+        self.counts = {}
+        self.version = None
+        self.loaded_at = None
+
+    # Names starting with `prefix` (case-insensitively) in (folded, name) order, resuming after the name `after`
+    def complete(self, prefix, after=None, limit=None):
+        self.refresh()
+        prefix = fold(prefix)
+
+        with self.lock:
+            start = bisect_left(self.entries, (prefix,))
+            if after is not None:
+                start = max(start, bisect_right(self.entries, (fold(after), after)))
+
+            names = []
+            for i in range(start, len(self.entries)):
+                folded, name = self.entries[i]
+                if not folded.startswith(prefix) or len(names) == limit:
+                    break
+                names.append(name)
+
+        return names
+
+    def count(self, name):
+        self.refresh()
+        return self.counts.get(name, 0)
+
+    def refresh(self):
+        shared = cache.get(VERSION_KEY)
+        if self.loaded_at is not None and not self.expired():
+            # No shared version means the cache is unavailable or was flushed; serve what we have until the next reload
+            if shared is None or shared == self.version:
+                return
+
+        with self.lock:
+            if self.loaded_at is None or self.expired() or not self.replay(shared):
+                self.load()
+
+    def expired(self):
+        return time.monotonic() - self.loaded_at > settings.TOPIC_INDEX_RELOAD_INTERVAL
+
+    def replay(self, shared):
+        if shared is None or self.version is None or shared < self.version \
+                or shared - self.version > settings.TOPIC_INDEX_MAX_REPLAY:
+            return False
+
+        keys = [CHANGE_KEY.format(version) for version in range(self.version + 1, shared + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return False
+
+        for key in keys:
+            if changes[key] == RELOAD:
+                return False
+            self.apply(*changes[key])
+
+        self.version = shared
+        return True
+
+    def load(self):
+        # Read the version first: changes committed while the table is read are replayed (at worst twice) later
+        cache.add(VERSION_KEY, 0, None)
+        self.version = cache.get(VERSION_KEY)
+
+        self.counts = dict(TopicName.objects.filter(collection_count__gt=0).values_list('name', 'collection_count'))
+        self.entries = sorted((fold(name), name) for name in self.counts)
+        self.loaded_at = time.monotonic()
+
+    def apply(self, name, delta):
+        count = self.counts.get(name, 0) + delta
+        if count > 0:
+            if name not in self.counts:
+                insort(self.entries, (fold(name), name))
+            self.counts[name] = count
+        elif name in self.counts:
+            del self.counts[name]
+            del self.entries[bisect_left(self.entries, (fold(name), name))]
+
+
+def topic_added(topic):
+    publish((topic.topic_name.name, 1))
+
+
+def topic_removed(topic):
+    publish((topic.topic_name.name, -1))
+
+
+def topic_edited(topic):
+    publish(RELOAD)
+
+
+def publish(change):
+    def bump():
+        cache.add(VERSION_KEY, 0, None)
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            # Evicted between add and incr; workers reload when they next see a version they cannot replay to
+            return
+        cache.set(CHANGE_KEY.format(version), change, settings.TOPIC_INDEX_CHANGE_TTL)
+
+    transaction.on_commit(bump)
+
+
+_index = None
+
+
+def topic_index():
+    global _index
+    if _index is None:
+        _index = TopicIndex()
+
+    return _index
@@ -0,0 +1,120 @@
+"""
+Trending topics, scored by how often they were recently attached to collections.
+
+Attach events are counted per TopicName in one sorted set per TRENDING_BUCKET_SECONDS
+bucket, under trending:bucket:<n>, kept for TRENDING_WINDOW_BUCKETS buckets. A topic's
+score is its bucket counts summed with exponentially decaying weights, halving every
+TRENDING_HALF_LIFE_SECONDS, relative to the current bucket.
+
+The scores for the current bucket are materialized once, by the first read in that bucket,
+as a weighted union of the window's buckets under trending:scores:<n>; later events in the
+bucket are added to it directly, at full weight. Reading the top k is then a single
+reverse range over that set. An event racing the union may be counted twice or missed
+there, until the next bucket's union recounts it.
+
+Sorted sets live in Redis in production and in the follow graph's in-process stand-in
+elsewhere. If Redis errors, events are dropped and nothing is trending.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .graph import sorted_sets, LOADED_MARKER
+from .models import TopicName
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'trending'
+
+
+def now():
+    return time.time()
+
+
+def bucket_of(timestamp):
+    return int(timestamp // settings.TRENDING_BUCKET_SECONDS)
+
+
+def bucket_key(bucket):
+    return '{}:bucket:{}'.format(KEY_PREFIX, bucket)
+
+
+def scores_key(bucket):
+    return '{}:scores:{}'.format(KEY_PREFIX, bucket)
+
+
+# How much an event `age` buckets before the current one still counts
+def decay(age):
+    return 0.5 ** (age * settings.TRENDING_BUCKET_SECONDS / settings.TRENDING_HALF_LIFE_SECONDS)
+
+
+class TrendingTopics:
+    def __init__(self, sets, errors=()):
+        self.sets = sets
+        self.errors = errors
+
+    def attached(self, topic_name_ids):
+        bucket = bucket_of(now())
+        ttl = settings.TRENDING_WINDOW_BUCKETS * settings.TRENDING_BUCKET_SECONDS
+
+        try:
+            for topic_name_id in topic_name_ids:
+                self.sets.increment(bucket_key(bucket), topic_name_id, 1, ttl)
+                self.sets.increment_if_exists(scores_key(bucket), topic_name_id, 1)
+        except self.errors:
+            logger.warning("Trending topics unavailable, dropping attach events", exc_info=True)
+
+    # The `count` highest scoring TopicName ids with their scores
+    def top(self, count):
+        bucket = bucket_of(now())
+
+        try:
+            if not self.sets.exists(scores_key(bucket)):
+                self.materialize(bucket)
+            scored = self.sets.top_scored(scores_key(bucket), count + 1)
+        except self.errors:
+            logger.warning("Trending topics unavailable", exc_info=True)
+            return []
+
+        return [(int(member), score) for member, score in scored if member != LOADED_MARKER][:count]
+
+    def materialize(self, bucket):
+        window = range(bucket - settings.TRENDING_WINDOW_BUCKETS + 1, bucket + 1)
+        self.sets.union(scores_key(bucket), [(bucket_key(b), decay(bucket - b)) for b in window],
+                        settings.TRENDING_BUCKET_SECONDS * 2)
+
+        # Redis expires these by itself; the in-process stand-in needs them deleted
+        self.sets.delete(scores_key(bucket - 1))
+        self.sets.delete(bucket_key(window[0] - 1))
+
+
+# Counts the topics as attached once the surrounding transaction commits
+def topics_attached(topics):
+    topic_name_ids = [topic.topic_name_id for topic in topics]
+    if topic_name_ids:
+        transaction.on_commit(lambda: trending_topics().attached(topic_name_ids))
+
+
+# Trending topic names with their scores, highest first
+def trending(count):
+    scored = trending_topics().top(count)
+    names = TopicName.objects.in_bulk([topic_name_id for topic_name_id, _ in scored])
+
+    return [
+        {'name': names[topic_name_id].name, 'score': round(score, 3)}
+        for topic_name_id, score in scored if topic_name_id in names
+    ]
+
+
+_trending = None
+
+
+def trending_topics():
+    global _trending
+    if _trending is None:
+        sets, errors = sorted_sets()
+        _trending = TrendingTopics(sets, errors=errors)
+
+    return _trending
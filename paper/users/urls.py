@@ -11,21 +11,30 @@ from paper.users.views import (
     user_information_view,
     user_picture_view,
     edit_user_view,
+    search_view,
     search_users_view,
     search_collections_view,
     users_collections_view,
+    users_feed_view,
+    users_suggestions_view,
     user_reading_list_view,
     users_following_view,
+    users_bulk_following_view,
+    users_relationships_view,
     users_followers_view,
     topic_view,
     create_topic_view,
     search_topics_view,
     all_topics_view,
+    popular_topics_view,
+    trending_topics_view,
+    topic_query_view,
     collection_view,
     edit_collection_view,
     link_view,
     edit_link_view,
     collection_connected_view,
+    collection_sync_view,
     collection_relationship_view,
     signup_view,
     login_view,
@@ -38,15 +47,20 @@ urlpatterns = [
     path("signup", view=signup_view, name='usersignup'),
     path("logout", view=logout_view, name='userslogout'),
     url(r'^users/(?P<pk>[0-9]+)/collections', users_collections_view, name='usercollections'),
+    url(r'^users/(?P<pk>[0-9]+)/feed', users_feed_view, name='userfeed'),
+    url(r'^users/(?P<pk>[0-9]+)/suggestions', users_suggestions_view, name='usersuggestions'),
     url(r'^users/(?P<pk>[0-9]+)/reading-list', user_reading_list_view, name='userreadinglist'),
     url(r'^users/(?P<pk>[0-9]+)/profilepicture', user_picture_view, name='user-profile-picture'),
+    url(r'^users/(?P<pk>[0-9]+)/following/bulk', users_bulk_following_view, name='user-followings-bulk'),
     url(r'^users/(?P<pk>[0-9]+)/following', users_following_view, name='user-followings'),
     url(r'^users/(?P<pk>[0-9]+)/followers', users_followers_view, name='user-followers'),
     url(r'^users/reading-list', user_reading_list_view, name='userreadinglist'),
     url(r'^users/edit', edit_user_view, name='edituser'),
     url(r'^users/search', search_users_view, name='searchuser'),
+    url(r'^users/relationships', users_relationships_view, name='userrelationships'),
     url(r'^users', user_information_view, name='userinformation'),
     url(r'^collections/(?P<pk>[0-9]+)/connected', collection_connected_view, name='fromtoconnections'),
+    url(r'^collections/(?P<pk>[0-9]+)/sync', collection_sync_view, name='collectionsync'),
     url(r'^collections/relationship', collection_relationship_view, name='collectioninfo'),
     url(r'^collections/edit', edit_collection_view, name='editcollection'),
     url(r'^collections/(?P<pk>[0-9]+)', collection_view, name='collectioninfo'),
@@ -57,7 +71,11 @@ urlpatterns = [
     url(r'^topic/(?P<topic_name>[a-zA-Z0-9 !^&()_+\-=\[\]{}\':"\\|,.\/?]+)', topic_view, name='topiccollections'),
     url(r'^topics/search', search_topics_view, name='searchtopics'),
     url(r'^topics/all', all_topics_view, name='alltopics'),
-    url(r'^topics/create', create_topic_view, name='alltopics')
+    url(r'^topics/popular', popular_topics_view, name='populartopics'),
+    url(r'^topics/trending', trending_topics_view, name='trendingtopics'),
+    url(r'^topics/query', topic_query_view, name='topicquery'),
+    url(r'^topics/create', create_topic_view, name='alltopics'),
+    url(r'^search', search_view, name='search')
 ]
 
 urlpatterns = format_suffix_patterns(urlpatterns)
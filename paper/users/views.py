@@ -1,21 +1,38 @@
 import json
 import PIL
+from django.conf import settings
 from django.contrib.auth import get_user_model, login, logout, authenticate
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import Q, F, Exists, OuterRef, Case, When, Value
 from django.urls import reverse
 from django.http import JsonResponse, Http404
 from django.core import serializers
 from django.core.serializers.json import DjangoJSONEncoder
 from django.views.generic import DetailView, ListView, RedirectView, UpdateView
+from django.utils import timezone
 from django.utils.text import get_valid_filename
+from django.utils.http import parse_etags
 from rest_framework.views import APIView
-from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_200_OK, HTTP_204_NO_CONTENT, HTTP_500_INTERNAL_SERVER_ERROR
+from rest_framework.status import (
+    HTTP_400_BAD_REQUEST, HTTP_200_OK, HTTP_204_NO_CONTENT, HTTP_304_NOT_MODIFIED, HTTP_409_CONFLICT,
+    HTTP_500_INTERNAL_SERVER_ERROR,
+)
 from rest_framework.response import Response
+from rest_framework.exceptions import ParseError
 from rest_framework.parsers import JSONParser, FormParser, MultiPartParser
-from .models import Link, Following, Collection, CollectionRelationship, Topic
+from .models import Link, Following, Collection, CollectionRelationship, Topic, TopicName, UserSuggestion, topic_key
+from . import counters
 from .serializers import LinkSerializer, UserSerializer, UserPartSerializer, FollowingSerializer, CollectionSerializer, CollectionRelationshipSerializer, TopicSerializer
 from .enums import Relationship, CollectionPermission
+from .pagination import KeysetPagination, get_param, CURSOR_PARAM, PAGE_SIZE_PARAM
+from .graph import follow_graph, FOLLOWING, FOLLOWERS
+from .topic_index import topic_index
+from . import changes, collection_cache, feed, search_cache, signals, topic_bitmaps, trending
+from .related_topics import related_names
+from .search import (
+    search_users, search_collections, extra_keys, typeahead_users, within_budget, federated_search, BudgetExceeded,
+)
 
 
 User = get_user_model()
@@ -121,42 +138,71 @@ class EditUserView(APIView):
 edit_user_view = EditUserView.as_view()
 
 
-# Returns users in database that match a prefix search of username, first name, full name, and email
+# Searches users, collections, topics and links at once, returning a ranked section for each
+class SearchView(APIView):
+    def post(self, request, format=None):
+        query = search_cache.normalize(request.data["query"])
+
+        try:
+            limit = int(request.data.get("limit") or settings.SEARCH_SECTION_LIMIT)
+        except (TypeError, ValueError):
+            return Response({'detail': 'limit must be an integer'}, status=HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, KeysetPagination.max_page_size))
+
+        return Response({'query': query, 'sections': federated_search(query, limit)})
+
+search_view = SearchView.as_view()
+
+
+# Returns users matching every word of the query in their username, names or bio, best matches first,
+# or with mode "typeahead" the few users whose names most resemble the query
 class SearchUsersView(APIView):
     def post(self, request, format=None):
-        query = request.data["query"]
+        query = search_cache.normalize(request.data["query"])
+
+        if request.data.get("mode") == "typeahead":
+            try:
+                params = searchParams(request)
+                users = search_cache.cached('users', query, params, lambda: typeaheadUsers(query, request))
+                return Response(withRelationshipRows(users, request))
+            except BudgetExceeded:
+                # An over-budget query returns no suggestions rather than a late answer, and is not cached
+                return Response([])
 
-        username_query = Q(username__istartswith=query)
-        first_name_query = Q(first_name__istartswith=query)
-        name_query = Q(name__istartswith=query)
-        email_query = Q(email__istartswith=query)
+        search, ordering = search_users(query)
+        search = search.values('id', 'date_joined', 'username', 'first_name', 'last_name', 'email',
+                               *extra_keys(ordering))
 
-        search = User.objects.filter(username_query | first_name_query | name_query | email_query).values('id', 'username', 'first_name', 'last_name', 'email')
+        paginator = KeysetPagination(ordering=ordering)
 
-        data = list(search)
+        def compute():
+            return paginator.paginate_queryset(search, request), paginator.next_cursor
 
-        return Response(data)
+        data, paginator.next_cursor = search_cache.cached('users', query, searchParams(request), compute)
+        return paginator.get_paginated_response(withRelationshipRows(data, request))
 
 search_users_view = SearchUsersView.as_view()
 
 
-# Returns collections in database that match a given name query
+# Returns public collections matching every word of the query in their name or description, best matches first
 class SearchCollectionsView(APIView):
     def post(self, request, format=None):
-        query = request.data["query"]
+        query = search_cache.normalize(request.data["query"])
 
-        name_query = Q(name__istartswith=query)
-        public_privacy_query = Q(permission='Public')
+        search, ordering = search_collections(query)
+        search = search.values('id', 'created', 'name', 'author', 'description', 'permission', *extra_keys(ordering))
 
-        search = Collection.objects.filter(name_query, public_privacy_query).values('id', 'name', 'author', 'description', 'permission')
+        paginator = KeysetPagination(ordering=ordering)
 
-        data = list(search)
+        def page():
+            data = paginator.paginate_queryset(search, request)
 
-        for collection in data:
-            print(collection["author"])
-            collection["author"] = UserPartSerializer(User.objects.get(pk=collection["author"])).data
+            for collection in data:
+                collection["author"] = UserPartSerializer(User.objects.get(pk=collection["author"])).data
 
-        return Response({"collections" : data})
+            return {"collections" : data}
+
+        return cachedPage('collections', query, request, paginator, page)
 
 search_collections_view = SearchCollectionsView.as_view()
 
@@ -170,7 +216,10 @@ class UserReadingListView(APIView):
 
         reading_list = Link.objects.filter(user_filter, reading_list_filter).values('id', 'created', 'owner', 'url', 'collection', 'description')
 
-        return Response(list(reading_list))
+        paginator = KeysetPagination()
+        data = paginator.paginate_queryset(reading_list, request)
+
+        return paginator.get_paginated_response(data)
 
     def post(self, request, format=None):
         user_id = request.data['user_id']
@@ -210,24 +259,18 @@ class UserFollowingView(APIView):
 
     def get(self, request, pk, format=None):
         user = self.get_User(pk)
-        following = user.friendship_creator_set.values('following')
-        following_list = list(following)
+        following = userPreviews(User.objects.filter(friend_following_set__creator=user)) \
+            .annotate(followed=F('friend_following_set__created'), follow_id=F('friend_following_set__id'))
+        following = withRelationship(following, request)
 
-        data = []
-        for single_user in following_list:
-            following_id = single_user["following"]
-            user_data = User.objects.filter(pk=following_id).values('id', 'username', 'first_name', 'last_name', 'name', 'image')
-            collection_count = Collection.objects.filter(author=following_id).count()
-            print("collection count is: {}".format(collection_count))
-
-            serialized_user_data = list(user_data)
+        paginator = KeysetPagination(ordering=('-followed', '-follow_id'))
+        candidates = follow_graph().page_candidates(FOLLOWING, user.pk, paginator, request)
+        if candidates is not None:
+            following = following.filter(pk__in=candidates)
 
-            print(serialized_user_data)
-            serialized_user_data[0]["collection_count"] = collection_count
+        data = paginator.paginate_queryset(following, request)
 
-            data += serialized_user_data
-
-        return Response(data)
+        return paginator.get_paginated_response(data)
 
     def post(self, request, pk, format=None):
         user = self.get_User(pk)
@@ -236,11 +279,16 @@ class UserFollowingView(APIView):
         if user and following_id:
             followingUser = User.objects.get(pk=following_id)
 
-            if(self.get_Following(pk, following_id)):
+            if follow_graph().is_following(user.pk, following_id):
                 return Response('Error: Following already exists!', status=HTTP_400_BAD_REQUEST)
 
             f = Following(creator=user, following=followingUser)
-            f.save()
+            try:
+                with transaction.atomic():
+                    f.save()
+            except IntegrityError:
+                return Response('Error: Following already exists!', status=HTTP_400_BAD_REQUEST)
+
             serializer = FollowingSerializer(f)
             return Response(serializer.data)
 
@@ -257,6 +305,104 @@ class UserFollowingView(APIView):
 users_following_view = UserFollowingView.as_view()
 
 
+# Follows or unfollows a batch of users in one transaction, reporting the outcome for each id
+class UserBulkFollowingView(APIView):
+    max_ids = 500
+
+    def get_User(self, pk):
+        try:
+            return User.objects.get(pk=pk)
+        except User.DoesNotExist:
+            raise Http404("User does not exist")
+
+    def get_ids(self, request):
+        user_ids = request.data.get('user_ids')
+        if not isinstance(user_ids, list) or len(user_ids) > self.max_ids:
+            return None
+
+        try:
+            return list(dict.fromkeys(int(user_id) for user_id in user_ids))
+        except (TypeError, ValueError):
+            return None
+
+    def post(self, request, pk, format=None):
+        user = self.get_User(pk)
+        user_ids = self.get_ids(request)
+        if user_ids is None:
+            return Response({'detail': 'user_ids must be a list of at most {} ids'.format(self.max_ids)},
+                            status=HTTP_400_BAD_REQUEST)
+
+        # Users cannot follow themselves
+        existing = set(User.objects.filter(pk__in=user_ids).exclude(pk=user.pk).values_list('pk', flat=True))
+        already = set(Following.objects.filter(creator=user, following_id__in=user_ids)
+                      .values_list('following_id', flat=True))
+
+        created = bulkFollow(user, [user_id for user_id in user_ids if user_id in existing and user_id not in already])
+        created_ids = set(f.following_id for f in created)
+
+        counters.followings_added(User, user.pk, list(created_ids))
+        for f in created:
+            follow_graph().followed(f)
+        # bulk_create sends no post_save, so queue the changed neighbourhoods here
+        if created_ids:
+            signals.suggestions_changed(pk__in=[user.pk, *created_ids])
+
+        results = []
+        for user_id in user_ids:
+            if user_id == user.pk:
+                status = 'invalid'
+            elif user_id not in existing:
+                status = 'not_found'
+            elif user_id in created_ids:
+                status = 'followed'
+            else:
+                status = 'already_following'
+            results.append({'id': user_id, 'status': status})
+
+        return Response({'results': results})
+
+    def delete(self, request, pk, format=None):
+        user = self.get_User(pk)
+        user_ids = self.get_ids(request)
+        if user_ids is None:
+            return Response({'detail': 'user_ids must be a list of at most {} ids'.format(self.max_ids)},
+                            status=HTTP_400_BAD_REQUEST)
+
+        followings = Following.objects.filter(creator=user, following_id__in=user_ids)
+        removed = set(followings.values_list('following_id', flat=True))
+        followings.delete()
+
+        results = [{'id': user_id, 'status': 'unfollowed' if user_id in removed else 'not_following'}
+                   for user_id in user_ids]
+
+        return Response({'results': results})
+
+
+users_bulk_following_view = UserBulkFollowingView.as_view()
+
+
+# Returns whether a user follows, and is followed by, each of a batch of other users
+class UserRelationshipsView(APIView):
+    max_ids = 500
+
+    def post(self, request, format=None):
+        viewer_id = request.data['user_id']
+        user_ids = request.data['user_ids']
+
+        if not isinstance(user_ids, list) or len(user_ids) > self.max_ids:
+            return Response({'detail': 'user_ids must be a list of at most {} ids'.format(self.max_ids)},
+                            status=HTTP_400_BAD_REQUEST)
+
+        try:
+            statuses = relationshipStatuses(int(viewer_id), [int(user_id) for user_id in user_ids])
+        except (TypeError, ValueError):
+            return Response({'detail': 'User ids must be integers'}, status=HTTP_400_BAD_REQUEST)
+
+        return Response({'relationships': statuses})
+
+users_relationships_view = UserRelationshipsView.as_view()
+
+
 # Returns all the followers of a user
 class UserFollowersView(APIView):
     def get_User(self, pk):
@@ -268,20 +414,18 @@ class UserFollowersView(APIView):
     def get(self, request, pk, format=None):
         user = self.get_User(pk)
 
-        following = Following.objects.filter(following_id=pk).values()
-
-        data = []
-        for relationship in following:
-            follower = self.get_User(relationship['creator_id']).values('id', 'username', 'first_name', 'last_name', 'name', 'image')
-
-            collection_count = Collection.objects.filter(author=relationship['creator_id']).count()
+        followers = userPreviews(User.objects.filter(friendship_creator_set__following_id=pk)) \
+            .annotate(followed=F('friendship_creator_set__created'), follow_id=F('friendship_creator_set__id'))
+        followers = withRelationship(followers, request)
 
-            serialized_user_data = list(follower)
-            serialized_user_data[0]["collection_count"] = collection_count
+        paginator = KeysetPagination(ordering=('-followed', '-follow_id'))
+        candidates = follow_graph().page_candidates(FOLLOWERS, pk, paginator, request)
+        if candidates is not None:
+            followers = followers.filter(pk__in=candidates)
 
-            data += serialized_user_data
+        data = paginator.paginate_queryset(followers, request)
 
-        return Response(data)
+        return paginator.get_paginated_response(data)
 
 
 users_followers_view = UserFollowersView.as_view()
@@ -299,11 +443,49 @@ class UserCollectionsView(APIView):
         user = self.get_User(pk)
         collections = Collection.objects.filter(author=user).values('created', 'name', 'description', 'id', 'permission')
 
-        return Response({'author_username': user.username, 'author_first': user.first_name, 'author_last': user.last_name, 'author_name': user.name, 'collections': list(collections)})
+        paginator = KeysetPagination()
+        data = paginator.paginate_queryset(collections, request)
+
+        return paginator.get_paginated_response({
+            'author_username': user.username, 'author_first': user.first_name, 'author_last': user.last_name,
+            'author_name': user.name, 'collections': data,
+        })
 
 users_collections_view = UserCollectionsView.as_view()
 
 
+# Returns the newest collections published by the users a specific user follows
+class UserFeedView(APIView):
+    def get(self, request, pk, format=None):
+        paginator = KeysetPagination(ordering=feed.FEED_ORDERING)
+        rows = paginator.paginate_merged(feed.feed_streams(pk), request)
+        collections = [CollectionSerializer(feed.feed_collection(row)).data for row in rows]
+
+        return paginator.get_paginated_response({'collections': collections})
+
+users_feed_view = UserFeedView.as_view()
+
+
+# Returns the precomputed "people you may know" for a user, skipping anyone they followed since
+class UserSuggestionsView(APIView):
+    def get(self, request, pk, format=None):
+        suggestions = UserSuggestion.objects.filter(user_id=pk, expires__gt=timezone.now()) \
+            .exclude(suggested__friend_following_set__creator_id=pk) \
+            .select_related('suggested') \
+            .order_by('-score', 'suggested_id')
+
+        data = []
+        for suggestion in suggestions:
+            user_data = UserPartSerializer(suggestion.suggested).data
+            user_data['mutual_count'] = suggestion.mutual_count
+            user_data['shared_topic_count'] = suggestion.shared_topic_count
+            data.append(user_data)
+
+        return Response({'suggestions': data})
+
+users_suggestions_view = UserSuggestionsView.as_view()
+
+
 class UserPictureView(APIView):
     parser_classes = (MultiPartParser, FormParser, )
 
@@ -338,22 +520,21 @@ user_picture_view = UserPictureView.as_view()
 class TopicView(APIView):
     def get(self, request, topic_name, format=None):
         # topic_name = request.data['topic_name']
-        collections = Topic.objects.filter(name__iexact=topic_name, collection__permission="Public").values_list('collection', flat=True)
+        key = topic_key(topic_name)
+        tagged = Topic.objects.filter(topic_name__key=key).values('collection_id')
+        collections = Collection.objects.filter(pk__in=tagged, permission="Public").select_related('author')
 
-        cList = []
-        for collection in collections:
-            search = Collection.objects.filter(pk=collection).values('created', 'author', 'name', 'description', 'id', 'permission')
-            data = list(search)
-            data[0]["author"] = UserPartSerializer(User.objects.get(pk=data[0]["author"])).data
-            cList += data
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(collections, request)
 
+        cList = [topicCollection(collection) for collection in page]
 
-        return Response({'collections': cList})
+        return paginator.get_paginated_response({'collections': cList, 'related': related_names(key)})
 
     def delete(self, request, format=None):
         topic_name = request.data['topic_name']
 
-        Topic.objects.filter(name=topic_name).delete()
+        Topic.objects.filter(topic_name__key=topic_key(topic_name)).delete()
 
         return Response(status=HTTP_200_OK)
 
@@ -367,7 +548,7 @@ class CreateTopicView(APIView):
 
         collection = Collection.objects.get(pk=collection_id)
 
-        name_filter = Q(name=topic_name)
+        name_filter = Q(topic_name__key=topic_key(topic_name))
         collection_filter = Q(collection=collection)
 
         existSet = Topic.objects.filter(name_filter, collection_filter)
@@ -376,6 +557,8 @@ class CreateTopicView(APIView):
             print("Topic {} does not exist yet. Creating...".format(topic_name))
             topic = Topic(name=topic_name, collection=collection)
             topic.save()
+            trending.topics_attached([topic])
+            bumpVersion(collection.pk)
             return Response(status=HTTP_200_OK)
 
         return Response({'Error': "Topic already exists for this collection!"}, status=HTTP_500_INTERNAL_SERVER_ERROR)
@@ -386,18 +569,83 @@ create_topic_view = CreateTopicView.as_view()
 class SearchTopicsView(APIView):
     def post(self, request, format=None):
         query = request.data['query']
-        return Response(searchTopic(query))
+
+        paginator = KeysetPagination(ordering=('name',))
+        data = searchTopic(query, paginator, request)
+
+        return paginator.get_paginated_response(data)
 
 search_topics_view = SearchTopicsView.as_view()
 
 
 class AllTopicsView(APIView):
     def get(self, request, format=None):
-        return Response(searchTopic(""))
+        paginator = KeysetPagination(ordering=('name',))
+        data = searchTopic("", paginator, request)
+
+        return paginator.get_paginated_response(data)
 
 all_topics_view = AllTopicsView.as_view()
 
 
+# Returns the most used topics with how many collections use each
+class PopularTopicsView(APIView):
+    def get(self, request, format=None):
+        try:
+            limit = int(request.query_params.get('limit') or KeysetPagination.page_size)
+        except (TypeError, ValueError):
+            return Response({'detail': 'limit must be an integer'}, status=HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, KeysetPagination.max_page_size))
+
+        popular = TopicName.objects.filter(collection_count__gt=0).order_by('-collection_count', 'key') \
+            .values('name', 'collection_count')[:limit]
+
+        return Response(list(popular))
+
+popular_topics_view = PopularTopicsView.as_view()
+
+
+# Returns the topics attached to collections most often lately, with their decayed scores
+class TrendingTopicsView(APIView):
+    def get(self, request, format=None):
+        try:
+            limit = int(request.query_params.get('limit') or settings.TRENDING_LIMIT)
+        except (TypeError, ValueError):
+            return Response({'detail': 'limit must be an integer'}, status=HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, KeysetPagination.max_page_size))
+
+        return Response(trending.trending(limit))
+
+trending_topics_view = TrendingTopicsView.as_view()
+
+
+# Pages through public collections matching a boolean combination of topics, newest first
+class TopicQueryView(APIView):
+    def post(self, request, format=None):
+        terms = {}
+        for term in ('all', 'any', 'none'):
+            names = request.data.get(term) or []
+            if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+                return Response({'detail': '{} must be a list of topic names'.format(term)},
+                                status=HTTP_400_BAD_REQUEST)
+            terms[term] = [topic_key(name) for name in names]
+
+        if not terms['all'] and not terms['any']:
+            return Response({'detail': 'all or any must name at least one topic'}, status=HTTP_400_BAD_REQUEST)
+
+        matches = topic_bitmaps.query(all_of=terms['all'], any_of=terms['any'], none_of=terms['none'])
+
+        paginator = KeysetPagination(ordering=('-id',))
+        page = paginator.paginate_index(
+            lambda after, count: topic_bitmaps.public_collections(matches, after[0] if after else None, count), request
+        )
+        cList = [topicCollection(collection) for collection in page]
+
+        return paginator.get_paginated_response({'collections': cList})
+
+topic_query_view = TopicQueryView.as_view()
+
+
 # Returns collection information based on id
 class CollectionView(APIView):
     def get_User(self, pk):
@@ -407,69 +655,63 @@ class CollectionView(APIView):
             raise Http404("User does not exist")
 
     def get(self, request, pk, format=None):
-        collection = self.get_User(pk)
-        cs = CollectionSerializer(collection)
-        links = Link.objects.filter(collection=collection).values('created', 'owner', 'url', 'collection', 'description')
-        topics = Topic.objects.filter(collection=collection).values_list('name', flat=True)
-
-        data = {}
-        data["collectionInfo"] = cs.data
-        data["links"] = list(links)
-        data["topics"] = list(topics)
+        pk = int(pk)
+
+        def build():
+            collection = self.get_User(pk)
+            cs = CollectionSerializer(collection)
+            links = Link.objects.filter(collection=collection) \
+                .values('id', 'created', 'owner', 'url', 'collection', 'description', 'version')
+            topics = Topic.objects.filter(collection=collection).values_list('name', flat=True)
+
+            data = {}
+            data["collectionInfo"] = cs.data
+            data["links"] = list(links)
+            data["topics"] = list(topics)
+            return data
+
+        version, data = collection_cache.cached(pk, build)
+        etag = collection_cache.etag(pk, version)
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
 
-        return Response(data)
+        return response
 
     def post(self, request, format=None):
         name = request.data['name']
         owner_id = request.data['user_id']
         description = request.data['description']
-        urls = request.data['links']
-        topics = request.data['topics']
+        urls = request.data['links'] or []
+        topics = request.data['topics'] or []
         permission = request.data['permission']
 
         owner = User.objects.get(pk=owner_id)
 
-        seenLinks = []
-        if urls:
-            for linkObj in urls:
-                if linkObj['url'] in seenLinks:
-                    return Response({'detail': 'No duplicate links allowed!'}, status=HTTP_400_BAD_REQUEST)
-
-                seenLinks.append(linkObj['url'])
+        if len(set(linkObj['url'] for linkObj in urls)) != len(urls):
+            return Response({'detail': 'No duplicate links allowed!'}, status=HTTP_400_BAD_REQUEST)
 
         if permission not in CollectionPermission.__members__:
             return Response({'detail': 'Collection permission not valid!'}, status=HTTP_400_BAD_REQUEST)
 
-        # Create new collection object
-        collection = Collection(author=owner, name=name, description=description, permission=permission)
-        collection.save()
-
-        data = {}
-        data["collectionInfo"] = CollectionSerializer(collection).data
-
-        links = []
-        topicsRet = []
-        if urls:
-            for linkObj in urls:
-                print(linkObj["url"])
-                print(linkObj["description"])
-
-                tempLink = Link(owner=owner, url=linkObj["url"], collection=collection, description=linkObj["description"])
-                print("hi" + linkObj["url"])
-                tempLink.save()
-                links.append(LinkSerializer(tempLink).data)
+        with transaction.atomic(), changes.writing():
+            # Create new collection object
+            collection = Collection(author=owner, name=name, description=description, permission=permission)
+            collection.save()
+            feed.fan_out(collection)
 
-        if topics:
-            for topic in topics:
-                print("topic: {}".format(topic))
-                tempTopic = Topic(name=topic, collection=collection)
-                tempTopic.save()
-                topicsRet.append(topic)
+            links = bulkLinks(owner, collection, urls)
+            attached = bulkTopics(collection, topicSpellings(topics))
+            trending.topics_attached(attached)
 
-        data["links"] = links
-        data["topics"] = topicsRet
+            data = {}
+            data["collectionInfo"] = CollectionSerializer(collection).data
 
-        print(data)
+        data["links"] = LinkSerializer(links, many=True).data
+        data["topics"] = [topic.name for topic in attached]
 
         return Response(data)
 
@@ -506,63 +748,47 @@ class EditCollectionView(APIView):
         if not Collection.objects.filter(id_filter, author_filter):
             return Response({'detail': 'Collection does not exist for specified user!'}, status=HTTP_400_BAD_REQUEST)
 
-        seenLinks = []
-        if urls:
-            for linkObj in urls:
-                if linkObj['url'] in seenLinks:
-                    return Response({'detail': 'No duplicate links allowed!'}, status=HTTP_400_BAD_REQUEST)
-
-                seenLinks.append(linkObj['url'])
+        if urls and len(set(linkObj['url'] for linkObj in urls)) != len(urls):
+            return Response({'detail': 'No duplicate links allowed!'}, status=HTTP_400_BAD_REQUEST)
 
         if permission not in CollectionPermission.__members__:
             return Response({'detail': 'Collection permission not valid!'}, status=HTTP_400_BAD_REQUEST)
 
         collection = Collection.objects.get(pk=collection_id)
-        collection.name = name
-        collection.description = description
-        collection.permission = permission
-
-        collection.save()
+        owner = User.objects.get(pk=owner_id)
+        expected = expectedVersion(request.data.get('version'), collection)
+
+        # The compare-and-swap's row lock lasts only as long as this transaction, not the whole request
+        with transaction.atomic(), changes.writing() as stamp:
+            # Only columns that actually change are written, and only if nobody else edited the collection since
+            # `expected`
+            fields = {'name': name, 'description': description, 'permission': permission}
+            changed = [field for field, value in fields.items() if getattr(collection, field) != value]
+            swapped = Collection.objects.filter(pk=collection.pk, version=expected) \
+                .update(version=F('version') + 1, changed_in=stamp, **{field: fields[field] for field in changed})
+            if not swapped:
+                return versionConflict(Collection, collection.pk)
+
+            for field in changed:
+                setattr(collection, field, fields[field])
+            collection.version = expected + 1
+            collection.changed_in = stamp
+            signals.collection_updated(collection, changed)
+
+            links = diffLinks(owner, collection, urls or [])
+            topics, attached = diffTopics(collection, topics or [])
+
+            # Only topics the collection did not already carry count towards trending
+            trending.topics_attached(attached)
 
         data = {}
         data["collectionInfo"] = CollectionSerializer(collection).data
-
-        owner = User.objects.get(pk=owner_id)
-
-        # Delete all existing links from DB and re-add links to DB
-        tempLink = Link.objects.filter(owner__id=owner_id, collection__id=collection_id)
-        if tempLink:
-            print("Deleting {} from db...".format(tempLink.values()))
-            tempLink.delete()
-
-        links = []
-        # Re-add all links into DB
-        for linkObj in urls:
-            print("Adding {} to db...".format(linkObj["url"]))
-            newLink = Link(owner=owner, url=linkObj["url"], collection=collection, description=linkObj["description"])
-            newLink.save()
-            links.append(LinkSerializer(newLink).data)
-
-        # Delete all existing topics from DB and re-add topics to DB
-        tempTopics = Topic.objects.filter(collection=collection)
-        if tempTopics:
-            print("Deleting {} from db...".format(tempTopics.values()))
-            tempTopics.delete()
-
-        # Re-add all topics into DB
-        topicsRet = []
-        for topic in topics:
-            print("Adding topic {}".format(topic))
-            newTopic = Topic(name=topic, collection=collection)
-            newTopic.save()
-            topicsRet.append(topic)
-
-        data["links"] = links
-        data["topics"] = topicsRet
+        data["links"] = LinkSerializer(links, many=True).data
+        data["topics"] = [topic.name for topic in topics]
 
         return Response(data)
 
-edit_collection_view = EditCollectionView.as_view()
+edit_collection_view = transaction.non_atomic_requests(EditCollectionView.as_view())
 
 # Add or delete link from collection
 class LinkView(APIView):
@@ -583,6 +809,7 @@ class LinkView(APIView):
         newLink = Link(owner=owner, url=link['url'], collection=targetCollection, description=link['description'])
 
         newLink.save()
+        bumpVersion(collection_id)
 
         newCollectionLinks = Link.objects.get(owner__id=user_id, collection__id=collection_id, url=link['url'])
 
@@ -595,7 +822,8 @@ class LinkView(APIView):
 
         toDelete = Link.objects.filter(owner__id=user_id, collection__id=collection_id, url=url)
 
-        toDelete.delete()
+        if toDelete.delete()[0]:
+            bumpVersion(collection_id)
 
         return Response(status=HTTP_200_OK)
 
@@ -617,16 +845,49 @@ class EditLinkView(APIView):
             return Response({'detail': 'Link does not exist in collection!'}, status=HTTP_400_BAD_REQUEST)
 
         currLink = self.getLink(user_id, collection_id, link['url'])[0]
+        expected = expectedVersion(link.get('version'), currLink)
 
-        currLink.description = link['description']
+        with transaction.atomic():
+            stamp = changes.stamp_fields()
+            swapped = Link.objects.filter(pk=currLink.pk, version=expected) \
+                .update(description=link['description'], version=F('version') + 1, **stamp)
+            if not swapped:
+                return versionConflict(Link, currLink.pk)
 
-        currLink.save()
+            currLink.description = link['description']
+            currLink.version = expected + 1
+            for field, value in stamp.items():
+                setattr(currLink, field, value)
+            signals.links_bulk_updated([currLink])
+            bumpVersion(collection_id)
 
-        newCollectionLinks = Link.objects.get(owner__id=user_id, collection__id=collection_id, url=link['url'])
+        return Response(LinkSerializer(currLink).data)
 
-        return Response(LinkSerializer(newCollectionLinks).data)
+edit_link_view = transaction.non_atomic_requests(EditLinkView.as_view())
 
-edit_link_view = EditLinkView.as_view()
+
+# Returns what changed in a collection's links and topics since the client's last token, and the token to send next
+class CollectionSyncView(APIView):
+    def get(self, request, pk, format=None):
+        token = syncToken(request.query_params.get('token'))
+
+        # An unchanged collection costs this one query
+        collection = changes.probe(pk, token)
+        if collection is None:
+            raise Http404
+
+        # A full listing replaces whatever the client had, deletions included
+        data = {'token': changes.token(collection.horizon), 'full': token is None}
+        if changes.unchanged(collection, token):
+            data.update(changes.nothing())
+            return Response(data)
+
+        data["collectionInfo"] = CollectionSerializer(collection).data
+        data.update(changes.changes_since(collection.pk, token))
+
+        return Response(data)
+
+collection_sync_view = CollectionSyncView.as_view()
 
 # Returns all collections that are connected to the one requested based on id
 class CollectionConnectedView(APIView):
@@ -762,8 +1023,311 @@ signup_view = SignUp.as_view()
 
 
 # Should move to their own files — here for now
-def searchTopic(query):
-    if not query:
-        return Topic.objects.values_list('name', flat=True).distinct()
+# Distinct topic names starting with the query, paged from this worker's in-memory topic index
+def searchTopic(query, paginator, request):
+    return paginator.paginate_index(
+        lambda after, count: topic_index().complete(query, after=after[0] if after else None, limit=count), request
+    )
+
+
+# A topic page entry, shaped like the rows TopicView has always returned
+def topicCollection(collection):
+    return {
+        'created': collection.created,
+        'author': UserPartSerializer(collection.author).data,
+        'name': collection.name,
+        'description': collection.description,
+        'id': collection.id,
+        'permission': collection.permission,
+    }
+
+
+# Resolves both directions of Following between the viewer and every user in one query
+def relationshipStatuses(viewer_id, user_ids):
+    edges = Following.objects.filter(
+        Q(creator_id=viewer_id, following_id__in=user_ids) | Q(creator_id__in=user_ids, following_id=viewer_id)
+    ).values_list('creator_id', 'following_id')
+
+    following = set()
+    followed_by = set()
+    for creator_id, following_id in edges:
+        if creator_id == viewer_id:
+            following.add(following_id)
+        if following_id == viewer_id:
+            followed_by.add(creator_id)
+
+    return [
+        {'id': user_id, 'viewer_follows': user_id in following, 'follows_viewer': user_id in followed_by}
+        for user_id in user_ids
+    ]
+
+
+# Inlines the viewer_id's relationship to each listed user as two EXISTS columns of the same query
+def withRelationship(users, request):
+    viewer_id = viewerId(request)
+    if viewer_id is None:
+        return users
+
+    return users.annotate(
+        viewer_follows=Exists(Following.objects.filter(creator_id=viewer_id, following_id=OuterRef('pk'))),
+        follows_viewer=Exists(Following.objects.filter(creator_id=OuterRef('pk'), following_id=viewer_id)),
+    )
+
+
+# Adds the viewer_id's relationship to already fetched user rows, which keeps the rows themselves the same for
+# every viewer and so cacheable
+def withRelationshipRows(users, request):
+    viewer_id = viewerId(request)
+    if viewer_id is None:
+        return users
+
+    statuses = relationshipStatuses(viewer_id, [user['id'] for user in users])
+    return [
+        dict(user, viewer_follows=status['viewer_follows'], follows_viewer=status['follows_viewer'])
+        for user, status in zip(users, statuses)
+    ]
+
+
+def viewerId(request):
+    viewer_id = get_param(request, 'viewer_id')
+    if viewer_id in (None, ''):
+        return None
+
+    try:
+        return int(viewer_id)
+    except (TypeError, ValueError):
+        raise ParseError('viewer_id must be an integer')
+
+
+# Paging parameters that, along with the normalized query, determine a search response
+def searchParams(request):
+    return {name: get_param(request, name) for name in (CURSOR_PARAM, PAGE_SIZE_PARAM, 'mode', 'limit')}
+
+
+# Serves a page of search results from the search cache, computing it with `page` on a miss
+def cachedPage(source, query, request, paginator, page):
+    def compute():
+        return page(), paginator.next_cursor
+
+    data, paginator.next_cursor = search_cache.cached(source, query, searchParams(request), compute)
+    return paginator.get_paginated_response(data)
+
+
+# Top matches for the user picker, raising BudgetExceeded when the query runs over its time budget
+def typeaheadUsers(query, request):
+    try:
+        limit = int(get_param(request, 'limit') or settings.TYPEAHEAD_LIMIT)
+    except (TypeError, ValueError):
+        raise ParseError('limit must be an integer')
+    limit = max(1, min(limit, settings.TYPEAHEAD_MAX_LIMIT))
+
+    matches = typeahead_users(query).values('id', 'username', 'first_name', 'last_name', 'name', 'image')
+
+    return within_budget(matches[:limit])
+
 
-    return Topic.objects.filter(name__istartswith=query).values_list('name', flat=True).distinct()
+# Inserts follows from `user` with a single bulk INSERT, skipping any that a concurrent request created first
+def bulkFollow(user, following_ids):
+    followings = [Following(creator=user, following_id=following_id) for following_id in following_ids]
+    if not followings:
+        return []
+
+    try:
+        with transaction.atomic():
+            return Following.objects.bulk_create(followings)
+    except IntegrityError:
+        pass
+
+    created = []
+    for following in followings:
+        try:
+            with transaction.atomic():
+                created += Following.objects.bulk_create([following])
+        except IntegrityError:
+            continue
+
+    return created
+
+
+# Inserts links into a collection with one bulk INSERT, returning them in request order
+def bulkLinks(owner, collection, urls):
+    stamp = changes.stamp()
+    links = Link.objects.bulk_create([
+        Link(owner=owner, url=linkObj["url"], collection=collection, description=linkObj["description"],
+             changed_in=stamp)
+        for linkObj in urls
+    ])
+    if links and links[0].pk is None:
+        # Only PostgreSQL hands back the new primary keys; elsewhere read the rows back by URL
+        created = Link.objects.filter(owner=owner, collection=collection, url__in=[link.url for link in links])
+        byUrl = {link.url: link for link in created}
+        links = [byUrl[link.url] for link in links]
+
+    signals.links_bulk_created(links)
+    return links
+
+
+# The first spelling of each distinct topic among `names`, keyed by topic_key, in request order
+def topicSpellings(names):
+    spellings = {}
+    for name in names:
+        spellings.setdefault(topic_key(name), name)
+
+    return spellings
+
+
+# Tags a collection with each topic in `spellings` with one bulk INSERT, returning the topics in order
+def bulkTopics(collection, spellings):
+    topicNames = bulkTopicNames({key: name.strip() for key, name in spellings.items()})
+    stamp = changes.stamp()
+    topics = Topic.objects.bulk_create([
+        Topic(name=name, collection=collection, topic_name=topicNames[key], changed_in=stamp)
+        for key, name in spellings.items()
+    ])
+    if topics and topics[0].pk is None:
+        created = Topic.objects.filter(collection=collection, topic_name__in=[topicNames[key] for key in spellings]) \
+            .select_related('topic_name')
+        byKey = {topic.topic_name.key: topic for topic in created}
+        topics = [byKey[key] for key in spellings]
+
+    signals.topics_bulk_created(topics)
+    return topics
+
+
+# Brings the owner's links in a collection in line with `urls` (keyed by URL), writing only the difference
+def diffLinks(owner, collection, urls):
+    wanted = set(linkObj['url'] for linkObj in urls)
+
+    existing = {}
+    removed = []
+    for link in Link.objects.filter(owner=owner, collection=collection).order_by('pk'):
+        if link.url in wanted and link.url not in existing:
+            existing[link.url] = link
+        else:
+            removed.append(link.pk)
+    if removed:
+        Link.objects.filter(pk__in=removed).delete()
+
+    edited = []
+    for linkObj in urls:
+        link = existing.get(linkObj['url'])
+        if link is not None and link.description != linkObj['description']:
+            link.description = linkObj['description']
+            edited.append(link)
+    bulkUpdate(Link, edited, 'description', **changes.stamp_fields())
+    signals.links_bulk_updated(edited)
+
+    added = bulkLinks(owner, collection, [linkObj for linkObj in urls if linkObj['url'] not in existing])
+    existing.update((link.url, link) for link in added)
+
+    return [existing[linkObj['url']] for linkObj in urls]
+
+
+# Brings a collection's topics in line with `names` (keyed by topic_key), writing only the difference;
+# returns the topics in request order and those newly attached
+def diffTopics(collection, names):
+    spellings = topicSpellings(names)
+
+    existing = {}
+    removed = []
+    for topic in Topic.objects.filter(collection=collection).select_related('topic_name').order_by('pk'):
+        key = topic.topic_name.key
+        if key in spellings and key not in existing:
+            existing[key] = topic
+        else:
+            removed.append(topic.pk)
+    if removed:
+        Topic.objects.filter(pk__in=removed).delete()
+
+    respelled = []
+    for key, topic in existing.items():
+        if topic.name != spellings[key]:
+            topic.name = spellings[key]
+            respelled.append(topic)
+    bulkUpdate(Topic, respelled, 'name', **changes.stamp_fields())
+    signals.topics_bulk_updated(respelled)
+
+    added = bulkTopics(collection, {key: name for key, name in spellings.items() if key not in existing})
+    existing.update((topic.topic_name.key, topic) for topic in added)
+
+    return [existing[key] for key in spellings], added
+
+
+# Writes each object's in-memory `field` with a single UPDATE ... SET field = CASE id WHEN ... END,
+# setting the `stamp` fields to the same value on all of them
+def bulkUpdate(model, objects, field, **stamp):
+    if not objects:
+        return
+
+    values = Case(*[When(pk=obj.pk, then=Value(getattr(obj, field))) for obj in objects],
+                  output_field=model._meta.get_field(field))
+    model.objects.filter(pk__in=[obj.pk for obj in objects]).update(**{field: values}, **stamp, **versionBump(model))
+    for obj in objects:
+        for name, value in stamp.items():
+            setattr(obj, name, value)
+    if versionBump(model):
+        for obj in objects:
+            obj.version += 1
+
+
+# Versioned models count every write, so concurrent edits can detect each other
+def versionBump(model):
+    if any(field.name == 'version' for field in model._meta.get_fields()):
+        return {'version': F('version') + 1}
+    return {}
+
+
+# The version an edit says it started from, defaulting to the one just read
+def expectedVersion(version, instance):
+    if version is None:
+        return instance.version
+    try:
+        return int(version)
+    except (TypeError, ValueError):
+        raise ParseError('version must be an integer')
+
+
+# The horizon of the client's last sync; none, for a first or expired token, means sync everything
+def syncToken(token):
+    if token in (None, ''):
+        return None
+    try:
+        return changes.token_horizon(token)
+    except (TypeError, ValueError):
+        raise ParseError('token is not a sync token')
+
+
+# Edits to a collection's links or topics outside EditCollectionView still move its version on
+def bumpVersion(collection_id):
+    Collection.objects.filter(pk=collection_id).update(version=F('version') + 1)
+
+
+# 409 with the row's current version, for a compare-and-swap that lost to another edit
+def versionConflict(model, pk):
+    current = model.objects.filter(pk=pk).values_list('version', flat=True).first()
+    return Response({'detail': '{} was changed by another edit'.format(model.__name__), 'version': current},
+                    status=HTTP_409_CONFLICT)
+
+
+# Returns the TopicName for each key, creating the missing ones with one bulk INSERT
+def bulkTopicNames(spellings):
+    found = TopicName.objects.in_bulk(list(spellings), field_name='key')
+    missing = [TopicName(key=key, name=name) for key, name in spellings.items() if key not in found]
+    if not missing:
+        return found
+
+    try:
+        with transaction.atomic():
+            TopicName.objects.bulk_create(missing)
+    except IntegrityError:
+        # A concurrent request created some of them first
+        for topicName in missing:
+            TopicName.objects.get_or_create(key=topicName.key, defaults={'name': topicName.name})
+
+    return TopicName.objects.in_bulk(list(spellings), field_name='key')
+
+
+# Reads each user's collection count from its denormalized counter rather than aggregating
+def userPreviews(users):
+    return users.annotate(collection_count=F('collectionCount')) \
+        .values('id', 'username', 'first_name', 'last_name', 'name', 'image', 'collection_count')